@@ -0,0 +1,341 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import profiling
+
+STATS = ("hits", "misses", "stale_hits", "lock_waits", "recomputes")
+LOCK_KEY = "{key}:lock"
+LOCK_POLL = 0.05
+# SQLite refuses statements with more than 999 parameters by default.
+MAX_PARAMS = 900
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache_entry ("
+    "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, stored REAL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)",
+    "CREATE INDEX IF NOT EXISTS cache_entry_stored ON cache_entry (stored)",
+    "CREATE TABLE IF NOT EXISTS cache_stat ("
+    "name TEXT PRIMARY KEY, value INTEGER NOT NULL"
+    ") WITHOUT ROWID",
+)
+
+
+class SQLiteCache(BaseCache):
+    """Cache backend shared by every process that opens the same file.
+
+    Each write is a single SQLite transaction, and the database runs in
+    WAL mode so readers never wait for writers. Past ``MAX_ENTRIES`` the
+    least recently written entries are culled, whatever their timeout.
+    Hit, miss and
+    lock-wait counters are collected per process and added to a shared
+    table at most once per ``STATS_INTERVAL`` seconds; they also go to
+    the Server-Timing header of the current request.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.path = os.path.abspath(location)
+        self.busy_timeout = options.get("BUSY_TIMEOUT", 5)
+        self.cull_every = options.get("CULL_EVERY", 100)
+        self.stats_interval = options.get("STATS_INTERVAL", 1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._flushed_at = time.monotonic()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        # Connections must not cross a fork, so each process and thread
+        # opens its own.
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            try:
+                # Files created before entries kept their write time.
+                db.execute("ALTER TABLE cache_entry ADD COLUMN stored REAL")
+            except sqlite3.OperationalError:
+                pass
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expiry(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def record(self, name, amount=1):
+        profiling.count(name, amount)
+        with self._lock:
+            self._stats[name] += amount
+        self._flush_if_due()
+
+    def _flush_if_due(self):
+        with self._lock:
+            due = (time.monotonic() - self._flushed_at
+                   >= self.stats_interval)
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._lock:
+            stats, self._stats = self._stats, Counter()
+            self._flushed_at = time.monotonic()
+        if not stats:
+            return
+        self._db.executemany(
+            "INSERT INTO cache_stat (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            stats.items(),
+        )
+
+    def stats(self):
+        """Return the counters of all processes using this cache file."""
+        self.flush_stats()
+        totals = dict.fromkeys(STATS, 0)
+        totals.update(self._db.execute(
+            "SELECT name, value FROM cache_stat"
+        ).fetchall())
+        return totals
+
+    def _written(self):
+        self._writes += 1
+        if self.cull_every and self._writes % self.cull_every == 0:
+            self._cull()
+
+    def _cull(self):
+        db = self._db
+        db.execute("DELETE FROM cache_entry WHERE expires <= ?",
+                   (time.time(),))
+        count = db.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count > self._max_entries:
+            # Drop the least recently written entries. Version keys have
+            # no timeout, so ordering by expiry would keep all of them
+            # and drop the pages they guard instead.
+            db.execute(
+                "DELETE FROM cache_entry WHERE key IN ("
+                "SELECT key FROM cache_entry ORDER BY stored LIMIT ?)",
+                (count // self._cull_frequency or 1,),
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            "INSERT INTO cache_entry (key, value, expires, stored) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires = excluded.expires, stored = excluded.stored "
+            "WHERE cache_entry.expires <= excluded.stored",
+            (self._key(key, version), self._dumps(value),
+             self._expiry(timeout), time.time()),
+        )
+        self._written()
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            "SELECT value FROM cache_entry WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        if row is None:
+            self.record("misses")
+            return default
+        self.record("hits")
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._db.execute(
+            "REPLACE INTO cache_entry (key, value, expires, stored) "
+            "VALUES (?, ?, ?, ?)",
+            (self._key(key, version), self._dumps(value),
+             self._expiry(timeout), time.time()),
+        )
+        self._written()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            "UPDATE cache_entry SET expires = ? WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self._expiry(timeout), self._key(key, version), time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        self._db.execute("DELETE FROM cache_entry WHERE key = ?",
+                         (self._key(key, version),))
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            "SELECT 1 FROM cache_entry WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        # increments from other processes queue instead of racing.
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM cache_entry WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute("UPDATE cache_entry SET value = ?, stored = ? "
+                       "WHERE key = ?", (self._dumps(value), time.time(), key))
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), MAX_PARAMS):
+            chunk = names[start:start + MAX_PARAMS]
+            rows = self._db.execute(
+                "SELECT key, value FROM cache_entry WHERE key IN (%s) "
+                "AND (expires IS NULL OR expires > ?)"
+                % ", ".join("?" * len(chunk)),
+                (*chunk, time.time()),
+            )
+            for key, value in rows:
+                found[keys[key]] = pickle.loads(value)
+        self.record("hits", len(found))
+        self.record("misses", len(keys) - len(found))
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        stored = time.time()
+        rows = [(self._key(key, version), self._dumps(value), expires, stored)
+                for key, value in data.items()]
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "REPLACE INTO cache_entry (key, value, expires, stored) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        self._written()
+        return []
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            "DELETE FROM cache_entry WHERE key = ?",
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache_entry")
+
+    def close(self, **kwargs):
+        # Django closes caches after every request; the connection is
+        # kept so the next request does not reopen the file, and the
+        # counters wait for their interval like on any other call.
+        self._flush_if_due()
+
+
+def record(backend, name):
+    recorder = getattr(backend, "record", None)
+    if recorder is not None:
+        recorder(name)
+
+
+def get_or_set_locked(key, compute, timeout, stale_timeout=None,
+                      lock_timeout=10, backend=None):
+    """Return the cached value of ``key``, computing it at most once
+    across all workers.
+
+    Values stay fresh for ``timeout`` seconds and are kept for another
+    ``stale_timeout`` seconds (``timeout`` by default). Once an entry
+    goes stale, the worker that takes the lock recomputes it while the
+    others keep serving the stale value. On a cold key the others wait
+    up to ``lock_timeout`` seconds for the value to appear.
+    """
+    backend = backend or cache
+    if stale_timeout is None:
+        stale_timeout = timeout
+    lock_key = LOCK_KEY.format(key=key)
+
+    def refresh():
+        record(backend, "recomputes")
+        try:
+            value = compute()
+            backend.set(key, (value, time.time() + timeout),
+                        timeout + stale_timeout)
+        finally:
+            backend.delete(lock_key)
+        return value
+
+    entry = backend.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until > time.time():
+            return value
+        if backend.add(lock_key, 1, lock_timeout):
+            return refresh()
+        record(backend, "stale_hits")
+        return value
+
+    entry = _wait_for_lock(backend, key, lock_key, lock_timeout)
+    if entry is not None:
+        return entry[0]
+    return refresh()
+
+
+def _wait_for_lock(backend, key, lock_key, lock_timeout):
+    """Take the lock of a cold ``key`` or wait for its holder to store
+    the value. Returns the stored entry, or None once the lock is ours.
+    """
+    if backend.add(lock_key, 1, lock_timeout):
+        return None
+    record(backend, "lock_waits")
+    deadline = time.monotonic() + lock_timeout
+    while True:
+        time.sleep(LOCK_POLL)
+        entry = backend.get(key)
+        if entry is not None:
+            return entry
+        if backend.add(lock_key, 1, lock_timeout):
+            return None
+        if time.monotonic() > deadline:
+            # The lock holder is stuck or gone; compute without it.
+            return None
@@ -0,0 +1,21 @@
+import json
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Print the hit, miss, stale-hit, lock-wait and recompute "
+            "counters of a shared cache, summed over all workers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alias", default="default",
+            help="Cache alias from settings.CACHES.")
+
+    def handle(self, *args, **options):
+        backend = caches[options["alias"]]
+        if not hasattr(backend, "stats"):
+            raise CommandError(
+                f"Cache '{options['alias']}' does not collect stats.")
+        self.stdout.write(json.dumps(backend.stats(), indent=2))
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = ("Print a signed token that makes ProfilingMiddleware save a "
+            "cProfile dump of the requests sending it in the X-Profile "
+            "header or the _profile query parameter.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
+        self.stderr.write(
+            f"Valid for {settings.PROFILING['TOKEN_MAX_AGE']} seconds.")
@@ -0,0 +1,194 @@
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+# Metric families: name -> (type, help). Histograms are stored as
+# their _bucket, _sum and _count series.
+FAMILIES = {
+    "yatube_requests_total": (
+        "counter", "Requests by URL name, method and status code."),
+    "yatube_request_duration_seconds": (
+        "histogram", "Request latency by URL name."),
+    "yatube_request_queries": (
+        "histogram", "SQL queries per request by URL name."),
+    "yatube_cache_requests_total": (
+        "counter", "Cache lookups by URL name and result."),
+    "yatube_coalesced_renders_total": (
+        "counter", "Signed-out page renders by URL name, and requests "
+        "that shared a render of the same worker or of another one."),
+    "yatube_upload_size_bytes": (
+        "histogram", "Size of multipart request bodies by URL name."),
+}
+HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS metric ("
+    "name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, "
+    "PRIMARY KEY (name, labels)) WITHOUT ROWID"
+)
+
+
+def format_labels(labels):
+    """Render a dict of labels the way Prometheus expects them."""
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in sorted(labels.items()))
+
+
+def _bound(value):
+    return "+Inf" if math.isinf(value) else repr(float(value))
+
+
+class MetricStore:
+    """Counters and histograms shared by every process that opens the
+    same file.
+
+    Updates only touch a per-process ``Counter`` under a lock; the
+    pending deltas are added to the shared SQLite table at most once per
+    ``flush_interval`` seconds, checked on every update and at the end
+    of every request. Stores flush once more when the process exits, so
+    a worker that exits keeps what it counted.
+    """
+
+    def __init__(self, path, flush_interval=1):
+        self.path = os.path.abspath(path)
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _add(self, updates):
+        with self._lock:
+            for key, amount in updates:
+                self._pending[key] += amount
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = (time.monotonic() - self._flushed_at
+                   >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def inc(self, name, labels, amount=1):
+        self._add([((name, format_labels(labels)), amount)])
+
+    def observe(self, name, labels, value, buckets):
+        """Add ``value`` to a histogram with the given upper bounds."""
+        labels = format_labels(labels)
+        prefix = f"{labels}," if labels else ""
+        updates = [((f"{name}_sum", labels), value),
+                   ((f"{name}_count", labels), 1)]
+        # Buckets are cumulative: the value counts towards every bound
+        # it does not exceed. "le" goes last, for _series_order().
+        for bound in [*buckets[bisect_left(buckets, value):], math.inf]:
+            updates.append(
+                ((f"{name}_bucket", f'{prefix}le="{_bound(bound)}"'), 1))
+        self._add(updates)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        self._db.executemany(
+            "INSERT INTO metric (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE "
+            "SET value = value + excluded.value",
+            [(name, labels, value)
+             for (name, labels), value in pending.items()],
+        )
+
+    def collect(self):
+        """Return (name, labels, value) of every series of all
+        processes."""
+        self.flush()
+        return self._db.execute(
+            "SELECT name, labels, value FROM metric").fetchall()
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+        self._db.execute("DELETE FROM metric")
+
+    def render(self):
+        """Return every series in the Prometheus text format."""
+        families = {}
+        for name, labels, value in self.collect():
+            family = name
+            for suffix in HISTOGRAM_SUFFIXES:
+                if name.endswith(suffix) and \
+                        name[:-len(suffix)] in FAMILIES:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append((name, labels, value))
+        lines = []
+        for family in sorted(families):
+            kind, description = FAMILIES.get(family, ("untyped", ""))
+            lines += [f"# HELP {family} {description}",
+                      f"# TYPE {family} {kind}"]
+            for name, labels, value in sorted(families[family],
+                                              key=_series_order):
+                value = int(value) if value == int(value) else value
+                lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _series_order(series):
+    # Buckets of one histogram go in increasing order of their bounds,
+    # which observe() puts last.
+    name, labels, _ = series
+    if not name.endswith("_bucket"):
+        return name, labels, 0
+    others, _, bound = labels.rpartition('le="')
+    return name, others, float(bound[:-1])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """Return the store configured in ``settings.METRICS``."""
+    options = settings.METRICS
+    key = (options["PATH"], options["FLUSH_INTERVAL"])
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = store = MetricStore(*key)
+            atexit.register(store.flush)
+        return _stores[key]
+
+
+@receiver(request_finished)
+def flush_due_stores(**kwargs):
+    # Deltas recorded after the metrics middleware, or just before the
+    # interval ran out, need not wait for the worker's next update.
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush_if_due()
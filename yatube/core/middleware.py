@@ -0,0 +1,203 @@
+import cProfile
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.shortcuts import render
+
+from . import ratelimit
+from .metrics import get_store
+from .profiling import (RequestProfile, install_template_timer,
+                        save_profile, valid_token)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """Log or fail requests that run more SQL queries than the budget
+    of their view allows.
+
+    Budgets are fixed per URL name, so a view whose query count grows
+    with the page size trips them as soon as the page is big enough.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.check_budget(request, counter.count)
+        return response
+
+    def check_budget(self, request, count):
+        budget = settings.QUERY_BUDGET
+        url_name = getattr(request.resolver_match, "url_name", None)
+        limit = budget["VIEWS"].get(url_name, budget["DEFAULT"])
+        if count <= limit:
+            return
+        message = (f"{request.method} {request.path} ({url_name}) ran "
+                   f"{count} SQL queries, budget is {limit}")
+        if budget["RAISE"]:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilingMiddleware:
+    """Report the SQL, template and cache use of requests in a
+    Server-Timing header, and save a cProfile dump of the requests that
+    ask for one.
+
+    A request asks with the profiling header or query parameter, set to
+    a token from ``manage.py profile_token`` or, for staff, to anything.
+    ``SAMPLE_RATE`` profiles a random share of all requests as well.
+    Dumps go to ``PROFILING["DIRECTORY"]`` and are named in the
+    header's ``prof`` metric. The header itself only goes to staff and
+    to requests with a valid token, so the timings of the site are not
+    shown to everyone.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING["ENABLED"]:
+            raise MiddlewareNotUsed
+        install_template_timer()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profiler = cProfile.Profile() if self.wants_profile(request) \
+            else None
+        with RequestProfile().active() as profile:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        profile.stop()
+        name = None
+        if profiler is not None:
+            name = save_profile(profiler, request)
+            logger.info("Saved the profile of %s %s to %s",
+                        request.method, request.path, name)
+        if self.may_see_timings(request):
+            response["Server-Timing"] = profile.server_timing(name)
+        return response
+
+    def _token(self, request):
+        options = settings.PROFILING
+        return (request.META.get(options["HEADER"])
+                or request.GET.get(options["QUERY_PARAM"]))
+
+    def _is_staff(self, request):
+        user = getattr(request, "user", None)
+        return bool(user and user.is_staff)
+
+    def wants_profile(self, request):
+        if random.random() < settings.PROFILING["SAMPLE_RATE"]:
+            return True
+        value = self._token(request)
+        if not value:
+            return False
+        return valid_token(value) or self._is_staff(request)
+
+    def may_see_timings(self, request):
+        if self._is_staff(request):
+            return True
+        value = self._token(request)
+        return bool(value) and valid_token(value)
+
+
+class MetricsMiddleware:
+    """Count requests and record latency, SQL query and upload size
+    histograms and cache hits and misses per URL name.
+
+    The numbers go to the shared ``MetricStore`` that ``/metrics/``
+    exposes to Prometheus.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with RequestProfile().active() as profile:
+            response = self.get_response(request)
+        self.record(request, response, profile,
+                    time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, profile, duration):
+        options = settings.METRICS
+        store = get_store()
+        view = getattr(request.resolver_match, "url_name", None) \
+            or "unmatched"
+        labels = {"view": view}
+        store.inc("yatube_requests_total",
+                  {**labels, "method": request.method,
+                   "status": response.status_code})
+        store.observe("yatube_request_duration_seconds", labels, duration,
+                      options["LATENCY_BUCKETS"])
+        store.observe("yatube_request_queries", labels, profile.sql_count,
+                      options["QUERY_BUCKETS"])
+        for result in ("hits", "misses"):
+            if profile.cache[result]:
+                store.inc("yatube_cache_requests_total",
+                          {**labels, "result": result},
+                          profile.cache[result])
+        if request.content_type == "multipart/form-data":
+            store.observe("yatube_upload_size_bytes", labels,
+                          int(request.META.get("CONTENT_LENGTH") or 0),
+                          options["UPLOAD_BUCKETS"])
+
+
+class RateLimitMiddleware:
+    """Answer 429 Too Many Requests with a Retry-After header to users
+    and addresses that call a view faster than ``RATELIMIT["VIEWS"]``
+    allows for its URL name.
+
+    Limits are only checked for the ``METHODS`` of each rule (POST by
+    default), so reading a page is never throttled by writing to it.
+    """
+
+    def __init__(self, get_response):
+        if not settings.RATELIMIT["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        rule = settings.RATELIMIT["VIEWS"].get(url_name)
+        if rule is None or request.method not in rule.get("METHODS",
+                                                          ("POST",)):
+            return None
+        wait = ratelimit.check(request, url_name, rule)
+        if not wait:
+            return None
+        logger.info("Rate limited %s %s (%s) for %s s", request.method,
+                    request.path, url_name, wait)
+        response = render(request, "misc/429.html", {"retry_after": wait},
+                          status=429)
+        response["Retry-After"] = str(wait)
+        return response
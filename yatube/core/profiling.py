@@ -0,0 +1,138 @@
+import functools
+import os
+import secrets
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.template.base import Template
+
+TOKEN_SALT = "core.profiling"
+# The request being timed in the current thread, if any.
+current_profile = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """SQL, template and cache counters of one request.
+
+    While ``active()``, the profile is a database execute wrapper and
+    the cache backend reports to it through ``current_profile``. Active
+    profiles nest: SQL and cache use count towards every profile of the
+    request, template rendering only towards the innermost. Template
+    time includes the queries run while rendering.
+    """
+
+    def __init__(self):
+        self.parent = None
+        self.started = time.perf_counter()
+        self.total = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - start
+
+    @contextmanager
+    def active(self):
+        self.parent = current_profile.get()
+        token = current_profile.set(self)
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+        finally:
+            current_profile.reset(token)
+
+    def stop(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self, profile_name=None):
+        """Format the counters as a Server-Timing header value."""
+        metrics = [
+            f"total;dur={self.total * 1000:.1f}",
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+        ]
+        if self.cache:
+            counts = " ".join(f"{name}={count}"
+                              for name, count in sorted(self.cache.items()))
+            metrics.append(f'cache;desc="{counts}"')
+        if profile_name:
+            metrics.append(f'prof;desc="{profile_name}"')
+        return ", ".join(metrics)
+
+
+def count(name, amount=1):
+    """Add to the cache counters of the active profiles, if any."""
+    profile = current_profile.get()
+    while profile is not None:
+        profile.cache[name] += amount
+        profile = profile.parent
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, context):
+        profile = current_profile.get()
+        # Included templates render inside their parent, so only the
+        # outermost render is timed.
+        if profile is None or profile.rendering:
+            return render(self, context)
+        profile.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def install_template_timer():
+    """Time template rendering for the profile of the current request.
+
+    Outside a timed request the wrapper costs one context variable
+    lookup per render.
+    """
+    if not getattr(Template.render, "timed", False):
+        Template.render = _timed_render(Template.render)
+
+
+def make_token():
+    """Return a value for the profiling header that asks for a profile
+    of the request, valid for ``PROFILING["TOKEN_MAX_AGE"]`` seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            value, max_age=settings.PROFILING["TOKEN_MAX_AGE"])
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def save_profile(profiler, request):
+    """Write the cProfile stats of ``request`` to the profile directory
+    and return the file name."""
+    directory = settings.PROFILING["DIRECTORY"]
+    os.makedirs(directory, exist_ok=True)
+    url_name = getattr(request.resolver_match, "url_name", None)
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{url_name or 'request'}-"
+            f"{os.getpid()}-{secrets.token_hex(4)}.prof")
+    profiler.dump_stats(os.path.join(directory, name))
+    return name
@@ -0,0 +1,110 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY = "ratelimit:{mode}:{scope}:{identity}"
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """Turn "10/m" into (10, 60): requests and the period in seconds."""
+    count, _, unit = rate.partition("/")
+    return int(count), PERIODS[unit[:1]]
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def token_bucket(key, count, period, burst=None, backend=None):
+    """Take a token from the bucket ``key``, refilled with ``count``
+    tokens per ``period`` seconds and holding at most ``burst``.
+
+    Returns (allowed, seconds to wait). The bucket is kept as the
+    theoretical arrival time (GCRA) of its next request, which every
+    request moves forward with an atomic ``incr``. The entry expires
+    when the bucket is full again, so a missing entry is a full bucket
+    and the arrival time never has to be pulled up to the present.
+    """
+    backend = backend or caches[settings.RATELIMIT["CACHE"]]
+    burst = count if burst is None else burst
+    interval = period * 1000 // count
+    now = _now_ms()
+    if backend.add(key, now + interval, interval / 1000):
+        return True, 0
+    try:
+        arrival = backend.incr(key, interval)
+    except ValueError:
+        # Expired between add() and incr().
+        backend.add(key, now + interval, interval / 1000)
+        return True, 0
+    ahead = arrival - now
+    if ahead > burst * interval:
+        backend.incr(key, -interval)
+        return False, (ahead - burst * interval) / 1000
+    backend.touch(key, ahead / 1000)
+    return True, 0
+
+
+def sliding_window(key, count, period, backend=None):
+    """Count a request against ``key``, allowing ``count`` requests in
+    any ``period`` seconds.
+
+    Returns (allowed, seconds to wait). Requests are counted with
+    ``incr`` in fixed windows; the previous window's count is weighted
+    by how much of it still overlaps the sliding one.
+    """
+    backend = backend or caches[settings.RATELIMIT["CACHE"]]
+    now = time.time()
+    window, elapsed = divmod(now, period)
+    current = f"{key}:{int(window)}"
+    backend.add(current, 0, 2 * period)
+    try:
+        used = backend.incr(current)
+    except ValueError:
+        backend.add(current, 1, 2 * period)
+        used = 1
+    previous = backend.get(f"{key}:{int(window) - 1}", 0)
+    weight = 1 - elapsed / period
+    if previous * weight + used <= count:
+        return True, 0
+    backend.incr(current, -1)
+    if used > count or not previous:
+        return False, period - elapsed
+    # Wait until the fading previous window leaves room for one more.
+    return False, max(period * (1 - (count - used) / previous) - elapsed,
+                      0)
+
+
+def identities(request, keys):
+    for name in keys:
+        if name == "user":
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                yield f"user:{user.pk}"
+        elif name == "ip":
+            yield "ip:" + request.META.get(settings.RATELIMIT["IP_HEADER"],
+                                           "").split(",")[0].strip()
+
+
+def check(request, scope, rule):
+    """Charge ``request`` to every bucket of ``rule`` and return the
+    number of seconds to wait before retrying, or 0 if it may pass."""
+    options = settings.RATELIMIT
+    mode = rule.get("MODE", options["MODE"])
+    count, period = parse_rate(rule["RATE"])
+    waits = []
+    for identity in identities(request, rule.get("KEYS", options["KEYS"])):
+        key = KEY.format(mode=mode, scope=scope, identity=identity)
+        if mode == "bucket":
+            allowed, wait = token_bucket(key, count, period,
+                                         rule.get("BURST"))
+        else:
+            allowed, wait = sliding_window(key, count, period)
+        if not allowed:
+            waits.append(wait)
+    if not waits:
+        return 0
+    return max(math.ceil(max(waits)), 1)
@@ -0,0 +1,70 @@
+import threading
+
+from django.core.cache import cache
+
+from .cache import LOCK_KEY, _wait_for_lock
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None
+
+
+class SingleFlight:
+    """Run one call per key at a time within this process.
+
+    Callers that arrive while a call with their key is running wait for
+    it instead of making their own, and get what it shares.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func, timeout):
+        """Call ``func``, which returns a (result, payload) pair, or wait
+        up to ``timeout`` seconds for the running call with ``key``.
+
+        Returns (result, False) to the caller that ran ``func`` and
+        (payload, True) to the ones that waited. Waiters get a None
+        payload if that call failed, had nothing to share or did not
+        finish in time.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait(timeout)
+            return flight.payload, True
+        try:
+            result, flight.payload = func()
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return result, False
+
+
+def shared_flight(key, func, timeout, backend=None):
+    """Like ``SingleFlight.do()`` across all workers that share
+    ``backend``: the caller holding the lock of ``key`` runs ``func`` and
+    stores its payload under ``key`` for ``timeout`` seconds.
+
+    Waiters give up after ``timeout`` seconds and run ``func``
+    themselves, so they never get a None payload.
+    """
+    backend = backend or cache
+    lock_key = LOCK_KEY.format(key=key)
+    entry = _wait_for_lock(backend, key, lock_key, timeout)
+    if entry is not None:
+        return entry, True
+    try:
+        result, payload = func()
+        if payload is not None:
+            backend.set(key, payload, timeout)
+    finally:
+        backend.delete(lock_key)
+    return result, False
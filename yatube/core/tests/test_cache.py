@@ -0,0 +1,228 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache import LOCK_KEY, SQLiteCache, get_or_set_locked
+from core.profiling import RequestProfile, current_profile
+
+KEY = "key"
+VALUE = {"answer": 42}
+THREADS = 8
+INCREMENTS = 25
+
+
+def make_cache(location, **options):
+    return SQLiteCache(location, {"OPTIONS": {"STATS_INTERVAL": 0,
+                                              **options}})
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Tests the SQLite cache backend shared between processes"""
+    def setUp(self):
+        """Creates a cache in a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, "cache.sqlite3")
+        self.cache = make_cache(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_set_get_delete(self):
+        """Tests that values round-trip and can be deleted"""
+        self.cache.set(KEY, VALUE)
+        self.assertEqual(self.cache.get(KEY), VALUE)
+        self.cache.delete(KEY)
+        self.assertIsNone(self.cache.get(KEY))
+
+    def test_instances_share_the_file(self):
+        """Tests that another instance sees writes, like another worker"""
+        self.cache.set(KEY, VALUE)
+        other = make_cache(self.location)
+        self.assertEqual(other.get(KEY), VALUE)
+        other.delete(KEY)
+        self.assertFalse(self.cache.has_key(KEY))
+
+    def test_expired_entries_are_missing(self):
+        """Tests that an expired entry is not returned and add replaces it"""
+        self.cache.set(KEY, VALUE, 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get(KEY))
+        self.assertTrue(self.cache.add(KEY, 1))
+        self.assertFalse(self.cache.add(KEY, 2))
+        self.assertEqual(self.cache.get(KEY), 1)
+
+    def test_counts_reach_the_current_request(self):
+        """Tests that hits and misses show up in the request profile"""
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            self.cache.set(KEY, VALUE)
+            self.cache.get(KEY)
+            self.cache.get_many([KEY, "missing"])
+        finally:
+            current_profile.reset(token)
+        self.cache.get(KEY)
+        self.assertEqual(profile.cache, {"hits": 2, "misses": 1})
+
+    def test_many(self):
+        """Tests the bulk methods"""
+        self.cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]),
+                         {"a": 1, "b": 2})
+        self.cache.delete_many(["a", "b"])
+        self.assertEqual(self.cache.get_many(["a", "b"]), {})
+
+    def test_incr_is_atomic(self):
+        """Tests that concurrent increments are not lost"""
+        self.cache.set(KEY, 0)
+
+        def work():
+            worker = make_cache(self.location)
+            for _ in range(INCREMENTS):
+                worker.incr(KEY)
+
+        threads = [threading.Thread(target=work) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get(KEY), THREADS * INCREMENTS)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_cull(self):
+        """Tests that the cache is trimmed past MAX_ENTRIES"""
+        cache = SQLiteCache(self.location, {
+            "OPTIONS": {"MAX_ENTRIES": 10, "CULL_FREQUENCY": 2,
+                        "CULL_EVERY": 1},
+        })
+        for number in range(20):
+            cache.set(f"key{number}", number)
+        count = cache._db.execute(
+            "SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        self.assertLessEqual(count, 11)
+
+    def test_cull_drops_the_least_recently_written(self):
+        """Tests that entries without a timeout are culled by age like
+        any other"""
+        cache = make_cache(self.location, MAX_ENTRIES=4, CULL_FREQUENCY=2,
+                           CULL_EVERY=1)
+        for number in range(4):
+            cache.set(f"version{number}", number, None)
+        cache.incr("version0")
+        cache.set(KEY, VALUE)
+        self.assertEqual(cache.get(KEY), VALUE)
+        self.assertEqual(cache.get("version0"), 1)
+        self.assertIsNone(cache.get("version1"))
+
+    def test_files_without_write_times_are_upgraded(self):
+        """Tests that a cache file of the previous schema keeps
+        working"""
+        db = sqlite3.connect(self.location)
+        db.execute("CREATE TABLE cache_entry (key TEXT PRIMARY KEY, "
+                   "value BLOB NOT NULL, expires REAL) WITHOUT ROWID")
+        db.close()
+        self.cache.set(KEY, VALUE)
+        self.assertEqual(self.cache.get(KEY), VALUE)
+
+    def test_stats_are_shared(self):
+        """Tests that hits and misses of all instances are summed"""
+        self.cache.set(KEY, VALUE)
+        self.cache.get(KEY)
+        other = make_cache(self.location)
+        other.get("missing")
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_close_keeps_the_stats_interval(self):
+        """Tests that closing after every request writes the counters
+        only once their interval has passed"""
+        cache = make_cache(self.location, STATS_INTERVAL=60)
+        cache.get(KEY)
+        cache.close()
+        self.assertEqual(self.cache.stats()["misses"], 0)
+        cache.stats_interval = 0
+        cache.close()
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+
+class GetOrSetLockedTest(SimpleTestCase):
+    """Tests single-flight recomputation of cached values"""
+    def setUp(self):
+        """Creates a cache in a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.cache = make_cache(os.path.join(self.directory, "c.sqlite3"))
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self, **kwargs):
+        return get_or_set_locked(KEY, self.compute, 60,
+                                 backend=self.cache, **kwargs)
+
+    def test_fresh_value_is_computed_once(self):
+        """Tests that a fresh value is served from the cache"""
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_locked(self):
+        """Tests that others serve the stale value during a recompute"""
+        self.cache.set(KEY, ("stale", time.time() - 1), 60)
+        self.cache.add(LOCK_KEY.format(key=KEY), 1, 60)
+        self.assertEqual(self.get(), "stale")
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.cache.stats()["stale_hits"], 1)
+
+    def test_stale_value_is_refreshed_by_lock_holder(self):
+        """Tests that the worker taking the lock recomputes the value"""
+        self.cache.set(KEY, ("stale", time.time() - 1), 60)
+        self.assertEqual(self.get(), 1)
+        self.assertFalse(self.cache.has_key(LOCK_KEY.format(key=KEY)))
+
+    def test_cold_key_waits_for_lock_holder(self):
+        """Tests that a cold key waits for the worker computing it"""
+        self.cache.add(LOCK_KEY.format(key=KEY), 1, 60)
+        timer = threading.Timer(
+            0.1, self.cache.set, (KEY, ("theirs", time.time() + 60), 60))
+        timer.start()
+        self.assertEqual(self.get(), "theirs")
+        timer.join()
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(self.cache.stats()["lock_waits"], 1)
+
+    def test_cold_key_computes_after_lock_timeout(self):
+        """Tests that a stuck lock holder does not block forever"""
+        self.cache.add(LOCK_KEY.format(key=KEY), 1, 60)
+        self.assertEqual(self.get(lock_timeout=0.1), 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """Tests that simultaneous misses run the computation once"""
+        def slow():
+            time.sleep(0.1)
+            return self.compute()
+
+        results = []
+
+        def work():
+            results.append(get_or_set_locked(KEY, slow, 60,
+                                             backend=self.cache))
+
+        threads = [threading.Thread(target=work) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [1] * THREADS)
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import MetricStore, get_store
+
+User = get_user_model()
+
+HOMEPAGE_URL = reverse("index")
+METRICS_URL = reverse("metrics")
+STAFF_USERNAME = "staff_user"
+USERNAME = "test_user"
+BUCKETS = (0.1, 1, 10)
+
+
+def series(text):
+    """Parses Prometheus text into {"name{labels}": value}"""
+    return {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines() if not line.startswith("#")
+    }
+
+
+class MetricStoreTest(SimpleTestCase):
+    """Tests the counters and histograms shared between workers"""
+    def setUp(self):
+        """Creates a store in a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "metrics.sqlite3")
+        self.store = MetricStore(self.path, flush_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_workers_add_up(self):
+        """Tests that another store on the same file, like another
+        worker, adds to the same series"""
+        other = MetricStore(self.path, flush_interval=60)
+        self.store.inc("yatube_requests_total", {"view": "index"})
+        other.inc("yatube_requests_total", {"view": "index"}, 2)
+        self.assertEqual(self.store.collect(), [
+            ("yatube_requests_total", 'view="index"', 1)])
+        other.flush()
+        self.assertEqual(self.store.collect(), [
+            ("yatube_requests_total", 'view="index"', 3)])
+
+    def test_idle_workers_flush_after_requests_and_at_exit(self):
+        """Tests that pending deltas are written at the end of a request
+        once the interval is due, and when the process exits"""
+        with override_settings(METRICS={**settings.METRICS,
+                                        "PATH": self.path,
+                                        "FLUSH_INTERVAL": 60}), \
+                mock.patch("core.metrics._stores", {}), \
+                mock.patch("core.metrics.atexit.register") as register:
+            worker = get_store()
+            worker.inc("yatube_requests_total", {"view": "index"})
+            request_finished.send(sender=None)
+            self.assertEqual(self.store.collect(), [])
+            worker.flush_interval = 0
+            request_finished.send(sender=None)
+            self.assertEqual(self.store.collect(), [
+                ("yatube_requests_total", 'view="index"', 1)])
+        register.assert_called_once_with(worker.flush)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Tests bucket counts, sum and count of a histogram"""
+        for value in (0.05, 0.5, 1, 50):
+            self.store.observe("yatube_request_duration_seconds",
+                               {"view": "post"}, value, BUCKETS)
+        text = self.store.render()
+        self.assertIn("# TYPE yatube_request_duration_seconds histogram",
+                      text)
+        values = series(text)
+        name = "yatube_request_duration_seconds"
+        self.assertEqual(values[f'{name}_bucket{{view="post",le="0.1"}}'], 1)
+        self.assertEqual(values[f'{name}_bucket{{view="post",le="1.0"}}'], 3)
+        self.assertEqual(values[f'{name}_bucket{{view="post",le="10.0"}}'],
+                         3)
+        self.assertEqual(values[f'{name}_bucket{{view="post",le="+Inf"}}'],
+                         4)
+        self.assertEqual(values[f'{name}_count{{view="post"}}'], 4)
+        self.assertEqual(values[f'{name}_sum{{view="post"}}'], 51.55)
+        buckets = [line for line in text.splitlines() if "_bucket" in line]
+        self.assertTrue(buckets[0].startswith(f'{name}_bucket'))
+        self.assertIn('le="0.1"', buckets[0])
+        self.assertIn('le="+Inf"', buckets[-1])
+
+    def test_label_values_are_escaped(self):
+        """Tests that quotes and backslashes cannot break the format"""
+        self.store.inc("yatube_requests_total", {"view": 'a"b\\c'})
+        self.assertIn('{view="a\\"b\\\\c"} 1', self.store.render())
+
+
+class MetricsEndpointTest(TestCase):
+    """Tests the middleware and the staff-only /metrics/ page"""
+    def setUp(self):
+        """Points the metrics at a temporary file"""
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(METRICS={
+            **settings.METRICS, "ENABLED": True, "FLUSH_INTERVAL": 60,
+            "PATH": os.path.join(self.directory, "metrics.sqlite3")})
+        self.settings.enable()
+        self.staff = Client()
+        self.staff.force_login(User.objects.create_user(
+            username=STAFF_USERNAME, is_staff=True))
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def test_requests_are_recorded_per_view(self):
+        """Tests request counts and query histograms by URL name"""
+        client = Client()
+        client.get(HOMEPAGE_URL)
+        client.get(HOMEPAGE_URL)
+        values = series(self.staff.get(METRICS_URL).content.decode())
+        self.assertEqual(values['yatube_requests_total{method="GET",'
+                                'status="200",view="index"}'], 2)
+        self.assertEqual(
+            values['yatube_request_duration_seconds_count{view="index"}'],
+            2)
+        self.assertGreater(
+            values['yatube_request_queries_sum{view="index"}'], 0)
+
+    def test_uploads_are_measured(self):
+        """Tests that multipart request bodies feed the upload
+        histogram"""
+        user = User.objects.create_user(username=USERNAME)
+        client = Client()
+        client.force_login(user)
+        client.post(reverse("new_post"), {"text": "Hello"})
+        values = series(self.staff.get(METRICS_URL).content.decode())
+        self.assertEqual(
+            values['yatube_upload_size_bytes_count{view="new_post"}'], 1)
+
+    def test_staff_only(self):
+        """Tests that other users get 403 and Prometheus text is served
+        to staff"""
+        user = User.objects.create_user(username=USERNAME)
+        client = Client()
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        client.force_login(user)
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        response = self.staff.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith(
+            "text/plain; version=0.0.4"))
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import ProfilingMiddleware, QueryBudgetExceeded
+from core.profiling import make_token
+
+User = get_user_model()
+
+HOMEPAGE_URL = reverse("index")
+USERNAME = "test_user"
+STAFF_USERNAME = "staff_user"
+
+
+def budget(default, raise_error, views=None):
+    return {"ENABLED": True, "DEFAULT": default,
+            "VIEWS": views or {}, "RAISE": raise_error}
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    """Tests the per-view SQL query budget"""
+    def setUp(self):
+        """Creates an authorised client"""
+        self.user = User.objects.create_user(username=USERNAME)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @override_settings(QUERY_BUDGET=budget(0, True))
+    def test_exceeded_budget_raises(self):
+        """Tests that an exhausted budget fails the request"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(HOMEPAGE_URL)
+
+    @override_settings(QUERY_BUDGET=budget(0, False))
+    def test_exceeded_budget_is_logged(self):
+        """Tests that an exhausted budget is logged in log mode"""
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            response = self.client.get(HOMEPAGE_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("(index)", logs.output[0])
+
+    @override_settings(QUERY_BUDGET=budget(0, True, {"index": 50}))
+    def test_view_budget_overrides_default(self):
+        """Tests that per URL name budgets take precedence"""
+        response = self.client.get(HOMEPAGE_URL)
+        self.assertEqual(response.status_code, 200)
+
+
+def profiling(directory, enabled=True):
+    return {"ENABLED": enabled, "HEADER": "HTTP_X_PROFILE",
+            "QUERY_PARAM": "_profile", "TOKEN_MAX_AGE": 60,
+            "SAMPLE_RATE": 0, "DIRECTORY": directory}
+
+
+def timing(response):
+    """Parses a Server-Timing header into {metric: {param: value}}"""
+    metrics = {}
+    for metric in response["Server-Timing"].split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+class ProfilingMiddlewareTest(TestCase):
+    """Tests the Server-Timing header and on-demand profiles"""
+    def setUp(self):
+        """Points the profile directory at a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(
+            PROFILING=profiling(self.directory))
+        self.settings.enable()
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def profiles(self):
+        return os.listdir(self.directory)
+
+    def test_server_timing(self):
+        """Tests that SQL, template and total times are reported"""
+        user = User.objects.create_user(username=STAFF_USERNAME,
+                                        is_staff=True)
+        self.client.force_login(user)
+        metrics = timing(self.client.get(HOMEPAGE_URL))
+        self.assertEqual(set(metrics), {"total", "sql", "tpl"})
+        self.assertRegex(metrics["sql"]["desc"], r'^"[1-9]\d* queries"$')
+        self.assertGreater(float(metrics["tpl"]["dur"]), 0)
+        self.assertGreaterEqual(float(metrics["total"]["dur"]),
+                                float(metrics["tpl"]["dur"]))
+        self.assertEqual(self.profiles(), [])
+
+    def test_signed_token_saves_a_profile(self):
+        """Tests that a valid token asks for a cProfile dump"""
+        response = self.client.get(HOMEPAGE_URL,
+                                   HTTP_X_PROFILE=make_token())
+        name = timing(response)["prof"]["desc"].strip('"')
+        self.assertEqual(self.profiles(), [name])
+        self.assertIn("-index-", name)
+
+    def test_bad_token_is_ignored(self):
+        """Tests that anonymous users cannot ask for profiles"""
+        response = self.client.get(HOMEPAGE_URL, {"_profile": "1"},
+                                   HTTP_X_PROFILE="forged:token")
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(self.profiles(), [])
+
+    def test_timings_are_hidden_from_the_public(self):
+        """Tests that guests and signed-in users without a token get no
+        Server-Timing header"""
+        self.assertFalse(
+            self.client.get(HOMEPAGE_URL).has_header("Server-Timing"))
+        self.client.force_login(User.objects.create_user(username=USERNAME))
+        self.assertFalse(
+            self.client.get(HOMEPAGE_URL).has_header("Server-Timing"))
+
+    def test_staff_can_ask_without_a_token(self):
+        """Tests that staff sessions profile with the query parameter"""
+        staff = User.objects.create_user(username=STAFF_USERNAME,
+                                         is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(HOMEPAGE_URL, {"_profile": "1"})
+        self.assertIn("prof", timing(response))
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_disabled(self):
+        """Tests that the middleware unloads itself when disabled"""
+        with override_settings(PROFILING=profiling(self.directory,
+                                                   enabled=False)):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(lambda request: None)
+            response = Client().get(HOMEPAGE_URL)
+        self.assertFalse(response.has_header("Server-Timing"))
@@ -0,0 +1,173 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import SQLiteCache
+from core.ratelimit import parse_rate, sliding_window, token_bucket
+from posts.models import Post
+
+User = get_user_model()
+
+KEY = "ratelimit:test"
+NOW = 1_000_000.0
+THREADS = 8
+ATTEMPTS = 10
+USERNAME = "test_user"
+OTHER_USERNAME = "other_user"
+ADDRESS = "10.0.0.1"
+OTHER_ADDRESS = "10.0.0.2"
+
+
+def burst(limiter, *args):
+    """Calls ``limiter`` from THREADS threads at once, ATTEMPTS times
+    each, and returns the number of allowed calls"""
+    allowed = []
+    barrier = threading.Barrier(THREADS)
+
+    def work():
+        barrier.wait()
+        for _ in range(ATTEMPTS):
+            allowed.append(limiter(*args)[0])
+
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(allowed)
+
+
+class LimiterTest(SimpleTestCase):
+    """Tests the token bucket and sliding window limiters"""
+    def setUp(self):
+        """Starts from an empty cache and a fixed clock"""
+        cache.clear()
+        self.clock = mock.patch("time.time", return_value=NOW)
+        self.time = self.clock.start()
+
+    def tearDown(self):
+        self.clock.stop()
+
+    def tick(self, seconds):
+        self.time.return_value += seconds
+
+    def test_parse_rate(self):
+        """Tests the RATE setting format"""
+        self.assertEqual(parse_rate("10/m"), (10, 60))
+        self.assertEqual(parse_rate("5/hour"), (5, 3600))
+
+    def test_bucket_refills_at_the_rate(self):
+        """Tests that a full bucket allows BURST requests, then one
+        request per interval"""
+        results = [token_bucket(KEY, 6, 60, 3, cache) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results],
+                         [True, True, True, False])
+        self.assertEqual(results[-1][1], 10)
+        self.tick(10)
+        self.assertTrue(token_bucket(KEY, 6, 60, 3, cache)[0])
+        self.assertFalse(token_bucket(KEY, 6, 60, 3, cache)[0])
+
+    def test_idle_bucket_is_full_again(self):
+        """Tests that the bucket entry expires once it has refilled"""
+        for _ in range(3):
+            token_bucket(KEY, 6, 60, 3, cache)
+        self.tick(30)
+        self.assertIsNone(cache.get(KEY))
+        self.assertEqual(
+            [token_bucket(KEY, 6, 60, 3, cache)[0] for _ in range(4)],
+            [True, True, True, False])
+
+    def test_sliding_window_weighs_the_previous_window(self):
+        """Tests that requests of the previous window count by their
+        overlap with the sliding one"""
+        self.time.return_value = 60 * 1000
+        self.assertEqual(
+            [sliding_window(KEY, 4, 60, cache)[0] for _ in range(5)],
+            [True, True, True, True, False])
+        # A quarter into the next window, 3/4 of the 4 requests remain.
+        self.tick(75)
+        self.assertTrue(sliding_window(KEY, 4, 60, cache)[0])
+        allowed, wait = sliding_window(KEY, 4, 60, cache)
+        self.assertFalse(allowed)
+        self.assertEqual(wait, 15)
+
+    def test_concurrent_bursts(self):
+        """Tests that threads racing on one key are never allowed more
+        than the limit, with the local and the SQLite cache"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backends = {
+            "locmem": cache,
+            "sqlite": SQLiteCache(os.path.join(directory, "cache.sqlite3"),
+                                  {}),
+        }
+        for name, backend in backends.items():
+            with self.subTest(backend=name):
+                self.assertEqual(
+                    burst(token_bucket, f"{KEY}:{name}", 10, 60, 5,
+                          backend), 5)
+                self.assertEqual(
+                    burst(sliding_window, f"{KEY}:{name}", 10, 60,
+                          backend), 10)
+
+
+class RateLimitMiddlewareTest(TestCase):
+    """Tests 429 responses of throttled write views"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates two users and a post"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.other = User.objects.create_user(username=OTHER_USERNAME)
+        cls.post = Post.objects.create(text="Post", author=cls.user)
+        cls.url = reverse("add_comment", args=[USERNAME, cls.post.pk])
+
+    def setUp(self):
+        """Limits comments to two per hour"""
+        cache.clear()
+        self.settings = override_settings(RATELIMIT={
+            **settings.RATELIMIT, "ENABLED": True,
+            "VIEWS": {"add_comment": {"RATE": "2/h"}}})
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def client_for(self, user, address):
+        client = Client(REMOTE_ADDR=address)
+        client.force_login(user)
+        return client
+
+    def comment(self, client):
+        return client.post(self.url, {"text": "Spam"})
+
+    def test_writes_over_the_limit_get_429(self):
+        """Tests the status, Retry-After and that nothing is written"""
+        client = self.client_for(self.user, ADDRESS)
+        self.assertEqual(self.comment(client).status_code, 302)
+        self.assertEqual(self.comment(client).status_code, 302)
+        response = self.comment(client)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1800")
+        self.assertEqual(self.post.comments.count(), 2)
+        self.assertEqual(client.get(self.url).status_code, 302)
+
+    def test_users_and_addresses_are_limited_separately(self):
+        """Tests that the user limit follows the user to another address
+        and the address limit covers every user behind it"""
+        client = self.client_for(self.user, ADDRESS)
+        self.comment(client)
+        self.comment(client)
+        moved = self.client_for(self.user, OTHER_ADDRESS)
+        self.assertEqual(self.comment(moved).status_code, 429)
+        neighbour = self.client_for(self.other, ADDRESS)
+        self.assertEqual(self.comment(neighbour).status_code, 429)
+        elsewhere = self.client_for(self.other, OTHER_ADDRESS)
+        self.assertEqual(self.comment(elsewhere).status_code, 302)
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.cache import LOCK_KEY
+from core.singleflight import SingleFlight, shared_flight
+
+KEY = "flight"
+THREADS = 8
+RESULT = "result"
+PAYLOAD = b"payload"
+
+
+class SingleFlightTest(SimpleTestCase):
+    """Tests one call per key within a process and across workers"""
+    def setUp(self):
+        """Starts from an empty cache and a call held until released"""
+        cache.clear()
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def func(self):
+        self.calls.append(1)
+        self.started.set()
+        self.release.wait(5)
+        return RESULT, PAYLOAD
+
+    def run_threads(self, target, count):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target()))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_callers_share_one_call(self):
+        """Tests that callers arriving during a call wait for its
+        payload"""
+        leader, results = self.run_threads(
+            lambda: self.flights.do(KEY, self.func, 5), 1)
+        self.started.wait(5)
+        waiters, shared = self.run_threads(
+            lambda: self.flights.do(KEY, self.func, 5), THREADS)
+        # Let the waiters reach the running call.
+        time.sleep(0.1)
+        self.release.set()
+        for thread in leader + waiters:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, [(RESULT, False)])
+        self.assertEqual(shared, [(PAYLOAD, True)] * THREADS)
+        self.assertEqual(self.flights.do(KEY, self.func, 5), (RESULT, False))
+
+    def test_waiters_get_nothing_from_failed_or_slow_calls(self):
+        """Tests the None payload of a failed call and of a timeout"""
+        def fail():
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError
+
+        leader, _ = self.run_threads(
+            lambda: self.assertRaises(ValueError, self.flights.do, KEY,
+                                      fail, 5), 1)
+        self.started.wait(5)
+        self.assertEqual(self.flights.do(KEY, self.func, 0.01), (None, True))
+        waiter, results = self.run_threads(
+            lambda: self.flights.do(KEY, self.func, 5), 1)
+        time.sleep(0.1)
+        self.release.set()
+        for thread in leader + waiter:
+            thread.join()
+        self.assertEqual(results, [(None, True)])
+        self.assertEqual(self.calls, [])
+
+    def test_workers_share_one_call_through_the_cache(self):
+        """Tests that a caller waits for the payload another worker
+        stores, and stores its own when it holds the lock"""
+        cache.add(LOCK_KEY.format(key=KEY), 1)
+        waiter, results = self.run_threads(
+            lambda: shared_flight(KEY, self.func, 5), 1)
+        time.sleep(0.1)
+        cache.set(KEY, PAYLOAD)
+        cache.delete(LOCK_KEY.format(key=KEY))
+        waiter[0].join()
+        self.assertEqual(results, [(PAYLOAD, True)])
+        self.assertEqual(self.calls, [])
+        cache.clear()
+        self.release.set()
+        self.assertEqual(shared_flight(KEY, self.func, 5), (RESULT, False))
+        self.assertEqual(cache.get(KEY), PAYLOAD)
+        self.assertIsNone(cache.get(LOCK_KEY.format(key=KEY)))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+
+from .metrics import get_store
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics(request):
+    """Serve the metrics of all workers to staff in the Prometheus text
+    format."""
+    if not settings.METRICS["ENABLED"]:
+        raise Http404
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(get_store().render(),
+                        content_type=PROMETHEUS_CONTENT_TYPE)
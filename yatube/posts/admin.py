@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, ThumbnailJob
+from .search import matching_posts
 
 
 @admin.register(Post)
@@ -10,6 +11,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served from the full text index instead of LIKE '%term%'.
+        if not search_term:
+            return queryset, False
+        matching = matching_posts(search_term)
+        if matching is None:
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -33,3 +43,10 @@ class FollowAdmin(admin.ModelAdmin):
     search_fields = ("user",)
     list_filter = ("user",)
     empty_value_display = "-пусто-"
+
+
+@admin.register(ThumbnailJob)
+class ThumbnailJobAdmin(admin.ModelAdmin):
+    list_display = ("post", "status", "attempts", "updated")
+    list_filter = ("status",)
+    empty_value_display = "-пусто-"
@@ -0,0 +1,78 @@
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+@contextmanager
+def isolated_settings():
+    """Run a benchmark with a cache of its own in a temporary directory
+    and without rate limits.
+
+    The rows a benchmark writes fire the signals that bump versions and
+    purge pages, so on the site's cache it would empty the running
+    site's caches, and --cold runs would clear them outright.
+    """
+    with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={"default": {
+                **settings.CACHES["default"],
+                "LOCATION": os.path.join(directory, "cache.sqlite3")}},
+            RATELIMIT={**settings.RATELIMIT, "ENABLED": False}):
+        yield
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(timings):
+    return {
+        "runs": len(timings),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def measure(func, repeat=10):
+    """Call ``func`` ``repeat`` times and summarize the wall time of
+    each call in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def measure_requests(request, repeat=10, before=None):
+    """Send ``request()`` ``repeat`` times, calling ``before()`` ahead of
+    each untimed. Returns the latency summary with the status code and
+    the SQL query counts of the runs."""
+    timings = []
+    queries = []
+    status = None
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+        status = response.status_code
+    return {
+        "status": status,
+        "queries_min": min(queries),
+        "queries_max": max(queries),
+        **summarize(timings),
+    }
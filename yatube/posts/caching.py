@@ -0,0 +1,122 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+
+from core.cache import get_or_set_locked
+
+from .pagination import CursorPage, CursorPaginator, encode_cursor, get_page
+
+FEED_VERSION_KEY = "posts:feed_version"
+POST_VERSION_KEY = "posts:post:{pk}:version"
+GROUP_VERSION_KEY = "posts:group:{pk}:version"
+AUTHOR_VERSION_KEY = "posts:author:{pk}:version"
+TIMELINE_VERSION_KEY = "posts:timeline:{pk}:version"
+PAGE_KEY = "posts:page:{name}:{version}:{query}"
+COUNT_KEY = "posts:count:{name}:{versions}"
+PAGE_TIMEOUT = 60 * 60
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost version key never brings back
+        # pages stored under an old number.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = get_version(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def count_key(name, *version_keys):
+    """Return the cache key of the total count of listing ``name`` as
+    of the current values of ``version_keys``."""
+    versions = ".".join(str(version)
+                        for version in get_versions(list(version_keys)))
+    return COUNT_KEY.format(name=name, versions=versions)
+
+
+def _page_number(number, count):
+    # Paginator.get_page() serves the last page for numbers out of range.
+    if count is None:
+        return number
+    last = max(math.ceil(count / settings.POSTS_ON_PAGE), 1)
+    return number if 1 <= number <= last else last
+
+
+def page_query(request, object_list, total_key):
+    """Return the part of a page key naming the page ``get_page()``
+    selects for ``request``.
+
+    Cursors are checked and encoded again and numbers out of range name
+    the last page, so crafted queries map onto the pages that exist.
+    """
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    if after or before or (settings.CURSOR_PAGINATION
+                           and "page" not in request.GET):
+        paginator = CursorPaginator(object_list, settings.POSTS_ON_PAGE)
+        for name, token in (("before", before), ("after", after)):
+            values = paginator.decode(token)
+            if values is not None:
+                return f"{name}:{encode_cursor(values)}"
+        return "first"
+    try:
+        number = int(request.GET.get("page", ""))
+    except ValueError:
+        number = 1
+    return f"page:{_page_number(number, cache.get(total_key))}"
+
+
+def _freeze(page):
+    if isinstance(page, CursorPage):
+        return ("cursor", list(page.object_list), page.ordering,
+                page.has_next(), page.has_previous())
+    return ("number", list(page.object_list), page.number,
+            page.paginator.count)
+
+
+def _thaw(frozen, object_list):
+    kind, posts, *state = frozen
+    if kind == "cursor":
+        ordering, has_next, has_previous = state
+        return CursorPage(posts, ordering, has_next, has_previous)
+    number, count = state
+    paginator = Paginator(object_list, settings.POSTS_ON_PAGE)
+    paginator.count = count
+    return Page(posts, number, paginator)
+
+
+def get_cached_page(request, object_list, name, version_key):
+    """Return the requested page of ``object_list`` from the cache.
+
+    Pages are stored with their total count under the current value of
+    ``version_key``, so bumping the version invalidates all of them; the
+    count itself is shared by all pages of the version.
+    Only one worker renders a missing or expired page at a time.
+    """
+    version = get_version(version_key)
+    total_key = COUNT_KEY.format(name=name, versions=version)
+    key = PAGE_KEY.format(name=name, version=version,
+                          query=page_query(request, object_list, total_key))
+    frozen = get_or_set_locked(
+        key,
+        lambda: _freeze(get_page(request, object_list, count_key=total_key)),
+        PAGE_TIMEOUT)
+    return _thaw(frozen, object_list)
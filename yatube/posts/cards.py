@@ -0,0 +1,141 @@
+from collections import namedtuple
+
+from .models import ImageVariant, Post
+from .pagination import POST_ORDERING, keyset_slice
+
+# Columns of a PostCard row, in PostCard.from_row() order.
+CARD_FIELDS = ("id", "text", "pub_date", "image", "comment_count",
+               "author_id", "author__username",
+               "group_id", "group__slug", "group__title")
+VARIANT_FIELDS = ("post_id", "geometry", "format", "width", "height",
+                  "file")
+VARIANT_ORDERING = ("post_id", "geometry", "format", "width")
+
+
+class CardAuthor(namedtuple("CardAuthor", "pk username")):
+    __slots__ = ()
+
+    def __str__(self):
+        return self.username
+
+
+class CardGroup(namedtuple("CardGroup", "pk slug title")):
+    __slots__ = ()
+
+    def __str__(self):
+        return self.title
+
+
+class CardVariant(namedtuple("CardVariant",
+                             "geometry format width height file")):
+    __slots__ = ()
+    _storage = ImageVariant._meta.get_field("file").storage
+
+    @property
+    def url(self):
+        return self._storage.url(self.file)
+
+
+class PostCard:
+    """The fields of a post that listing pages render, read with
+    ``values_list`` instead of as ``Post``, ``User`` and ``Group``
+    instances.
+
+    ``card == post`` holds for the ``Post`` it was read from, but only
+    from the card's side: ``Model.__eq__`` returns ``False`` for
+    anything but a model instance, so ``post == card`` does not.
+    ``image`` is the file name, and the image variants are in
+    ``variants``.
+    """
+    __slots__ = ("id", "text", "pub_date", "image", "comment_count",
+                 "author", "group", "variants")
+
+    def __init__(self, id, text, pub_date, image, comment_count, author,
+                 group=None, variants=()):
+        self.id = id
+        self.text = text
+        self.pub_date = pub_date
+        self.image = image
+        self.comment_count = comment_count
+        self.author = author
+        self.group = group
+        self.variants = variants
+
+    @classmethod
+    def from_row(cls, row):
+        (pk, text, pub_date, image, comment_count, author_id, username,
+         group_id, slug, title) = row
+        group = CardGroup(group_id, slug, title) if group_id else None
+        return cls(pk, text, pub_date, image, comment_count,
+                   CardAuthor(author_id, username), group)
+
+    def __repr__(self):
+        return f"<PostCard {self.id}>"
+
+    def __eq__(self, other):
+        if isinstance(other, (PostCard, Post)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def author_id(self):
+        return self.author.pk
+
+    @property
+    def group_id(self):
+        return self.group.pk if self.group else None
+
+
+def attach_variants(cards):
+    """Fill in the image variants of ``cards`` with one query."""
+    with_image = {card.pk: card for card in cards if card.image}
+    if with_image:
+        variants = {pk: [] for pk in with_image}
+        for post_id, *variant in ImageVariant.objects.filter(
+                post_id__in=with_image
+        ).order_by(*VARIANT_ORDERING).values_list(*VARIANT_FIELDS):
+            variants[post_id].append(CardVariant(*variant))
+        for pk, card in with_image.items():
+            card.variants = tuple(variants[pk])
+    return cards
+
+
+def post_cards(rows):
+    return attach_variants([PostCard.from_row(row) for row in rows])
+
+
+class PostCards:
+    """A ``Post`` queryset read as ``PostCard``s, for ``Paginator`` and
+    ``CursorPaginator``."""
+    ordered = True
+
+    def __init__(self, queryset, ordering=POST_ORDERING):
+        self.queryset = queryset
+        self.ordering = ordering
+
+    @property
+    def model(self):
+        return self.queryset.model
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return post_cards(self.queryset.values_list(*CARD_FIELDS)[index])
+
+    def keyset_slice(self, values, reverse, limit):
+        return post_cards(keyset_slice(
+            self.queryset.values_list(*CARD_FIELDS), self.ordering, values,
+            reverse, limit))
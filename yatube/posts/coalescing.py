@@ -0,0 +1,86 @@
+import pickle
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+
+from core.metrics import get_store
+from core.singleflight import SingleFlight, shared_flight
+
+from .caching import get_version
+from .pagecache import GENERATION_KEY, url_digest
+
+# Shared results outlive their render by up to TIMEOUT seconds; any
+# purge moves later requests to a new key.
+FLIGHT_KEY = "posts:flight:{url}:{generation}"
+
+_flights = SingleFlight()
+
+
+def _record(request, result):
+    if not settings.METRICS["ENABLED"]:
+        return
+    view = getattr(request.resolver_match, "url_name", None) or "unmatched"
+    get_store().inc("yatube_coalesced_renders_total",
+                    {"view": view, "result": result})
+
+
+def _shareable(request, response):
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get("CSRF_COOKIE_USED"))
+
+
+def _shared_copy(request, payload):
+    response = pickle.loads(payload)
+    # The render answered another request's validators, not these.
+    return get_conditional_response(
+        request, etag=response.get("ETag"), response=response) or response
+
+
+def coalesce_renders(view):
+    """Let concurrent identical GET requests of signed-out visitors wait
+    for one render of the page and share it.
+
+    Requests are identical when their absolute URLs match. With
+    ``COALESCING["SHARED"]`` the requests of all workers wait for one
+    render through the default cache. A waiter whose render fails or
+    takes longer than ``TIMEOUT`` seconds renders the page itself. The
+    ``yatube_coalesced_renders_total`` metric counts renders and the
+    requests that reused one within the worker or across workers.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        options = settings.COALESCING
+        if not options["ENABLED"] or request.method not in ("GET", "HEAD") \
+                or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = FLIGHT_KEY.format(url=url_digest(request),
+                                generation=get_version(GENERATION_KEY))
+
+        def render():
+            response = view(request, *args, **kwargs)
+            _record(request, "rendered")
+            payload = None
+            if _shareable(request, response):
+                payload = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
+            return response, payload
+
+        def lead():
+            if not options["SHARED"]:
+                return render()
+            value, shared = shared_flight(key, render, options["TIMEOUT"])
+            if not shared:
+                return value
+            _record(request, "shared")
+            return _shared_copy(request, value), value
+
+        value, shared = _flights.do(key, lead, options["TIMEOUT"])
+        if not shared:
+            return value
+        if value is None:
+            return view(request, *args, **kwargs)
+        _record(request, "local")
+        return _shared_copy(request, value)
+    return wrapper
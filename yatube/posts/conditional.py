@@ -0,0 +1,101 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .caching import (AUTHOR_VERSION_KEY, FEED_VERSION_KEY,
+                      GROUP_VERSION_KEY, POST_VERSION_KEY, get_versions)
+from .models import Group, Post, User
+from .pagination import POST_ORDERING, order_by_expressions
+
+STATS_FIELDS = ("stats__posts_count", "stats__followers_count",
+                "stats__following_count")
+
+
+def _viewer(request):
+    # Signed-in pages carry the viewer's links and a CSRF token; the
+    # token stays valid for as long as the CSRF cookie does.
+    if not request.user.is_authenticated:
+        return ["anonymous"]
+    return [request.user.pk, request.META.get("CSRF_COOKIE", "")]
+
+
+def _etag(*parts):
+    digest = hashlib.md5(
+        "|".join(str(part) for part in parts).encode()).hexdigest()
+    # Pages that compare equal are not byte for byte the same: CSRF
+    # tokens are masked anew on every render.
+    return f'W/"{digest}"'
+
+
+def _latest(posts):
+    return posts.order_by(*order_by_expressions(POST_ORDERING)).values_list(
+        "pub_date", "id").first()
+
+
+def post_etag(request, username, post_id):
+    # The post is found by its key; any ORDER BY would make SQLite sort.
+    rows = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).order_by().values_list(
+        "author_id", "group_id", "pub_date", "comment_count",
+        *(f"author__{field}" for field in STATS_FIELDS)
+    )[:1]
+    if not rows:
+        return None
+    row = rows[0]
+    author_id, group_id, *_ = row
+    # Renamed commenters bump the feed version, not the post's.
+    keys = [FEED_VERSION_KEY, POST_VERSION_KEY.format(pk=post_id),
+            AUTHOR_VERSION_KEY.format(pk=author_id)]
+    if group_id:
+        keys.append(GROUP_VERSION_KEY.format(pk=group_id))
+    return _etag(*row, *get_versions(keys), *_viewer(request))
+
+
+def profile_etag(request, username):
+    row = User.objects.filter(username=username).values_list(
+        "pk", *STATS_FIELDS).first()
+    if row is None:
+        return None
+    author_id = row[0]
+    # Post edits and comments bump the feed version, not the author's.
+    versions = get_versions([FEED_VERSION_KEY,
+                             AUTHOR_VERSION_KEY.format(pk=author_id)])
+    return _etag(*row, _latest(Post.objects.filter(author_id=author_id)),
+                 *versions, *_viewer(request))
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "pk", flat=True).first()
+    if group_id is None:
+        return None
+    versions = get_versions([FEED_VERSION_KEY,
+                             GROUP_VERSION_KEY.format(pk=group_id)])
+    return _etag(group_id, _latest(Post.objects.filter(group_id=group_id)),
+                 *versions, *_viewer(request))
+
+
+def conditional_page(etag_func):
+    """Answer GET requests whose If-None-Match matches ``etag_func`` with
+    304 Not Modified before the view runs.
+
+    Every response must be revalidated; anonymous ones may be kept by
+    shared caches, which revalidate with the same ETag.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                audience = "private" if request.user.is_authenticated \
+                    else "public"
+                patch_cache_control(response, no_cache=True,
+                                    **{audience: True})
+            return response
+        return wrapper
+    return decorator
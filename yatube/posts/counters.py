@@ -0,0 +1,127 @@
+from itertools import islice
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+REPAIR_BATCH_SIZE = 1000
+USER_COUNTERS = {
+    "posts_count": (Post, "author"),
+    "followers_count": (Follow, "author"),
+    "following_count": (Follow, "user"),
+}
+
+
+def _add(queryset, **deltas):
+    # Counters that drifted low stop at zero instead of failing the
+    # CHECK constraint of their unsigned column.
+    return queryset.update(**{
+        field: F(field) + delta if delta >= 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def add_user_counts(user_id, **deltas):
+    """Atomically add ``deltas`` to a user's counters, creating and
+    recounting the row if it is missing.
+
+    A row missing on a decrement is not recreated: the user is being
+    deleted, and the row went with it.
+    """
+    if _add(UserStats.objects.filter(user_id=user_id), **deltas):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        repair_user_stats(User.objects.filter(pk=user_id))
+
+
+def add_comment_count(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), comment_count=delta)
+
+
+def add_reply_count(comment_id, delta):
+    _add(Comment.objects.filter(pk=comment_id), reply_count=delta)
+
+
+def _count(model, field):
+    counted = model.objects.filter(
+        **{field: OuterRef("pk")}
+    ).order_by().values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def _bulk_update(model, rows, fields):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, REPAIR_BATCH_SIZE))
+        if not batch:
+            break
+        model.objects.bulk_update(batch, fields)
+
+
+def repair_comment_counts(dry_run=False):
+    """Recount ``Post.comment_count`` and fix drifted rows; return the
+    number of drifted posts."""
+    drifted = Post.objects.annotate(
+        actual=_count(Comment, "post")
+    ).exclude(
+        comment_count=F("actual")
+    ).values_list("pk", "actual")
+    if dry_run:
+        return drifted.count()
+    rows = [Post(pk=pk, comment_count=actual) for pk, actual in drifted]
+    _bulk_update(Post, rows, ["comment_count"])
+    return len(rows)
+
+
+def repair_reply_counts(dry_run=False):
+    """Recount ``Comment.reply_count`` and fix drifted rows; return the
+    number of drifted comments."""
+    drifted = Comment.objects.annotate(
+        actual=_count(Comment, "parent")
+    ).exclude(
+        reply_count=F("actual")
+    ).values_list("pk", "actual")
+    if dry_run:
+        return drifted.count()
+    rows = [Comment(pk=pk, reply_count=actual) for pk, actual in drifted]
+    _bulk_update(Comment, rows, ["reply_count"])
+    return len(rows)
+
+
+def repair_user_stats(users=None, dry_run=False):
+    """Create missing ``UserStats`` rows for ``users`` (all users by
+    default), recount their counters and return the number of drifted
+    rows."""
+    if users is None:
+        users = User.objects.all()
+    missing = users.filter(stats__isnull=True).values_list("pk", flat=True)
+    if dry_run:
+        created = missing.count()
+    else:
+        created = len(UserStats.objects.bulk_create(
+            (UserStats(user_id=pk) for pk in missing),
+            ignore_conflicts=True
+        ))
+    actual = {
+        f"actual_{field}": _count(model, lookup)
+        for field, (model, lookup) in USER_COUNTERS.items()
+    }
+    drifted = UserStats.objects.filter(
+        user__in=users
+    ).annotate(**actual)
+    drifted = drifted.exclude(
+        posts_count=F("actual_posts_count"),
+        followers_count=F("actual_followers_count"),
+        following_count=F("actual_following_count"),
+    ).values_list("pk", *actual)
+    if dry_run:
+        return created + drifted.count()
+    rows = [
+        UserStats(user_id=pk, posts_count=posts, followers_count=followers,
+                  following_count=following)
+        for pk, posts, followers, following in drifted
+    ]
+    _bulk_update(UserStats, rows, list(USER_COUNTERS))
+    return created + len(rows)
@@ -0,0 +1,290 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .cards import CARD_FIELDS, PostCard, attach_variants, post_cards
+from .models import Follow, Post, TimelineEntry, UserStats
+from .pagination import (POST_ORDERING, keyset_q, order_by_expressions,
+                         reverse_ordering)
+
+TIMELINE_BATCH_SIZE = 500
+KEY_BATCH_SIZE = 500
+PULLED_AUTHORS_KEY = "feed:pulled_authors"
+PULLED_AUTHORS_TIMEOUT = 60 * 5
+TIMELINE_ORDERING = ("-timeline_entries__pub_date",
+                     "-timeline_entries__post_id")
+
+
+def _insert_entries(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, TIMELINE_BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def pulled_authors():
+    """Return ids of the authors whose posts are merged into feeds at
+    read time instead of being pushed into every follower's timeline."""
+    authors = cache.get(PULLED_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(UserStats.objects.filter(
+            feed_pulled=True
+        ).values_list("user_id", flat=True))
+        cache.set(PULLED_AUTHORS_KEY, authors, PULLED_AUTHORS_TIMEOUT)
+    return authors
+
+
+def forget_pulled_authors():
+    cache.delete(PULLED_AUTHORS_KEY)
+
+
+def reset_feed_modes():
+    """Pull the authors above ``FEED_FANOUT_THRESHOLD`` and push all
+    others, for timelines about to be rebuilt from scratch."""
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    UserStats.objects.filter(
+        followers_count__gt=threshold, feed_pulled=False
+    ).update(feed_pulled=True)
+    UserStats.objects.filter(
+        followers_count__lte=threshold, feed_pulled=True
+    ).update(feed_pulled=False)
+    forget_pulled_authors()
+
+
+def push_post(post):
+    """Fan a freshly saved post out into its author's followers'
+    timelines."""
+    if post.author_id in pulled_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user_id", flat=True)
+    _insert_entries(
+        TimelineEntry(user_id=user_id,
+                      author_id=post.author_id,
+                      post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill_follow(user_id, author_id):
+    """Copy the existing posts of a newly followed author into the
+    follower's timeline."""
+    if author_id in pulled_authors():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list("id", "pub_date")
+    _insert_entries(
+        TimelineEntry(user_id=user_id,
+                      author_id=author_id,
+                      post_id=post_id,
+                      pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune_follow(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        author_id=author_id
+    ).delete()
+
+
+def _followers(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id
+    ).values_list("followers_count", flat=True).first()
+
+
+def follow_created(user_id, author_id):
+    followers = _followers(author_id)
+    if followers is not None \
+            and followers > settings.FEED_FANOUT_THRESHOLD \
+            and UserStats.objects.filter(
+                user_id=author_id, feed_pulled=False
+            ).update(feed_pulled=True):
+        forget_pulled_authors()
+    backfill_follow(user_id, author_id)
+
+
+def follow_deleted(user_id, author_id):
+    # Authors falling back under the threshold stay pulled: copying
+    # their posts into every timeline is left to push_authors().
+    prune_follow(user_id, author_id)
+
+
+def _copy_author_posts(author_id):
+    # One INSERT ... SELECT for all followers; rows already there stay.
+    entry_table = TimelineEntry._meta.db_table
+    follow_table = Follow._meta.db_table
+    post_table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {entry_table} (user_id, author_id, post_id, "
+            f"pub_date) SELECT follow.user_id, follow.author_id, post.id, "
+            f"post.pub_date FROM {follow_table} follow "
+            f"JOIN {post_table} post ON post.author_id = follow.author_id "
+            f"WHERE follow.author_id = %s ON CONFLICT DO NOTHING",
+            [author_id])
+
+
+def push_authors():
+    """Switch the pulled authors with at most ``FEED_PUSH_THRESHOLD``
+    followers back to fan-out on write, copying their posts into the
+    followers' timelines. Returns the number of authors switched.
+
+    Feeds keep merging an author's posts at read time until the copy is
+    done. Workers may skip the author's new posts and follows until
+    they see the switch, so the posts are copied once more after it.
+    """
+    authors = UserStats.objects.filter(
+        feed_pulled=True,
+        followers_count__lte=settings.FEED_PUSH_THRESHOLD
+    ).values_list("user_id", flat=True)
+    switched = 0
+    for author_id in list(authors):
+        with transaction.atomic():
+            _copy_author_posts(author_id)
+            switched += UserStats.objects.filter(
+                user_id=author_id, feed_pulled=True
+            ).update(feed_pulled=False)
+        forget_pulled_authors()
+        _copy_author_posts(author_id)
+    return switched
+
+
+def rebuild_timelines():
+    """Recreate every timeline from the follow graph in one INSERT ...
+    SELECT, skipping the authors above ``FEED_FANOUT_THRESHOLD``, which
+    are pulled from now on. Returns the number of entries.
+
+    Rows go in (user, post) order, so the unique index is appended to
+    rather than updated at random.
+    """
+    reset_feed_modes()
+    entry_table = TimelineEntry._meta.db_table
+    follow_table = Follow._meta.db_table
+    post_table = Post._meta.db_table
+    stats_table = UserStats._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {entry_table}")
+        cursor.execute(
+            f"INSERT INTO {entry_table} (user_id, author_id, post_id, "
+            f"pub_date) SELECT follow.user_id, follow.author_id, post.id, "
+            f"post.pub_date FROM {follow_table} follow "
+            f"JOIN {post_table} post ON post.author_id = follow.author_id "
+            f"WHERE follow.author_id NOT IN (SELECT user_id "
+            f"FROM {stats_table} WHERE feed_pulled) "
+            f"ORDER BY follow.user_id, post.id")
+        return cursor.rowcount
+
+
+class FeedSequence:
+    """Lazy follow feed of ``PostCard``s for ``Paginator`` and
+    ``CursorPaginator``.
+
+    Pushed posts come from the reader's timeline, posts of pulled
+    authors from their own ``-pub_date`` streams; a page is a k-way heap
+    merge of the heads of all streams. Numbered pages find the key their
+    first post follows by merging the key columns of the streams alone,
+    then seek every stream past it.
+    """
+    ordered = True
+    model = Post
+
+    def __init__(self, user):
+        pulled = Follow.objects.filter(
+            user=user,
+            author_id__in=pulled_authors()
+        ).values_list("author_id", flat=True)
+        self.pulled = sorted(pulled)
+        timeline = Q(timeline_entries__user=user)
+        if self.pulled:
+            timeline &= ~Q(author_id__in=self.pulled)
+        # Every stream is ordered by the same (pub_date, id) key; the
+        # timeline reads it from its own index.
+        self.streams = [(timeline, TIMELINE_ORDERING)] + [
+            (Q(author_id=author_id), POST_ORDERING)
+            for author_id in self.pulled
+        ]
+
+    def _stream(self, condition, ordering, values=None, reverse=False,
+                fields=CARD_FIELDS):
+        if reverse:
+            ordering = reverse_ordering(ordering)
+        if values is not None:
+            condition &= keyset_q(ordering, values)
+        # A single filter() call keeps one join to the timeline.
+        return Post.objects.filter(condition).values_list(
+            *fields).order_by(*order_by_expressions(ordering))
+
+    def _keys(self, condition, ordering, batch_size):
+        # The (pub_date, id) keys of a stream, read from its index in
+        # batches that each seek past the last one.
+        fields = [field.lstrip("-") for field in ordering]
+        values = None
+        while True:
+            batch = list(self._stream(condition, ordering, values,
+                                      fields=fields)[:batch_size])
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            values = batch[-1]
+
+    def _key_at(self, position):
+        batch_size = min(position + 1, KEY_BATCH_SIZE)
+        keys = heapq.merge(
+            *(self._keys(condition, ordering, batch_size)
+              for condition, ordering in self.streams),
+            reverse=True
+        )
+        return next(islice(keys, position, None), None)
+
+    def _merge(self, heads, reverse=False):
+        # Image variants are read once for the merged page.
+        heads = [map(PostCard.from_row, head) for head in heads]
+        return heapq.merge(
+            *heads,
+            key=lambda card: (card.pub_date, card.pk),
+            reverse=not reverse
+        )
+
+    def count(self):
+        return sum(self._stream(*stream).count()
+                   for stream in self.streams)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if len(self.streams) == 1:
+            return post_cards(self._stream(*self.streams[0])[index])
+        start, stop = index.start or 0, index.stop
+        if not start:
+            return self.keyset_slice(None, False, stop)
+        key = self._key_at(start - 1)
+        if key is None:
+            return []
+        return self.keyset_slice(key, False, stop - start)
+
+    def keyset_slice(self, values, reverse, limit):
+        heads = [
+            self._stream(condition, ordering, values, reverse)[:limit]
+            for condition, ordering in self.streams
+        ]
+        return attach_variants(
+            list(islice(self._merge(heads, reverse), limit)))
+
+
+def get_feed(user):
+    return FeedSequence(user)
@@ -0,0 +1,120 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import ImageVariant, Post
+
+VARIANT_DIR = "posts/variants/"
+EXTENSIONS = {ImageVariant.WEBP: "webp", ImageVariant.JPEG: "jpg"}
+# Metadata Pillow would otherwise carry over into a re-encoded image.
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+
+def variant_sizes(source_size, geometry):
+    """Return the (width, height) of every variant of the geometry that
+    does not upscale the source; the narrowest one is always rendered.
+    """
+    ratio_width, ratio_height = geometry["ratio"]
+    widths = sorted(geometry["widths"])
+    fitting = [width for width in widths if width <= source_size[0]]
+    return [(width, round(width * ratio_height / ratio_width))
+            for width in fitting or widths[:1]]
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info)
+
+
+def encode(image, image_format, icc_profile=None):
+    """Encode ``image`` without metadata, keeping only the color profile."""
+    options = {"quality": settings.IMAGE_VARIANT_QUALITY}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if image_format == ImageVariant.WEBP:
+        image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+        options["method"] = 4
+        pil_format = "WEBP"
+    else:
+        if _has_alpha(image):
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image.convert("RGBA"),
+                             mask=image.convert("RGBA"))
+            image = background
+        image = image.convert("RGB")
+        options.update(optimize=True, progressive=True)
+        pil_format = "JPEG"
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _open_source(post):
+    with post.image.storage.open(post.image.name, "rb") as file:
+        image = Image.open(file)
+        image.load()
+    return image
+
+
+def strip_original(post, image):
+    """Rewrite the uploaded file without EXIF, XMP and comments, with
+    its orientation applied to the pixels. Returns the cleaned image.
+    """
+    cleaned = ImageOps.exif_transpose(image)
+    for key in METADATA_KEYS:
+        cleaned.info.pop(key, None)
+    if not any(key in image.info for key in METADATA_KEYS) \
+            and not image.getexif():
+        return cleaned
+    image_format = image.format or "PNG"
+    options = {}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    if image_format == "JPEG":
+        options["quality"] = 95
+    buffer = BytesIO()
+    cleaned.save(buffer, image_format, **options)
+    storage = post.image.storage
+    old_name = post.image.name
+    name = storage.save(old_name, ContentFile(buffer.getvalue()))
+    Post.objects.filter(pk=post.pk).update(image=name)
+    post.image.name = name
+    storage.delete(old_name)
+    return cleaned
+
+
+def render_variants(post):
+    """Replace the image variants of ``post`` with fresh ones for every
+    geometry in settings.IMAGE_GEOMETRIES, width and format.
+    """
+    source = strip_original(post, _open_source(post))
+    icc_profile = source.info.get("icc_profile")
+    storage = post.image.storage
+    variants = []
+    for name, geometry in settings.IMAGE_GEOMETRIES.items():
+        for size in variant_sizes(source.size, geometry):
+            image = ImageOps.fit(source, size, Image.LANCZOS)
+            for image_format, extension in EXTENSIONS.items():
+                content = encode(image, image_format, icc_profile)
+                path = storage.save(
+                    f"{VARIANT_DIR}{post.pk}-{name}-{size[0]}.{extension}",
+                    ContentFile(content))
+                variants.append(ImageVariant(
+                    post=post, geometry=name, format=image_format,
+                    width=size[0], height=size[1], size=len(content),
+                    file=path))
+    old = list(post.image_variants.values_list("file", flat=True))
+    with transaction.atomic():
+        post.image_variants.all().delete()
+        ImageVariant.objects.bulk_create(variants)
+    for path in old:
+        storage.delete(path)
+    return variants
+
+
+def srcset(variants):
+    return ", ".join(f"{variant.url} {variant.width}w"
+                     for variant in variants)
@@ -0,0 +1,70 @@
+import pickle
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.benchmarks import isolated_settings, measure
+from posts.cards import PostCards
+from posts.models import Group, Post, User
+
+BENCH_USERNAME = "cardbench"
+
+
+def allocated(func):
+    """Return the bytes still allocated by what ``func`` returns."""
+    tracemalloc.start()
+    try:
+        result = func()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+class Command(BaseCommand):
+    help = ("Compare reading a listing page as Post model instances with "
+            "reading it as PostCard read models: fetch latency, memory "
+            "held by the page and its pickled size in the page cache. "
+            "Rows are created in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=100,
+                            help="Posts on the listing page.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_settings(), transaction.atomic():
+            author = self.create_posts(options["posts"])
+            self.run(author, options["posts"], options["repeat"])
+            transaction.set_rollback(True)
+
+    def create_posts(self, count):
+        author = User.objects.create_user(username=BENCH_USERNAME)
+        group = Group.objects.create(title=BENCH_USERNAME,
+                                     slug=BENCH_USERNAME)
+        Post.objects.bulk_create(
+            Post(text=f"Benchmark post {number}\nsecond line",
+                 author=author, group=group)
+            for number in range(count)
+        )
+        return author
+
+    def run(self, author, count, repeat):
+        posts = Post.objects.filter(author=author)
+        readers = {
+            "models": lambda: list(posts.select_related(
+                "author", "group").prefetch_related("image_variants")[:count]),
+            "cards": lambda: PostCards(posts)[:count],
+        }
+        self.stdout.write(f"posts={count} repeat={repeat}")
+        for name, read in readers.items():
+            result = measure(read, repeat)
+            memory = allocated(read)
+            pickled = len(pickle.dumps(read(), pickle.HIGHEST_PROTOCOL))
+            self.stdout.write(
+                f"{name:>6}: p50 {result['p50_ms']} ms, "
+                f"p95 {result['p95_ms']} ms, mean {result['mean_ms']} ms, "
+                f"{memory / 1024:.1f} KiB held, "
+                f"{pickled / 1024:.1f} KiB pickled")
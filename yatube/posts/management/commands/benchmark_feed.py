@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import feed
+from posts.benchmarks import isolated_settings, measure
+from posts.counters import repair_user_stats
+from posts.models import Follow, Post, User
+
+BENCH_PREFIX = "feedbench"
+
+
+class Command(BaseCommand):
+    help = ("Measure the write (fan-out) and read (follow feed page) cost "
+            "of posts by authors on both sides of FEED_FANOUT_THRESHOLD. "
+            "All rows are created in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--followers", type=int, nargs="+",
+            default=[10, 100, 1000, 5000],
+            help="Follower counts of the benchmarked authors.")
+        parser.add_argument(
+            "--threshold", type=int, default=None,
+            help="Fan-out threshold to benchmark with "
+                 "(defaults to FEED_FANOUT_THRESHOLD).")
+        parser.add_argument(
+            "--pulled-authors", type=int, default=3,
+            help="How many pulled authors the reader follows.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if threshold is None:
+            threshold = settings.FEED_FANOUT_THRESHOLD
+        with isolated_settings(), \
+                override_settings(FEED_FANOUT_THRESHOLD=threshold), \
+                transaction.atomic():
+            self.run(threshold, options)
+            transaction.set_rollback(True)
+
+    def run(self, threshold, options):
+        self.stdout.write(
+            f"threshold={threshold} repeat={options['repeat']}")
+        self.stdout.write(
+            f"{'followers':>10} {'mode':>5} {'write p50':>10} "
+            f"{'write p95':>10} {'read p50':>9} {'read p95':>9}")
+        readers = self.create_users("reader", max(options["followers"]))
+        for followers in options["followers"]:
+            authors = self.create_users(
+                f"author{followers}x", options["pulled_authors"])
+            Follow.objects.bulk_create(
+                Follow(user=reader, author=author)
+                for author in authors
+                for reader in readers[:followers]
+            )
+            repair_user_stats(User.objects.filter(
+                username__startswith=BENCH_PREFIX))
+            feed.reset_feed_modes()
+            author = authors[0]
+            mode = "pull" if author.pk in feed.pulled_authors() else "push"
+            write = measure(
+                lambda: Post.objects.create(text="benchmark",
+                                            author=author),
+                options["repeat"]
+            )
+            reader = readers[0]
+            read = measure(
+                lambda: list(feed.get_feed(reader)[:settings.POSTS_ON_PAGE]),
+                options["repeat"]
+            )
+            self.stdout.write(
+                f"{followers:>10} {mode:>5} {write['p50_ms']:>10} "
+                f"{write['p95_ms']:>10} {read['p50_ms']:>9} "
+                f"{read['p95_ms']:>9}")
+
+    def create_users(self, name, count):
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=f"{BENCH_PREFIX}_{name}_{number}",
+                 password=password)
+            for number in range(count)
+        )
+        return list(User.objects.filter(
+            username__startswith=f"{BENCH_PREFIX}_{name}_"
+        ).order_by("pk"))
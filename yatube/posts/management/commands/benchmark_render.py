@@ -0,0 +1,64 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from posts.benchmarks import isolated_settings, measure
+from posts.caching import POST_VERSION_KEY, bump_version
+from posts.models import Group, Post, User
+
+BENCH_USERNAME = "renderbench"
+
+
+class Command(BaseCommand):
+    help = ("Measure the render time of a post listing with a cold and a "
+            "warm post card cache. Rows are created in a transaction that "
+            "is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=100,
+                            help="Posts rendered per listing.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_settings(), transaction.atomic():
+            posts = self.create_posts(options["posts"])
+            self.run(posts, options["repeat"])
+            transaction.set_rollback(True)
+
+    def create_posts(self, count):
+        author = User.objects.create_user(username=BENCH_USERNAME)
+        group = Group.objects.create(title=BENCH_USERNAME,
+                                     slug=BENCH_USERNAME)
+        Post.objects.bulk_create(
+            Post(text=f"Benchmark post {number}\nsecond line",
+                 author=author, group=group)
+            for number in range(count)
+        )
+        return list(Post.objects.filter(
+            author=author).select_related("author", "group"))
+
+    def run(self, posts, repeat):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        context = {"page": posts}
+
+        def render():
+            render_to_string("posts/index.html", context, request)
+
+        def render_cold():
+            for post in posts:
+                bump_version(POST_VERSION_KEY.format(pk=post.pk))
+            render()
+
+        render()
+        results = {
+            "cold": measure(render_cold, repeat),
+            "warm": measure(render, repeat),
+        }
+        self.stdout.write(f"posts={len(posts)} repeat={repeat}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>5}: p50 {result['p50_ms']} ms, "
+                f"p95 {result['p95_ms']} ms, mean {result['mean_ms']} ms")
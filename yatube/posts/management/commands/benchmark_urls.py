@@ -0,0 +1,192 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from posts import urls
+from posts.benchmarks import isolated_settings, measure_requests
+from posts.caching import FEED_VERSION_KEY, bump_version
+from posts.models import Comment, Follow, Group, Post, User
+from posts.pagecache import purge
+from posts.seeding import PRESETS, WORDS, seed
+
+DATASET_FIELDS = ("users", "groups", "posts", "follows", "comments")
+
+
+class Sample:
+    """The rows each URL is requested with: the most active reader,
+    the most followed author, their latest post and the first group.
+    """
+
+    def __init__(self):
+        self.reader = User.objects.order_by(
+            "-stats__following_count", "pk").first()
+        self.author = User.objects.exclude(pk=self.reader.pk).order_by(
+            "-stats__followers_count", "pk").first()
+        self.post = Post.objects.filter(author=self.author).first()
+        if self.post is None:
+            self.post = Post.objects.create(text=WORDS[0],
+                                            author=self.author)
+        self.own_post = Post.objects.filter(author=self.reader).first()
+        if self.own_post is None:
+            self.own_post = Post.objects.create(text=WORDS[0],
+                                                author=self.reader)
+        self.group = Group.objects.order_by("pk").first()
+        if self.group is None:
+            self.group = Group.objects.create(title=WORDS[0],
+                                              slug=WORDS[0])
+
+
+def url_cases(sample):
+    """Map every URL name to the (method, path, data) of its request.
+
+    Write views run for real; the whole benchmark is rolled back unless
+    --keep is given.
+    """
+    author = sample.author.username
+    post = (author, sample.post.pk)
+    own_post = (sample.reader.username, sample.own_post.pk)
+    return {
+        "index": ("get", reverse("index"), None),
+        "group_posts": ("get", reverse("group_posts",
+                                       args=[sample.group.slug]), None),
+        "new_post": ("post", reverse("new_post"), {"text": WORDS[1]}),
+        "follow_index": ("get", reverse("follow_index"), None),
+        "search": ("get", reverse("search"), {"q": WORDS[2]}),
+        "post": ("get", reverse("post", args=post), None),
+        "post_edit": ("post", reverse("post_edit", args=own_post),
+                      {"text": WORDS[3]}),
+        "profile_follow": ("get", reverse("profile_follow",
+                                          args=[author]), None),
+        "profile_unfollow": ("get", reverse("profile_unfollow",
+                                            args=[author]), None),
+        "post_comments": ("get", reverse("post_comments", args=post),
+                          None),
+        "add_comment": ("post", reverse("add_comment", args=post),
+                        {"text": WORDS[4]}),
+        "profile": ("get", reverse("profile", args=[author]), None),
+    }
+
+
+def url_names():
+    return [pattern.name for pattern in urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name]
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic dataset and measure latency percentiles and "
+            "SQL query counts of every URL in posts/urls.py, writing JSON "
+            "that can be compared across commits. The seeded rows are "
+            "rolled back unless --keep is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--preset", choices=sorted(PRESETS), default="tiny",
+            help="Dataset size to seed.")
+        for field in DATASET_FIELDS:
+            parser.add_argument(
+                f"--{field}", type=int,
+                help=f"Override the preset number of {field}.")
+        parser.add_argument(
+            "--use-existing", action="store_true",
+            help="Benchmark the rows already in the database.")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Commit the seeded rows and the benchmark's writes.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--cold", action="store_true",
+            help="Clear the benchmark's own cache before every request.")
+        parser.add_argument(
+            "--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        dataset = dict(PRESETS[options["preset"]])
+        for field in DATASET_FIELDS:
+            if options[field] is not None:
+                dataset[field] = options[field]
+        with isolated_settings(), transaction.atomic():
+            if options["use_existing"]:
+                dataset = None
+            else:
+                seed(**dataset, seed=options["seed"])
+            report = self.run(options, dataset)
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        if options["keep"]:
+            # The kept rows were written past the site's own cache.
+            bump_version(FEED_VERSION_KEY)
+            purge("index")
+        data = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(data + "\n")
+        else:
+            self.stdout.write(data)
+
+    def run(self, options, dataset):
+        counts = {
+            "users": User.objects.count(),
+            "groups": Group.objects.count(),
+            "posts": Post.objects.count(),
+            "follows": Follow.objects.count(),
+            "comments": Comment.objects.count(),
+        }
+        sample = Sample()
+        client = Client()
+        client.force_login(sample.reader)
+        cases = url_cases(sample)
+        before = cache.clear if options["cold"] else None
+        results = {}
+        for name in url_names():
+            if name not in cases:
+                continue
+            method, path, data = cases[name]
+            send = getattr(client, method)
+
+            def request():
+                return send(path, data)
+
+            request()
+            results[name] = {"method": method.upper(), "path": path,
+                             **measure_requests(request, options["repeat"],
+                                                before)}
+            self.stderr.write(
+                f"{name:>17}: p50 {results[name]['p50_ms']} ms, "
+                f"p95 {results[name]['p95_ms']} ms, "
+                f"{results[name]['queries_max']} queries")
+        return {
+            "meta": {
+                "commit": current_commit(),
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "preset": None if dataset is None else options["preset"],
+                "seed": options["seed"],
+                "repeat": options["repeat"],
+                "cold_cache": options["cold"],
+            },
+            "dataset": counts,
+            "urls": results,
+            "skipped": [name for name in url_names() if name not in cases],
+        }
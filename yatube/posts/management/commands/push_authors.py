@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.feed import push_authors
+
+
+class Command(BaseCommand):
+    help = ("Switch pulled authors whose followers fell to "
+            "FEED_PUSH_THRESHOLD back to fan-out on write, copying their "
+            "posts into their followers' timelines. Meant to run "
+            "periodically, outside of requests.")
+
+    def handle(self, *args, **options):
+        switched = push_authors()
+        self.stdout.write(f"Switched {switched} authors to push")
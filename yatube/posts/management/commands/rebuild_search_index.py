@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = ("Refill the full text search index of posts from the posts, "
+            "groups and users tables in one bulk insert.")
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(f"Indexed {count} posts")
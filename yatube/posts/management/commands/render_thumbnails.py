@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import enqueue_thumbnails, process_jobs
+
+
+class Command(BaseCommand):
+    help = ("Render the WebP and JPEG variants of queued post images for "
+            "every geometry in settings.IMAGE_GEOMETRIES.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Drain the queue and exit instead of polling.")
+        parser.add_argument(
+            "--batch", type=int, default=10,
+            help="Jobs claimed per round.")
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds to sleep while the queue is empty.")
+        parser.add_argument(
+            "--enqueue-missing", action="store_true",
+            help="First queue every post with an image and no job.")
+
+    def handle(self, *args, **options):
+        if options["enqueue_missing"]:
+            posts = Post.objects.exclude(image="").exclude(
+                image__isnull=True).filter(thumbnail_job__isnull=True)
+            for post in posts.only("pk", "image").iterator():
+                enqueue_thumbnails(post)
+        processed = 0
+        try:
+            while True:
+                count = process_jobs(options["batch"])
+                processed += count
+                if count:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Processed {processed} thumbnail jobs")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (repair_comment_counts, repair_reply_counts,
+                            repair_user_stats)
+
+
+class Command(BaseCommand):
+    help = ("Recount Post.comment_count, Comment.reply_count and the "
+            "per-user posts, followers and following counters, fixing the "
+            "rows that drifted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many rows drifted.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        posts = repair_comment_counts(dry_run=dry_run)
+        comments = repair_reply_counts(dry_run=dry_run)
+        users = repair_user_stats(dry_run=dry_run)
+        verb = "drifted" if dry_run else "repaired"
+        self.stdout.write(
+            f"Posts with {verb} comment counts: {posts}\n"
+            f"Comments with {verb} reply counts: {comments}\n"
+            f"Users with {verb} stats: {users}")
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.search import rebuild_search_index
+from posts.seeding import (CHUNK_SIZE, PRESETS, SeedPlan, deferrable_schema,
+                           deferred_schema, fast_pragmas, load,
+                           rebuild_derived)
+
+DATASET_FIELDS = ("users", "groups", "posts", "follows", "comments")
+
+
+class Command(BaseCommand):
+    help = ("Load a deterministic synthetic dataset of users, groups, "
+            "follows, posts and comments in chunked bulk inserts, then "
+            "rebuild counters, timelines and the search index. An "
+            "interrupted load continues with --resume.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--preset", choices=sorted(PRESETS), default="small",
+            help="Dataset size.")
+        for field in DATASET_FIELDS:
+            parser.add_argument(
+                f"--{field}", type=int,
+                help=f"Override the preset number of {field}.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                            help="Rows per insert transaction.")
+        parser.add_argument(
+            "--fast", action="store_true",
+            help="Turn SQLite fsync and the on-disk journal off during "
+                 "the load. A crash can corrupt the database.")
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="Continue the load recorded in the state file.")
+        parser.add_argument(
+            "--state", default=os.path.join(settings.BASE_DIR,
+                                            "seed_yatube.json"),
+            help="Where the plan of the current load is kept.")
+
+    def handle(self, *args, **options):
+        plan, schema = self.resumed_plan(options) if options["resume"] \
+            else self.new_plan(options)
+        start = time.perf_counter()
+        with fast_pragmas(options["fast"]):
+            # Generated rows only reference rows generated before them.
+            with connection.constraint_checks_disabled(), \
+                    deferred_schema(schema):
+                rows = load(plan, self.progress)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"Inserted {rows} rows in {elapsed:.1f} s "
+                f"({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+            rebuild_derived(plan)
+            indexed = rebuild_search_index()
+        self.stdout.write(
+            f"Rebuilt counters, timelines and {indexed} search entries "
+            f"in {time.perf_counter() - start - elapsed:.1f} s")
+        os.remove(options["state"])
+
+    def new_plan(self, options):
+        if os.path.exists(options["state"]):
+            raise CommandError(
+                f"{options['state']} holds an unfinished load; continue "
+                f"it with --resume or delete the file.")
+        dataset = dict(PRESETS[options["preset"]])
+        for field in DATASET_FIELDS:
+            if options[field] is not None:
+                dataset[field] = options[field]
+        plan = SeedPlan(**dataset, seed=options["seed"],
+                        chunk_size=options["chunk_size"])
+        # The dropped indexes and triggers are kept with the plan, so a
+        # killed load gets them back when it is resumed.
+        schema = deferrable_schema()
+        with open(options["state"], "w") as file:
+            json.dump({**plan.state(), "schema": schema}, file)
+        return plan, schema
+
+    def resumed_plan(self, options):
+        try:
+            with open(options["state"]) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f"No load to resume in {options['state']}.")
+        return SeedPlan.from_state(state), state["schema"]
+
+    def progress(self, table, chunk, chunks, rows):
+        self.stderr.write(f"{table}: chunk {chunk}/{chunks} ({rows} rows)")
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.6 on 2026-10-17 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def requeue_thumbnail_jobs(apps, schema_editor):
+    # Finished jobs only rendered sorl thumbnails; run them again so
+    # the worker renders the variants. Images uploaded before 0016 have
+    # no job at all and get a pending one.
+    Post = apps.get_model('posts', 'Post')
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    ThumbnailJob.objects.exclude(status='pending').update(
+        status='pending', attempts=0, error='')
+    missing = Post.objects.exclude(image='').filter(
+        image__isnull=False, thumbnail_job__isnull=True
+    ).values_list('pk', flat=True)
+    ThumbnailJob.objects.bulk_create(
+        (ThumbnailJob(post_id=pk) for pk in missing.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geometry', models.CharField(max_length=20, verbose_name='Geometry')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=4, verbose_name='Format')),
+                ('width', models.PositiveIntegerField(verbose_name='Width')),
+                ('height', models.PositiveIntegerField(verbose_name='Height')),
+                ('size', models.PositiveIntegerField(verbose_name='Bytes')),
+                ('file', models.FileField(max_length=200, upload_to='posts/variants/', verbose_name='File')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='image_variants', to='posts.Post', verbose_name='Post')),
+            ],
+            options={
+                'verbose_name': 'Image variant',
+                'verbose_name_plural': 'Image variants',
+                'ordering': ('width',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('post', 'geometry', 'format', 'width'), name='unique_image_variant'),
+        ),
+        migrations.RunPython(requeue_thumbnail_jobs,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_TABLE = 'posts_post_search'
+
+
+def tables(apps):
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    return {
+        'search': SEARCH_TABLE,
+        'post': apps.get_model('posts', 'Post')._meta.db_table,
+        'group': apps.get_model('posts', 'Group')._meta.db_table,
+        'user': user_model._meta.db_table,
+    }
+
+
+CREATE = (
+    "CREATE VIRTUAL TABLE {search} USING fts5("
+    "text, group_title, author, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER {search}_insert AFTER INSERT ON {post} BEGIN "
+    "INSERT INTO {search} (rowid, text, group_title, author) VALUES ("
+    "new.id, new.text, "
+    "COALESCE((SELECT title FROM {group} WHERE id = new.group_id), ''), "
+    "(SELECT username FROM {user} WHERE id = new.author_id)); END",
+    "CREATE TRIGGER {search}_update "
+    "AFTER UPDATE OF text, group_id, author_id ON {post} BEGIN "
+    "DELETE FROM {search} WHERE rowid = old.id; "
+    "INSERT INTO {search} (rowid, text, group_title, author) VALUES ("
+    "new.id, new.text, "
+    "COALESCE((SELECT title FROM {group} WHERE id = new.group_id), ''), "
+    "(SELECT username FROM {user} WHERE id = new.author_id)); END",
+    "CREATE TRIGGER {search}_delete AFTER DELETE ON {post} BEGIN "
+    "DELETE FROM {search} WHERE rowid = old.id; END",
+    "CREATE TRIGGER {search}_group_title AFTER UPDATE OF title ON {group} "
+    "BEGIN UPDATE {search} SET group_title = new.title WHERE rowid IN ("
+    "SELECT id FROM {post} WHERE group_id = new.id); END",
+    "CREATE TRIGGER {search}_username AFTER UPDATE OF username ON {user} "
+    "BEGIN UPDATE {search} SET author = new.username WHERE rowid IN ("
+    "SELECT id FROM {post} WHERE author_id = new.id); END",
+    "INSERT INTO {search} (rowid, text, group_title, author) "
+    "SELECT post.id, post.text, COALESCE(grp.title, ''), author.username "
+    "FROM {post} post LEFT JOIN {group} grp ON grp.id = post.group_id "
+    "JOIN {user} author ON author.id = post.author_id",
+)
+
+DROP = (
+    "DROP TRIGGER IF EXISTS {search}_username",
+    "DROP TRIGGER IF EXISTS {search}_group_title",
+    "DROP TRIGGER IF EXISTS {search}_delete",
+    "DROP TRIGGER IF EXISTS {search}_update",
+    "DROP TRIGGER IF EXISTS {search}_insert",
+    "DROP TABLE IF EXISTS {search}",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 and these triggers are SQLite-only.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        names = tables(apps)
+        for statement in statements:
+            schema_editor.execute(statement.format(**names))
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_imagevariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
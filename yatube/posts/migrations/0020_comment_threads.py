@@ -0,0 +1,56 @@
+# Generated by Django 2.2.6 on 2026-10-17 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PATH_STEP = 8
+PATH_ROOT = 16 ** PATH_STEP - 1
+
+
+def fill_paths(apps, schema_editor):
+    # Every existing comment starts a thread of its own.
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.bulk_update(
+        (Comment(pk=pk, path=f'{PATH_ROOT - pk:0{PATH_STEP}x}')
+         for pk in Comment.objects.values_list('pk', flat=True).iterator()),
+        ['path'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('path',), 'verbose_name': 'Comment', 'verbose_name_plural': 'Comments'},
+        ),
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_cursor_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Reply to'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=128, verbose_name='Thread path'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Replies'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
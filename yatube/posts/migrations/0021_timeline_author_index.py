@@ -0,0 +1,17 @@
+# Generated by Django 2.2.6 on 2026-10-17 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['author', 'user'], name='timeline_author_idx'),
+        ),
+    ]
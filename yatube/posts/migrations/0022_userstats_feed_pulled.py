@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-17 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_authors(apps, schema_editor):
+    # Until now the mode followed the follower count alone.
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_timeline_author_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_pulled',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Pulled into feeds'),
+        ),
+        migrations.RunPython(mark_pulled_authors,
+                             migrations.RunPython.noop),
+    ]
@@ -3,6 +3,20 @@ from django.db import models
 
 User = get_user_model()
 
+# A comment's path is the path of its parent followed by one fixed-width
+# hexadecimal step holding its id. Root steps hold the id subtracted
+# from PATH_ROOT, so sorting by path lists the newest threads first and
+# the replies of each comment oldest first, right below it.
+PATH_STEP = 8
+PATH_ROOT = 16 ** PATH_STEP - 1
+COMMENT_MAX_DEPTH = 16
+
+
+def comment_path(pk, parent_path=""):
+    if not parent_path:
+        return f"{PATH_ROOT - pk:0{PATH_STEP}x}"
+    return f"{parent_path}{pk:0{PATH_STEP}x}"
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -31,6 +45,7 @@ class Post(models.Model):
     group = models.ForeignKey(Group,
                               null=True,
                               blank=True,
+                              db_index=False,
                               verbose_name="Group",
                               on_delete=models.SET_NULL)
     text = models.TextField(verbose_name="Text")
@@ -38,14 +53,26 @@ class Post(models.Model):
                                     verbose_name="Date")
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
+                               db_index=False,
                                related_name="posts")
     image = models.ImageField(
         upload_to="posts/",
         blank=True,
         null=True)
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Comments")
 
     class Meta:
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="post_author_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"],
+                         name="post_group_date_idx"),
+            models.Index(fields=["-pub_date", "-id"],
+                         name="post_date_idx"),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -55,6 +82,7 @@ class Comment(models.Model):
     post = models.ForeignKey(Post,
                              related_name="comments",
                              on_delete=models.CASCADE,
+                             db_index=False,
                              verbose_name="Post"
                              )
     author = models.ForeignKey(User,
@@ -64,31 +92,242 @@ class Comment(models.Model):
     text = models.TextField(verbose_name="Comment text")
     created = models.DateTimeField(auto_now_add=True,
                                    verbose_name="Comment_date")
+    parent = models.ForeignKey("self",
+                               null=True,
+                               blank=True,
+                               on_delete=models.CASCADE,
+                               related_name="replies",
+                               verbose_name="Reply to")
+    path = models.CharField(max_length=PATH_STEP * COMMENT_MAX_DEPTH,
+                            blank=True,
+                            editable=False,
+                            verbose_name="Thread path")
+    reply_count = models.PositiveIntegerField(default=0,
+                                              verbose_name="Replies")
 
     class Meta:
-        ordering = ("-created",)
+        ordering = ("path",)
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
+        indexes = [
+            models.Index(fields=["post", "path"],
+                         name="comment_post_path_idx"),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def depth(self):
+        """Number of comments above this one in its thread."""
+        return len(self.path) // PATH_STEP - 1
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name="follower"
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name="following"
     )
 
     class Meta:
         verbose_name = "Follow"
         verbose_name_plural = "Follows"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"],
+                                    name="unique_follow"),
+        ]
+        indexes = [
+            models.Index(fields=["author", "user"],
+                         name="follow_author_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} following {self.author}"
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="User"
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Posts"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name="Followers"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Following"
+    )
+    feed_pulled = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name="Pulled into feeds"
+    )
+
+    class Meta:
+        verbose_name = "User stats"
+        verbose_name_plural = "User stats"
+
+    def __str__(self):
+        return f"{self.user} stats"
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        db_index=False,
+        verbose_name="Reader"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+        verbose_name="Author"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Post"
+    )
+    pub_date = models.DateTimeField(verbose_name="Date")
+
+    class Meta:
+        ordering = ("-pub_date",)
+        verbose_name = "Timeline entry"
+        verbose_name_plural = "Timeline entries"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"],
+                                    name="unique_timeline_post"),
+        ]
+        # Deletes by reader use the leading column of the timeline
+        # index; deletes by author, on unfollows and cascades, use their
+        # own index.
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_user_date_idx"),
+            models.Index(fields=["author", "user"],
+                         name="timeline_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in {self.user_id} timeline"
+
+
+class ThumbnailJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="thumbnail_job",
+        verbose_name="Post"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name="Status"
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Attempts"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Last error"
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Updated"
+    )
+
+    class Meta:
+        verbose_name = "Thumbnail job"
+        verbose_name_plural = "Thumbnail jobs"
+        indexes = [
+            models.Index(fields=["status", "updated"],
+                         name="thumbnail_job_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Thumbnails of post {self.post_id}: {self.status}"
+
+
+class ImageVariant(models.Model):
+    WEBP = "webp"
+    JPEG = "jpeg"
+    FORMATS = (
+        (WEBP, "WebP"),
+        (JPEG, "JPEG"),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="image_variants",
+        db_index=False,
+        verbose_name="Post"
+    )
+    geometry = models.CharField(
+        max_length=20,
+        verbose_name="Geometry"
+    )
+    format = models.CharField(
+        max_length=4,
+        choices=FORMATS,
+        verbose_name="Format"
+    )
+    width = models.PositiveIntegerField(verbose_name="Width")
+    height = models.PositiveIntegerField(verbose_name="Height")
+    size = models.PositiveIntegerField(verbose_name="Bytes")
+    file = models.FileField(
+        upload_to="posts/variants/",
+        max_length=200,
+        verbose_name="File"
+    )
+
+    class Meta:
+        ordering = ("width",)
+        verbose_name = "Image variant"
+        verbose_name_plural = "Image variants"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "geometry", "format", "width"],
+                name="unique_image_variant"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} {self.geometry} {self.width}w {self.format}"
+
+    @property
+    def url(self):
+        return self.file.url
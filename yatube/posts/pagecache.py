@@ -0,0 +1,100 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+
+from .caching import bump_version, get_version, get_versions
+
+SURROGATE_HEADER = "Surrogate-Key"
+TAG_VERSION_KEY = "posts:surrogate:{tag}:version"
+# Bumped by every purge, so a page rendered while one ran is not stored.
+GENERATION_KEY = "posts:surrogate:generation"
+PAGE_KEY = "posts:fullpage:{url}"
+
+
+def add_surrogate_keys(response, keys):
+    """Tag ``response`` with surrogate keys, in the Surrogate-Key header
+    that reverse proxies purge by as well."""
+    tags = set(response.get(SURROGATE_HEADER, "").split())
+    tags.update(str(key) for key in keys)
+    response[SURROGATE_HEADER] = " ".join(sorted(tags))
+
+
+def listing_keys(page):
+    """Surrogate keys of the posts shown on a listing page."""
+    for post in page:
+        yield f"post:{post.pk}"
+        yield f"author:{post.author_id}"
+        if post.group_id:
+            yield f"group:{post.group_id}"
+
+
+def purge(*keys):
+    """Drop every cached page tagged with one of ``keys``."""
+    for key in keys:
+        bump_version(TAG_VERSION_KEY.format(tag=key))
+    bump_version(GENERATION_KEY)
+
+
+def url_digest(request):
+    """Return a cache-key-safe digest of the absolute URL of
+    ``request``."""
+    return hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def _tag_versions(tags):
+    return get_versions([TAG_VERSION_KEY.format(tag=tag) for tag in tags])
+
+
+def _cacheable(request, response):
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and SURROGATE_HEADER in response
+            # The page holds a CSRF token of this client.
+            and not request.META.get("CSRF_COOKIE_USED"))
+
+
+def cache_anonymous_page(view):
+    """Serve GET requests of signed-out visitors from a full-page cache.
+
+    Views tag their responses with ``add_surrogate_keys()``; a stored
+    page is valid until one of its keys is purged or
+    ``PAGE_CACHE["TIMEOUT"]`` runs out. Signed-in requests always reach
+    the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        options = settings.PAGE_CACHE
+        if not options["ENABLED"] or request.method not in ("GET", "HEAD") \
+                or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = PAGE_KEY.format(url=url_digest(request))
+        entry = cache.get(key)
+        if entry is not None:
+            tags, versions, stored_at, response = entry
+            if _tag_versions(tags) == versions:
+                response["Age"] = str(int(time.time() - stored_at))
+                return get_conditional_response(
+                    request, etag=response.get("ETag"),
+                    response=response) or response
+        generation = get_version(GENERATION_KEY)
+        response = view(request, *args, **kwargs)
+        if not _cacheable(request, response):
+            return response
+        # Browsers revalidate; proxies that purge by surrogate key keep
+        # the page as long as this cache does.
+        patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ["Cookie"])
+        response["Surrogate-Control"] = f"max-age={options['TIMEOUT']}"
+        tags = response[SURROGATE_HEADER].split()
+        versions = _tag_versions(tags)
+        if get_version(GENERATION_KEY) == generation:
+            cache.set(key, (tags, versions, time.time(), response),
+                      options["TIMEOUT"])
+        return response
+    return wrapper
@@ -0,0 +1,266 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+POST_ORDERING = ("-pub_date", "-id")
+# Comment paths list each thread in reply order, newest thread first.
+COMMENT_ORDERING = ("path",)
+COUNT_TIMEOUT = 60 * 60
+
+
+def _cursor_value(value):
+    # isoformat() keeps the microseconds DjangoJSONEncoder would drop.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    data = json.dumps([_cursor_value(value) for value in values],
+                      separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the key values stored in ``token`` or ``None`` for
+    missing or malformed tokens."""
+    if not token:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(values, list):
+        return None
+    return values
+
+
+def clean_cursor(values, ordering, model):
+    """Return cursor ``values`` converted to the types of the
+    ``ordering`` fields of ``model``, or ``None`` unless there is one
+    valid value per field."""
+    if values is None or len(values) != len(ordering):
+        return None
+    cleaned = []
+    for field, value in zip(ordering, values):
+        if value is None:
+            return None
+        try:
+            value = model._meta.get_field(field.lstrip("-")).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        cleaned.append(value)
+    return cleaned
+
+
+def reverse_ordering(ordering):
+    return tuple(
+        field[1:] if field.startswith("-") else f"-{field}"
+        for field in ordering
+    )
+
+
+def order_by_expressions(ordering):
+    # F() keeps related lookups from expanding to the related
+    # model's default ordering.
+    return [
+        F(field[1:]).desc() if field.startswith("-") else F(field).asc()
+        for field in ordering
+    ]
+
+
+def keyset_q(ordering, values):
+    """Build a filter selecting the rows that follow ``values`` in
+    ``ordering``.
+
+    The leading column also gets a non-strict bound so the database can
+    seek into an index instead of filtering a scan.
+    """
+    names = [field.lstrip("-") for field in ordering]
+    lookups = ["lt" if field.startswith("-") else "gt"
+               for field in ordering]
+    following = Q()
+    equal = {}
+    for name, lookup, value in zip(names, lookups, values):
+        following |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return Q(**{f"{names[0]}__{lookups[0]}e": values[0]}) & following
+
+
+def keyset_slice(queryset, ordering, values, reverse, limit):
+    """Return the first ``limit`` rows of ``queryset`` after ``values``
+    in ``ordering``, or before them in reverse order."""
+    if reverse:
+        ordering = reverse_ordering(ordering)
+    if values is not None:
+        queryset = queryset.filter(keyset_q(ordering, values))
+    return queryset.order_by(*order_by_expressions(ordering))[:limit]
+
+
+def object_key(obj, ordering):
+    names = (field.lstrip("-") for field in ordering)
+    return [getattr(obj, "pk" if name == "id" else name) for name in names]
+
+
+class CursorPage:
+    """A page of a keyset-paginated listing."""
+    is_cursor = True
+
+    def __init__(self, object_list, ordering,
+                 has_next=False, has_previous=False):
+        self.object_list = object_list
+        self.ordering = ordering
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<Cursor page of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return ""
+        return encode_cursor(object_key(self.object_list[-1], self.ordering))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ""
+        return encode_cursor(object_key(self.object_list[0], self.ordering))
+
+
+class CursorPaginator:
+    """Paginate by seeking past the last seen ``ordering`` key instead
+    of counting and offsetting.
+
+    ``object_list`` is either a QuerySet or an object providing
+    ``keyset_slice(values, reverse, limit)``. Cursors are checked
+    against the fields of its ``model``; objects without one validate
+    the values themselves. Malformed cursors select the first page.
+    """
+
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def _slice(self, values, reverse, limit):
+        if hasattr(self.object_list, "keyset_slice"):
+            return self.object_list.keyset_slice(values, reverse, limit)
+        return list(keyset_slice(self.object_list, self.ordering, values,
+                                 reverse, limit))
+
+    def decode(self, token):
+        """Return the checked key values of ``token`` or ``None`` for
+        missing or malformed tokens."""
+        values = decode_cursor(token)
+        model = getattr(self.object_list, "model", None)
+        if model is None:
+            return values
+        return clean_cursor(values, self.ordering, model)
+
+    def page(self, after=None, before=None):
+        before_key = self.decode(before)
+        if before_key is not None:
+            objects = self._slice(before_key, True, self.per_page + 1)
+            has_previous = len(objects) > self.per_page
+            objects = objects[:self.per_page][::-1]
+            return CursorPage(objects, self.ordering,
+                              has_next=True, has_previous=has_previous)
+        after_key = self.decode(after)
+        objects = self._slice(after_key, False, self.per_page + 1)
+        return CursorPage(objects[:self.per_page], self.ordering,
+                          has_next=len(objects) > self.per_page,
+                          has_previous=after_key is not None)
+
+
+def page_window(number, num_pages, window):
+    """Return the page numbers to link from page ``number``: the first
+    and the last page and ``window`` pages on each side of the current
+    one, with ``None`` in place of every run of left out pages.
+    """
+    shown = sorted({1, num_pages, *range(max(number - window, 1),
+                                         min(number + window, num_pages)
+                                         + 1)})
+    pages = []
+    for page in shown:
+        if pages and page - pages[-1] == 2:
+            # An ellipsis would take the place of a single link.
+            pages.append(page - 1)
+        elif pages and page - pages[-1] > 2:
+            pages.append(None)
+        pages.append(page)
+    return pages
+
+
+class CachedCountPaginator(Paginator):
+    """``Paginator`` that keeps the total count of its listing in the
+    cache under ``count_key`` instead of counting on every request.
+
+    Keys carry the cache versions of the listing, so they change
+    whenever the count can.
+    """
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is None:
+            count = super().count
+            cache.set(self.count_key, count, COUNT_TIMEOUT)
+        return count
+
+
+def get_page(request, object_list, ordering=POST_ORDERING, count_key=None):
+    """Return the requested page of ``object_list``.
+
+    ``?after=``/``?before=`` tokens (or ``CURSOR_PAGINATION`` when no
+    ``?page=`` is given) select keyset pagination, everything else the
+    classic numbered ``Paginator``, which takes the total count from
+    the cache when a ``count_key`` is given.
+    """
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    cursor_mode = settings.CURSOR_PAGINATION and "page" not in request.GET
+    if after or before or cursor_mode:
+        paginator = CursorPaginator(object_list, settings.POSTS_ON_PAGE,
+                                    ordering)
+        return paginator.page(after=after, before=before)
+    if count_key is None:
+        paginator = Paginator(object_list, settings.POSTS_ON_PAGE)
+    else:
+        paginator = CachedCountPaginator(object_list, settings.POSTS_ON_PAGE,
+                                         count_key)
+    return paginator.get_page(request.GET.get("page"))
@@ -0,0 +1,170 @@
+import copy
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.utils.cache import patch_cache_control
+
+from .pagecache import SURROGATE_HEADER, url_digest
+
+logger = logging.getLogger(__name__)
+
+STALE_KEY = "posts:stale:{url}"
+REFRESH_LOCK_KEY = "posts:stale:{url}:refresh"
+# Set while the database is failing; expires after COOLDOWN.
+DEGRADED_KEY = "posts:db_degraded"
+# Set while one page renders over budget, so a single slow URL, such as
+# a deep page, does not take every other page stale.
+SLOW_KEY = "posts:stale:{url}:slow"
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def degrade(reason):
+    """Serve stored renderings for the next ``COOLDOWN`` seconds."""
+    logger.warning("Database degraded (%s), serving stale pages", reason)
+    cache.set(DEGRADED_KEY, str(reason), settings.STALE_PAGES["COOLDOWN"])
+
+
+def slow_down(url, reason):
+    """Serve the stored rendering of ``url`` for the next ``COOLDOWN``
+    seconds."""
+    logger.warning("Page too slow (%s), serving its stale copy", reason)
+    cache.set(SLOW_KEY.format(url=url), str(reason),
+              settings.STALE_PAGES["COOLDOWN"])
+
+
+def is_degraded(url=None):
+    keys = [DEGRADED_KEY]
+    if url is not None:
+        keys.append(SLOW_KEY.format(url=url))
+    return bool(cache.get_many(keys))
+
+
+def _storable(request, response):
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            # Copies served by a cache are no newer than the one kept.
+            and "Age" not in response
+            and not request.user.is_authenticated
+            and not request.META.get("CSRF_COOKIE_USED"))
+
+
+def _store(key, request, response):
+    if _storable(request, response):
+        cache.set(key, (time.time(), response),
+                  settings.STALE_PAGES["TIMEOUT"])
+
+
+def _stale_response(key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    stored_at, response = entry
+    # Neither the page cache nor a proxy may keep the stale copy.
+    for header in (SURROGATE_HEADER, "Surrogate-Control"):
+        if header in response:
+            del response[header]
+    patch_cache_control(response, no_cache=True)
+    response["Age"] = str(int(time.time() - stored_at))
+    response["Warning"] = STALE_WARNING
+    return response
+
+
+def _timed(view, request, args, kwargs):
+    start = time.monotonic()
+    response = view(request, *args, **kwargs)
+    return response, time.monotonic() - start
+
+
+def _render_signed_in(view, request, args, kwargs):
+    # The kept copy is a signed-out page; theirs renders or fails.
+    try:
+        return view(request, *args, **kwargs)
+    except OperationalError as error:
+        degrade(error)
+        raise
+
+
+def refresh(view, request, args, kwargs, url):
+    """Render the page again for signed-out visitors and keep it; end
+    the degraded state of the database and of the page if it answered
+    within budget."""
+    request = copy.copy(request)
+    request.META = dict(request.META)
+    request.user = AnonymousUser()
+    try:
+        response, elapsed = _timed(view, request, args, kwargs)
+    except OperationalError as error:
+        degrade(error)
+        return
+    _store(STALE_KEY.format(url=url), request, response)
+    if elapsed > settings.STALE_PAGES["LATENCY_BUDGET"]:
+        slow_down(url, f"refresh took {elapsed:.2f} s")
+    else:
+        cache.delete_many([DEGRADED_KEY, SLOW_KEY.format(url=url)])
+
+
+def _run_refresh(*args):
+    try:
+        refresh(*args)
+    except Exception:
+        logger.exception("Background refresh failed")
+    finally:
+        # The thread opened a connection of its own.
+        connection.close()
+
+
+def refresh_in_background(view, request, args, kwargs, url):
+    """Start one refresh of the page per COOLDOWN across all workers."""
+    if cache.add(REFRESH_LOCK_KEY.format(url=url), 1,
+                 settings.STALE_PAGES["COOLDOWN"]):
+        threading.Thread(target=_run_refresh,
+                         args=(view, request, args, kwargs, url),
+                         daemon=True).start()
+
+
+def serve_stale(view):
+    """Keep the last good signed-out rendering of a page and serve it
+    while the database fails or is slow.
+
+    A GET that fails with ``OperationalError`` (such as "database is
+    locked") marks the database as degraded for ``COOLDOWN`` seconds; one
+    that renders in more than ``STALE_PAGES["LATENCY_BUDGET"]`` seconds
+    marks only its own URL. Meanwhile signed-out requests get the stored
+    rendering with Age and Warning headers, and one background thread
+    per page renders it again. Signed-in requests and pages never
+    rendered before still reach the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        options = settings.STALE_PAGES
+        if not options["ENABLED"] or request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return _render_signed_in(view, request, args, kwargs)
+        url = url_digest(request)
+        key = STALE_KEY.format(url=url)
+        if is_degraded(url):
+            response = _stale_response(key)
+            if response is not None:
+                refresh_in_background(view, request, args, kwargs, url)
+                return response
+        try:
+            response, elapsed = _timed(view, request, args, kwargs)
+        except OperationalError as error:
+            degrade(error)
+            response = _stale_response(key)
+            if response is None:
+                raise
+            return response
+        if elapsed > options["LATENCY_BUDGET"]:
+            slow_down(url, f"{request.path} took {elapsed:.2f} s")
+        _store(key, request, response)
+        return response
+    return wrapper
@@ -0,0 +1,128 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Group, Post, User
+
+SEARCH_TABLE = "posts_post_search"
+# bm25() weights of the text, group_title and author columns.
+RANK = "bm25(%s, 10.0, 2.0, 1.0)" % SEARCH_TABLE
+# Results are ranked best first; bm25() is lower for better matches.
+SEARCH_ORDERING = ("search_rank", "-id")
+SNIPPET_TOKENS = 24
+MAX_TERMS = 10
+# snippet() wraps matches in these, so highlighting survives escaping.
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query matching all of its words, the
+    last one as a prefix. Operators and quotes typed by the user are
+    dropped rather than interpreted.
+    """
+    terms = re.findall(r"\w+", query)[:MAX_TERMS]
+    if not terms:
+        return ""
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, "<mark>")
+        .replace(MATCH_END, "</mark>"))
+
+
+def matching_posts(query):
+    """Return a filter argument selecting the posts matching ``query``,
+    for querysets that need no ranking, such as the admin changelist,
+    or ``None`` if the query has no words to match.
+    """
+    match = match_expression(query)
+    if not match:
+        # FTS5 rejects an empty MATCH as a syntax error.
+        return None
+    return RawSQL(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        (match,))
+
+
+class PostSearch:
+    """bm25-ranked full text search over post text, group title and
+    author username, for ``CursorPaginator``.
+
+    Posts come back with ``search_rank`` and a highlighted
+    ``search_snippet``. The index is the FTS5 table created by the
+    0018 migration, so search needs SQLite.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+
+    def _ranked_ids(self, values, reverse, limit):
+        sql = [
+            f"SELECT rowid, {RANK}, snippet({SEARCH_TABLE}, -1, %s, %s, "
+            f"'…', %s) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+        ]
+        params = [MATCH_START, MATCH_END, SNIPPET_TOKENS, self.match]
+        if values is not None:
+            rank, pk = values
+            rank_lookup, rowid_lookup = ("<", ">") if reverse else (">", "<")
+            sql.append(f"AND ({RANK} {rank_lookup} %s OR "
+                       f"({RANK} = %s AND rowid {rowid_lookup} %s))")
+            params += [rank, rank, pk]
+        sql.append("ORDER BY 2 DESC, 1 ASC" if reverse
+                   else "ORDER BY 2 ASC, 1 DESC")
+        sql.append("LIMIT %s")
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(" ".join(sql), params)
+            return cursor.fetchall()
+
+    def keyset_slice(self, values, reverse, limit):
+        if not self.match:
+            return []
+        if values is not None:
+            try:
+                values = (float(values[0]), int(values[1]))
+            except (TypeError, ValueError, IndexError):
+                values = None
+        rows = self._ranked_ids(values, reverse, limit)
+        posts = Post.objects.select_related(
+            "author", "group").prefetch_related("image_variants").in_bulk(
+                [pk for pk, _, _ in rows])
+        results = []
+        for pk, rank, snippet in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.search_snippet = highlight(snippet)
+            results.append(post)
+        return results
+
+
+def rebuild_search_index():
+    """Refill the search index from the posts table in one statement.
+
+    Returns the number of indexed posts.
+    """
+    post_table = Post._meta.db_table
+    group_table = Group._meta.db_table
+    user_table = User._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, text, group_title, author) "
+            f"SELECT post.id, post.text, COALESCE(grp.title, ''), "
+            f"author.username FROM {post_table} post "
+            f"LEFT JOIN {group_table} grp ON grp.id = post.group_id "
+            f"JOIN {user_table} author ON author.id = post.author_id")
+        count = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return count
@@ -0,0 +1,439 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, chain
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import FEED_VERSION_KEY, bump_version
+from .feed import rebuild_timelines
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     UserStats, comment_path)
+from .search import rebuild_search_index
+
+CHUNK_SIZE = 20000
+# Datasets by name: row counts, and the mean number of authors each
+# user follows.
+PRESETS = {
+    "tiny": {"users": 200, "groups": 5, "posts": 2000,
+             "follows": 10, "comments": 4000},
+    "small": {"users": 10000, "groups": 50, "posts": 100000,
+              "follows": 30, "comments": 200000},
+    "large": {"users": 100000, "groups": 500, "posts": 10000000,
+              "follows": 50, "comments": 20000000},
+}
+# Popularity of authors falls off as 1 / rank ** AUTHOR_EXPONENT.
+AUTHOR_EXPONENT = 1.1
+# Comments go mostly to recent posts, with a Pareto-shaped tail.
+COMMENT_RECENCY_SHAPE = 1.2
+TIME_SPAN = timedelta(days=365)
+WORDS = (
+    "garden river city morning coffee train winter summer music book "
+    "friend dinner street window market rain light story photo dream "
+    "weekend project code bicycle mountain sea travel forest night "
+    "kitchen concert museum letter island bridge autumn spring walk"
+).split()
+# Load-time settings for SQLite: no fsync and no rollback journal on
+# disk. A crash mid-load can corrupt the database, so they are opt-in.
+FAST_PRAGMAS = {
+    "synchronous": "OFF",
+    "journal_mode": "MEMORY",
+    "temp_store": "MEMORY",
+    "cache_size": "-262144",
+}
+TABLES = ("users", "groups", "follows", "posts", "comments")
+# Generated texts of each length to draw row texts from.
+TEXT_VARIANTS = 64
+
+
+def _max_pk(model):
+    return model.objects.aggregate(last=Max("pk"))["last"] or 0
+
+
+def _pick(rng, sequence):
+    # A faster rng.choice(), drawing a single float.
+    return sequence[int(rng.random() * len(sequence))]
+
+
+def _columns(model, names):
+    return [model._meta.get_field(name).column for name in names]
+
+
+@contextmanager
+def fast_pragmas(enabled=True):
+    """Switch SQLite to FAST_PRAGMAS for the duration of a load."""
+    if not enabled or connection.vendor != "sqlite":
+        yield
+        return
+    with connection.cursor() as cursor:
+        saved = {}
+        for name, value in FAST_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}")
+            saved[name] = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in saved.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class SeedPlan:
+    """A deterministic synthetic dataset, generated as a stream of
+    fixed-size chunks per table.
+
+    Every chunk draws from its own random generator seeded with
+    (seed, table, chunk), and rows get primary keys offset from
+    ``bases``, so a chunk is the same whether the load runs in one go
+    or resumes after an interruption, and the loaded prefix of each
+    table tells how far a load got.
+
+    How much authors write and how many followers they have both
+    follow a power law, over independent rankings: the follow graph and
+    the posts per author are heavy-tailed, but the most prolific
+    authors are not all celebrities. Comments cluster on recent posts.
+    """
+
+    def __init__(self, users, groups, posts, follows, comments, seed=0,
+                 chunk_size=CHUNK_SIZE, bases=None, now=None):
+        self.counts = {"users": users, "groups": groups, "posts": posts,
+                       "comments": comments}
+        self.follows = follows
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.now = now or timezone.now()
+        self.bases = bases or {
+            "users": _max_pk(User),
+            "groups": _max_pk(Group),
+            "posts": _max_pk(Post),
+            "comments": _max_pk(Comment),
+        }
+        self.counts["follows"] = users
+        # Dates are generated in the database time zone, so they only
+        # need formatting on the way in.
+        self._now = self.now
+        if timezone.is_aware(self.now):
+            self._now = timezone.make_naive(self.now, connection.timezone)
+        self._password = make_password(None)
+        self._rankings = {}
+        self._texts = {}
+        if posts:
+            self._date_step = TIME_SPAN / posts
+            self._first_date = self._now - TIME_SPAN
+
+    def state(self):
+        """Everything needed to regenerate the same plan later."""
+        return {
+            "dataset": {"users": self.counts["users"],
+                        "groups": self.counts["groups"],
+                        "posts": self.counts["posts"],
+                        "follows": self.follows,
+                        "comments": self.counts["comments"]},
+            "seed": self.seed,
+            "chunk_size": self.chunk_size,
+            "bases": self.bases,
+            "now": self.now.isoformat(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**state["dataset"], seed=state["seed"],
+                   chunk_size=state["chunk_size"], bases=state["bases"],
+                   now=parse_datetime(state["now"]))
+
+    def random(self, table, chunk=0):
+        return random.Random(f"{self.seed}:{table}:{chunk}")
+
+    def chunks(self, table):
+        return -(-self.counts[table] // self.chunk_size)
+
+    def indexes(self, table, chunk):
+        start = chunk * self.chunk_size
+        return range(start, min(start + self.chunk_size,
+                                self.counts[table]))
+
+    def user_id(self, index):
+        return self.bases["users"] + index + 1
+
+    def post_date(self, index):
+        # Posts are spread evenly over TIME_SPAN in primary key order.
+        return self._first_date + self._date_step * (index + 1)
+
+    def ranking(self, name):
+        """User ids from most to least popular by ``name``, with
+        cumulative power-law weights for rng.choices()."""
+        if name not in self._rankings:
+            ids = [self.user_id(index)
+                   for index in range(self.counts["users"])]
+            self.random(name).shuffle(ids)
+            weights = list(accumulate(
+                1 / rank ** AUTHOR_EXPONENT
+                for rank in range(1, len(ids) + 1)))
+            self._rankings[name] = ids, weights
+        return self._rankings[name]
+
+    def text(self, rng, low, high):
+        """Return a text of ``low`` to ``high`` words.
+
+        Texts are drawn from pools generated once per plan, which is
+        much cheaper than picking every word of every row.
+        """
+        pool = self._texts.get((low, high))
+        if pool is None:
+            pool_rng = self.random(f"texts:{low}:{high}")
+            pool = self._texts[low, high] = [
+                " ".join(pool_rng.choices(WORDS, k=length))
+                for length in range(low, high + 1)
+                for _ in range(TEXT_VARIANTS)
+            ]
+        return _pick(rng, pool)
+
+    def rows(self, table, chunk):
+        return getattr(self, f"_{table}")(self.random(table, chunk),
+                                          self.indexes(table, chunk))
+
+    def _users(self, rng, indexes):
+        joined = connection.ops.adapt_datetimefield_value(self._now)
+        prefix = f"seed{self.bases['users']}_"
+        for index in indexes:
+            yield (self.user_id(index), self._password, False,
+                   f"{prefix}{index}", "", "", "", False, True, joined)
+
+    def _groups(self, rng, indexes):
+        prefix = f"seed{self.bases['groups']}-"
+        for index in indexes:
+            yield (self.bases["groups"] + index + 1, f"Group {index}",
+                   f"{prefix}{index}", self.text(rng, 5, 15))
+
+    def _follows(self, rng, indexes):
+        ids, weights = self.ranking("followers")
+        limit = len(ids) // 2
+        for index in indexes:
+            user_id = self.user_id(index)
+            wanted = min(limit, max(1, round(
+                rng.expovariate(1 / self.follows))))
+            authors = set()
+            for author_id in rng.choices(ids, cum_weights=weights,
+                                         k=wanted * 2):
+                if author_id != user_id:
+                    authors.add(author_id)
+                if len(authors) == wanted:
+                    break
+            for author_id in sorted(authors):
+                yield user_id, author_id
+
+    def _posts(self, rng, indexes):
+        ids, weights = self.ranking("posts")
+        group_ids = [self.bases["groups"] + index + 1
+                     for index in range(self.counts["groups"])] + [None]
+        adapt = connection.ops.adapt_datetimefield_value
+        authors = rng.choices(ids, cum_weights=weights, k=len(indexes))
+        for index, author_id in zip(indexes, authors):
+            yield (self.bases["posts"] + index + 1, _pick(rng, group_ids),
+                   self.text(rng, 8, 40), adapt(self.post_date(index)),
+                   author_id, "", 0)
+
+    def _comments(self, rng, indexes):
+        total = self.counts["posts"]
+        if not total:
+            return
+        users = self.counts["users"]
+        scale = max(total / 50, 1)
+        adapt = connection.ops.adapt_datetimefield_value
+        for index in indexes:
+            age = int((rng.paretovariate(COMMENT_RECENCY_SHAPE) - 1)
+                      * scale)
+            post = total - 1 - min(age, total - 1)
+            created = min(self.post_date(post)
+                          + timedelta(minutes=age + 1), self._now)
+            pk = self.bases["comments"] + index + 1
+            yield (pk, self.bases["posts"] + post + 1,
+                   self.user_id(int(rng.random() * users)),
+                   self.text(rng, 3, 20), adapt(created), comment_path(pk),
+                   0)
+
+
+INSERTS = {
+    "users": (User, ("id", "password", "is_superuser", "username",
+                     "first_name", "last_name", "email", "is_staff",
+                     "is_active", "date_joined")),
+    "groups": (Group, ("id", "title", "slug", "description")),
+    "follows": (Follow, ("user", "author")),
+    "posts": (Post, ("id", "group", "text", "pub_date", "author", "image",
+                     "comment_count")),
+    "comments": (Comment, ("id", "post", "author", "text", "created",
+                           "path", "reply_count")),
+}
+
+
+def _insert_sql(table, rows):
+    model, fields = INSERTS[table]
+    columns = _columns(model, fields)
+    values = f"({', '.join(['%s'] * len(columns))})"
+    return (f"INSERT INTO {model._meta.db_table} ({', '.join(columns)}) "
+            f"VALUES {', '.join([values] * rows)}")
+
+
+def _insert(cursor, table, rows):
+    """Insert ``rows`` with as many rows per statement as the database
+    takes parameters for; one row per statement is several times slower.
+    """
+    size = connection.ops.bulk_batch_size(INSERTS[table][1], rows)
+    whole = len(rows) - len(rows) % size
+    if whole:
+        cursor.executemany(_insert_sql(table, size), [
+            list(chain.from_iterable(rows[start:start + size]))
+            for start in range(0, whole, size)
+        ])
+    if whole < len(rows):
+        cursor.execute(_insert_sql(table, len(rows) - whole),
+                       list(chain.from_iterable(rows[whole:])))
+
+
+def loaded_chunks(plan, table):
+    """Return how many chunks of ``table`` are already in the database.
+
+    Chunks are committed one transaction each, so the highest loaded
+    key marks the last complete chunk.
+    """
+    if table == "follows":
+        first = plan.user_id(0)
+        last = Follow.objects.filter(
+            user_id__gte=first,
+            user_id__lt=first + plan.counts["users"],
+        ).aggregate(last=Max("user_id"))["last"]
+        loaded = 0 if last is None else last - first + 1
+    else:
+        model = INSERTS[table][0]
+        base = plan.bases[table]
+        last = model.objects.filter(
+            pk__gt=base, pk__lte=base + plan.counts[table],
+        ).aggregate(last=Max("pk"))["last"]
+        loaded = 0 if last is None else last - base
+    return -(-loaded // plan.chunk_size)
+
+
+def deferrable_schema(models=None):
+    """Return (type, name, sql) of the triggers and non-unique indexes of
+    the tables of ``models``, the seeded tables by default.
+
+    Maintaining them row by row, the search index triggers above all,
+    costs more than the inserts themselves; a load drops them and
+    builds them once at the end. Only SQLite is supported.
+    """
+    if connection.vendor != "sqlite":
+        return []
+    if models is None:
+        models = [INSERTS[table][0] for table in TABLES]
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT type, name, sql FROM sqlite_master "
+            f"WHERE tbl_name IN ({', '.join(['%s'] * len(tables))}) "
+            f"AND (type = 'trigger' OR (type = 'index' "
+            f"AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%%'))",
+            tables)
+        return [list(row) for row in cursor.fetchall()]
+
+
+def restore_schema(schema):
+    """Recreate the objects of ``schema`` missing from the database."""
+    with connection.cursor() as cursor:
+        for kind, name, sql in schema:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = %s AND name = %s",
+                [kind, name])
+            if cursor.fetchone() is None:
+                cursor.execute(sql)
+
+
+@contextmanager
+def deferred_schema(schema):
+    """Drop the objects of ``schema`` for the duration of a load."""
+    with connection.cursor() as cursor:
+        for kind, name, sql in schema:
+            cursor.execute(
+                f"DROP {kind.upper()} IF EXISTS "
+                f"{connection.ops.quote_name(name)}")
+    try:
+        yield
+    finally:
+        restore_schema(schema)
+
+
+def load(plan, progress=None):
+    """Insert the chunks of ``plan`` missing from the database, one
+    transaction per chunk. Returns the number of rows inserted.
+    """
+    inserted = 0
+    for table in TABLES:
+        for chunk in range(loaded_chunks(plan, table), plan.chunks(table)):
+            rows = list(plan.rows(table, chunk))
+            with transaction.atomic(), connection.cursor() as cursor:
+                _insert(cursor, table, rows)
+            inserted += len(rows)
+            if progress is not None:
+                progress(table, chunk + 1, plan.chunks(table), len(rows))
+    return inserted
+
+
+def rebuild_derived(plan):
+    """Recount the counters of the seeded users and posts and rebuild
+    the timelines; bulk inserts bypass the signals maintaining them.
+    """
+    stats = UserStats._meta.db_table
+    users = User._meta.db_table
+    posts = Post._meta.db_table
+    follows = Follow._meta.db_table
+    comments = Comment._meta.db_table
+    first_user = plan.bases["users"]
+    first_post = plan.bases["posts"]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {stats} (user_id, posts_count, followers_count, "
+            f"following_count, feed_pulled) SELECT u.id, "
+            f"(SELECT COUNT(*) FROM {posts} WHERE author_id = u.id), "
+            f"(SELECT COUNT(*) FROM {follows} WHERE author_id = u.id), "
+            f"(SELECT COUNT(*) FROM {follows} WHERE user_id = u.id), "
+            # rebuild_timelines() sets the feed modes from the counts.
+            f"FALSE "
+            f"FROM {users} u WHERE u.id > %s AND u.id <= %s "
+            f"ON CONFLICT (user_id) DO UPDATE SET "
+            f"posts_count = excluded.posts_count, "
+            f"followers_count = excluded.followers_count, "
+            f"following_count = excluded.following_count",
+            [first_user, first_user + plan.counts["users"]])
+        cursor.execute(
+            f"UPDATE {posts} SET comment_count = (SELECT COUNT(*) "
+            f"FROM {comments} WHERE post_id = {posts}.id) "
+            f"WHERE id > %s AND id <= %s",
+            [first_post, first_post + plan.counts["posts"]])
+    # Timelines are rebuilt from scratch, so their indexes are built once
+    # at the end too, in the same transaction.
+    with transaction.atomic(), \
+            deferred_schema(deferrable_schema([TimelineEntry])):
+        rebuild_timelines()
+    bump_version(FEED_VERSION_KEY)
+
+
+def seed(users, groups, posts, follows, comments, seed=0,
+         chunk_size=CHUNK_SIZE):
+    """Add a synthetic dataset to the database in one go and return the
+    number of rows created per table."""
+    plan = SeedPlan(users, groups, posts, follows, comments, seed=seed,
+                    chunk_size=chunk_size)
+    first_follow = _max_pk(Follow)
+    with deferred_schema(deferrable_schema()):
+        load(plan)
+    rebuild_derived(plan)
+    rebuild_search_index()
+    created = dict(plan.counts)
+    created["follows"] = Follow.objects.filter(pk__gt=first_follow).count()
+    if not posts:
+        created["comments"] = 0
+    return created
@@ -0,0 +1,158 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, counters, feed, pagecache
+from .models import (Comment, Follow, Group, Post, User, UserStats,
+                     comment_path)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.add_user_counts(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.add_user_counts(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def thread_new_comment(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or instance.path:
+        return
+    # The path ends with the id, so it can only be stored after the
+    # insert.
+    parent_path = instance.parent.path if instance.parent_id else ""
+    instance.path = comment_path(instance.pk, parent_path)
+    Comment.objects.filter(pk=instance.pk).update(path=instance.path)
+    if instance.parent_id:
+        counters.add_reply_count(instance.parent_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_reply(sender, instance, **kwargs):
+    if instance.parent_id:
+        counters.add_reply_count(instance.parent_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.add_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.add_comment_count(instance.post_id, -1)
+
+
+# Counter receivers are connected before the feed ones, which read the
+# follower counts.
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.add_user_counts(instance.author_id, followers_count=1)
+        counters.add_user_counts(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.add_user_counts(instance.author_id, followers_count=-1)
+    counters.add_user_counts(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        feed.follow_created(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    feed.follow_deleted(instance.user_id, instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Group)
+def bump_feed_version(sender, **kwargs):
+    caching.bump_version(caching.FEED_VERSION_KEY)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    caching.bump_version(caching.POST_VERSION_KEY.format(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def bump_commented_post_version(sender, instance, **kwargs):
+    caching.bump_version(
+        caching.POST_VERSION_KEY.format(pk=instance.post_id))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def bump_timeline_version(sender, instance, **kwargs):
+    caching.bump_version(
+        caching.TIMELINE_VERSION_KEY.format(pk=instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+def bump_group_version(sender, instance, **kwargs):
+    caching.bump_version(caching.GROUP_VERSION_KEY.format(pk=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def bump_author_version(sender, instance, created, update_fields=None,
+                        **kwargs):
+    if created or update_fields and set(update_fields) == {"last_login"}:
+        return
+    caching.bump_version(caching.AUTHOR_VERSION_KEY.format(pk=instance.pk))
+    # Cached listing pages hold the author's old username as well.
+    caching.bump_version(caching.FEED_VERSION_KEY)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    keys = [f"post:{instance.pk}", "index",
+            f"author-posts:{instance.author_id}",
+            f"stats:{instance.author_id}"]
+    if instance.group_id:
+        keys.append(f"group-posts:{instance.group_id}")
+    pagecache.purge(*keys)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def purge_commented_post_pages(sender, instance, **kwargs):
+    pagecache.purge(f"post:{instance.post_id}")
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def purge_follow_pages(sender, instance, **kwargs):
+    pagecache.purge(f"stats:{instance.author_id}",
+                    f"stats:{instance.user_id}")
+
+
+@receiver([post_save, post_delete], sender=Group)
+def purge_group_pages(sender, instance, **kwargs):
+    pagecache.purge(f"group:{instance.pk}")
+
+
+@receiver(post_save, sender=User)
+def purge_author_pages(sender, instance, created, update_fields=None,
+                       **kwargs):
+    if created or update_fields and set(update_fields) == {"last_login"}:
+        return
+    pagecache.purge(f"author:{instance.pk}")
@@ -0,0 +1,46 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts.caching import (AUTHOR_VERSION_KEY, GROUP_VERSION_KEY,
+                           POST_VERSION_KEY, get_versions)
+
+register = template.Library()
+
+CARD_KEY = "posts:card:{pk}:{versions}"
+EDIT_LINK_MARKER = "<!--post-edit-link-->"
+
+
+def card_cache_key(post):
+    keys = [
+        POST_VERSION_KEY.format(pk=post.pk),
+        AUTHOR_VERSION_KEY.format(pk=post.author_id),
+    ]
+    if post.group_id:
+        keys.append(GROUP_VERSION_KEY.format(pk=post.group_id))
+    versions = ".".join(str(version) for version in get_versions(keys))
+    return CARD_KEY.format(pk=post.pk, versions=versions)
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Render a post card from the fragment cache.
+
+    The card is shared by every viewer; only the author's "Edit" link is
+    rendered per request.
+    """
+    key = card_cache_key(post)
+    html = cache.get(key)
+    if html is None:
+        html = get_template("posts/includes/post_card.html").render(
+            {"post": post})
+        cache.set(key, html, settings.POST_CARD_TIMEOUT)
+    edit_link = ""
+    user = context.get("user")
+    if user is not None and user.is_authenticated \
+            and user.pk == post.author_id:
+        edit_link = get_template(
+            "posts/includes/post_edit_link.html").render({"post": post})
+    return mark_safe(html.replace(EDIT_LINK_MARKER, edit_link))
@@ -0,0 +1,36 @@
+from django import template
+from django.conf import settings
+
+from posts.cards import PostCard
+from posts.images import srcset
+from posts.models import ImageVariant
+
+register = template.Library()
+
+
+@register.inclusion_tag("posts/includes/post_image.html")
+def post_image(post, geometry_name):
+    """Show the image variants of ``post`` as a responsive <picture>, or
+    a placeholder of the same proportions until they are rendered.
+
+    Everything comes from the variant rows, so listings should prefetch
+    ``image_variants`` or use ``PostCard``s; no image file is opened.
+    """
+    geometry = settings.IMAGE_GEOMETRIES[geometry_name]
+    ratio_width, ratio_height = geometry["ratio"]
+    variants = post.variants if isinstance(post, PostCard) \
+        else post.image_variants.all()
+    variants = [variant for variant in variants
+                if variant.geometry == geometry_name] if post.image else []
+    webp = [variant for variant in variants
+            if variant.format == ImageVariant.WEBP]
+    jpeg = [variant for variant in variants
+            if variant.format == ImageVariant.JPEG]
+    return {
+        "image": post.image,
+        "fallback": jpeg[-1] if jpeg else None,
+        "webp_srcset": srcset(webp),
+        "jpeg_srcset": srcset(jpeg),
+        "sizes": geometry["sizes"],
+        "ratio": f"{ratio_height / ratio_width * 100:.4f}",
+    }
@@ -0,0 +1,14 @@
+from django import template
+from django.conf import settings
+
+from posts.pagination import page_window as window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page):
+    """Return the page numbers to link from a numbered ``page``, with
+    ``None`` where an ellipsis goes."""
+    return window(page.number, page.paginator.num_pages,
+                  settings.PAGINATOR_WINDOW)
@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from posts.caching import FEED_VERSION_KEY, get_version
+from posts.management.commands.benchmark_urls import url_names
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+from posts.search import SEARCH_TABLE
+from posts.seeding import SeedPlan, deferrable_schema, load, seed
+
+DATASET = {"users": 40, "groups": 3, "posts": 300, "follows": 5,
+           "comments": 200}
+# More requests than the burst of any rate-limited view.
+REPEAT = 12
+SHARED_KEY = "site:entry"
+
+
+class SeedTest(TestCase):
+    """Tests the synthetic dataset generator"""
+    def test_counts_and_derived_data(self):
+        """Tests that rows, counters and timelines are created"""
+        created = seed(**DATASET, chunk_size=64)
+        self.assertEqual(created["users"], DATASET["users"])
+        self.assertEqual(Post.objects.count(), DATASET["posts"])
+        self.assertEqual(Comment.objects.count(), DATASET["comments"])
+        self.assertEqual(Follow.objects.count(), created["follows"])
+        self.assertFalse(Follow.objects.filter(
+            user_id=F("author_id")).exists())
+        author = User.objects.order_by("-stats__posts_count").first()
+        self.assertEqual(author.stats.posts_count, author.posts.count())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_authors_are_heavy_tailed(self):
+        """Tests that a few authors write most posts"""
+        seed(**DATASET)
+        counts = sorted(User.objects.values_list(
+            "stats__posts_count", flat=True), reverse=True)
+        self.assertGreater(sum(counts[:4]), DATASET["posts"] / 3)
+
+    def test_deterministic(self):
+        """Tests that the same seed produces the same texts"""
+        seed(**DATASET, seed=7)
+        first = list(Post.objects.order_by("pk").values_list(
+            "text", flat=True)[:20])
+        Post.objects.all().delete()
+        seed(**DATASET, seed=7)
+        second = list(Post.objects.order_by("pk").values_list(
+            "text", flat=True)[:20])
+        self.assertEqual(first, second)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class SeedResumeTest(TestCase):
+    """Tests chunked loads and the seed_yatube command"""
+    def test_resume_after_interruption(self):
+        """Tests that a load resumed from the saved plan adds exactly the
+        missing chunks"""
+        plan = SeedPlan(**DATASET, chunk_size=64)
+
+        def interrupt(table, chunk, chunks, rows):
+            if table == "posts" and chunk == 2:
+                raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            load(plan, interrupt)
+        self.assertEqual(Post.objects.count(), 128)
+        resumed = SeedPlan.from_state(json.loads(json.dumps(plan.state())))
+        inserted = load(resumed)
+        self.assertEqual(inserted, DATASET["posts"] - 128
+                         + DATASET["comments"])
+        expected = [row[2] for chunk in range(plan.chunks("posts"))
+                    for row in plan.rows("posts", chunk)]
+        self.assertEqual(
+            list(Post.objects.order_by("pk").values_list("text", flat=True)),
+            expected)
+
+    def test_command(self):
+        """Tests that the command loads a dataset, restores the dropped
+        indexes and triggers and removes its state file"""
+        schema = deferrable_schema()
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            state = os.path.join(directory, "seed.json")
+            call_command("seed_yatube", **DATASET, state=state, stdout=out,
+                         stderr=StringIO())
+            self.assertFalse(os.path.exists(state))
+        self.assertIn("rows/s", out.getvalue())
+        self.assertCountEqual(deferrable_schema(), schema)
+        self.assertEqual(Post.objects.count(), DATASET["posts"])
+        self.assertTrue(TimelineEntry.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+            self.assertEqual(cursor.fetchone()[0], DATASET["posts"])
+
+
+class BenchmarkUrlsTest(TestCase):
+    """Tests the per-URL benchmark command"""
+    def benchmark(self, **options):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            call_command("benchmark_urls", output=path, **DATASET,
+                         **options, stderr=StringIO())
+            with open(path) as file:
+                return json.load(file)
+        finally:
+            os.remove(path)
+
+    def test_report_covers_every_url(self):
+        """Tests that every URL name is measured and reported as JSON"""
+        report = self.benchmark(repeat=2)
+        self.assertEqual(report["skipped"], [])
+        self.assertEqual(sorted(report["urls"]), sorted(url_names()))
+        for name, result in report["urls"].items():
+            with self.subTest(name=name):
+                self.assertLess(result["status"], 400)
+                self.assertEqual(result["runs"], 2)
+                self.assertGreater(result["queries_max"], 0)
+        self.assertEqual(report["dataset"]["posts"], DATASET["posts"])
+
+    @override_settings(RATELIMIT={**settings.RATELIMIT, "ENABLED": True})
+    def test_run_leaves_the_site_cache_and_limits_alone(self):
+        """Tests that repeated writes are not rate limited and that a
+        cold run keeps the entries of the site's cache"""
+        cache.set(SHARED_KEY, 1)
+        report = self.benchmark(repeat=REPEAT, cold=True)
+        for name, result in report["urls"].items():
+            with self.subTest(name=name):
+                self.assertLess(result["status"], 400)
+        self.assertEqual(cache.get(SHARED_KEY), 1)
+
+
+class BenchmarkIsolationTest(TestCase):
+    """Tests that the benchmarks leave the site's cache alone"""
+    def test_versions_and_entries_are_kept(self):
+        """Tests that the rolled-back writes of each benchmark neither
+        bump the site's versions nor touch its entries"""
+        commands = {
+            "benchmark_render": {"posts": 3, "repeat": 1},
+            "benchmark_cards": {"posts": 3, "repeat": 1},
+            "benchmark_feed": {"followers": [2], "threshold": 1,
+                               "pulled_authors": 1, "repeat": 1},
+        }
+        for name, options in commands.items():
+            with self.subTest(command=name):
+                cache.set(SHARED_KEY, 1)
+                version = get_version(FEED_VERSION_KEY)
+                call_command(name, **options, stdout=StringIO())
+                self.assertEqual(get_version(FEED_VERSION_KEY), version)
+                self.assertEqual(cache.get(SHARED_KEY), 1)
@@ -0,0 +1,173 @@
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.caching import (COUNT_KEY, FEED_VERSION_KEY, POST_VERSION_KEY,
+                           bump_version, get_version, page_query)
+from posts.cards import PostCards
+from posts.models import Comment, Group, Post, User
+from posts.pagination import encode_cursor
+
+HOMEPAGE_URL = reverse("index")
+USERNAME = "test_user"
+GROUP_SLUG = "test_group"
+TEST_POST_TEXT = "This is a test post"
+NEW_POST_TEXT = "This is a new post"
+NEW_GROUP_TITLE = "renamed_group"
+NEW_USERNAME = "renamed_user"
+
+
+class IndexPageCacheTest(TestCase):
+    """Tests the versioned cache of the index page"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a user, a group and 13 posts"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        for number in range(13):
+            cls.post = Post.objects.create(text=TEST_POST_TEXT,
+                                           author=cls.user,
+                                           group=cls.group)
+
+    def setUp(self):
+        """Clears the cache and creates a guest client"""
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_warm_index_runs_no_queries(self):
+        """Tests that a cached index page is served without SQL"""
+        for page in ("1", "2"):
+            with self.subTest(page=page):
+                self.guest_client.get(HOMEPAGE_URL, {"page": page})
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(HOMEPAGE_URL,
+                                                     {"page": page})
+                self.assertContains(response, TEST_POST_TEXT)
+
+    def test_new_post_is_visible_immediately(self):
+        """Tests that saving a post invalidates the cached pages"""
+        self.guest_client.get(HOMEPAGE_URL)
+        Post.objects.create(text=NEW_POST_TEXT, author=self.user)
+        response = self.guest_client.get(HOMEPAGE_URL)
+        self.assertEqual(response.context["page"][0].text, NEW_POST_TEXT)
+        self.assertEqual(response.context["page"].paginator.count, 14)
+
+    def test_deleted_post_disappears(self):
+        """Tests that deleting a post invalidates the cached pages"""
+        self.guest_client.get(HOMEPAGE_URL)
+        post = Post.objects.first()
+        post_id = post.pk
+        post.delete()
+        response = self.guest_client.get(HOMEPAGE_URL)
+        self.assertNotIn(post_id,
+                         [item.pk for item in response.context["page"]])
+        self.assertEqual(response.context["page"].paginator.count, 12)
+
+    def test_writes_bump_feed_version(self):
+        """Tests that post, comment and group writes bump the version"""
+        writes = {
+            "comment": lambda: Comment.objects.create(
+                post=self.post, author=self.user, text=TEST_POST_TEXT),
+            "group": lambda: Group.objects.filter(
+                pk=self.group.pk).first().save(),
+            "post": lambda: self.post.save(),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                version = get_version(FEED_VERSION_KEY)
+                write()
+                self.assertGreater(get_version(FEED_VERSION_KEY), version)
+
+    def page_queries(self, *queries):
+        total_key = COUNT_KEY.format(name="index", versions=0)
+        cache.set(total_key, Post.objects.count())
+        return {page_query(RequestFactory().get(HOMEPAGE_URL, query),
+                           PostCards(Post.objects.all()), total_key)
+                for query in queries}
+
+    def test_crafted_queries_share_page_keys(self):
+        """Tests that page keys are built from the page a query selects,
+        not from the raw cursors and numbers"""
+        cursor = encode_cursor([self.post.pub_date, self.post.pk])
+        naive = encode_cursor([timezone.make_naive(self.post.pub_date),
+                               self.post.pk])
+        pages = {
+            "first": ({}, {"page": "x"}, {"page": "01"}),
+            "last": ({"page": "2"}, {"page": "0"}, {"page": "999"}),
+            "cursor": ({"after": cursor}, {"after": naive}),
+        }
+        for name, queries in pages.items():
+            with self.subTest(page=name):
+                self.assertEqual(len(self.page_queries(*queries)), 1)
+        with self.settings(CURSOR_PAGINATION=True):
+            self.assertEqual(len(self.page_queries(
+                {}, {"after": "x"}, {"before": encode_cursor(["x", 1])})), 1)
+
+    def test_lost_version_key_is_reseeded(self):
+        """Tests that bumping a missing version key creates it"""
+        cache.delete(FEED_VERSION_KEY)
+        bump_version(FEED_VERSION_KEY)
+        self.assertIsNotNone(cache.get(FEED_VERSION_KEY))
+
+
+class PostCardCacheTest(TestCase):
+    """Tests the per-post fragment cache of post cards"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of an author, a reader, a group and a post"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        cls.post = Post.objects.create(text=TEST_POST_TEXT,
+                                       author=cls.user,
+                                       group=cls.group)
+        cls.edit_url = reverse("post_edit", args=[USERNAME, cls.post.pk])
+
+    def setUp(self):
+        """Clears the cache and warms the card up"""
+        cache.clear()
+        self.guest_client = Client()
+        self.guest_client.get(HOMEPAGE_URL)
+
+    def test_edit_link_is_rendered_per_viewer(self):
+        """Tests that only the author gets the Edit link of a cached
+        card"""
+        author_client = Client()
+        author_client.force_login(self.user)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        self.assertContains(author_client.get(HOMEPAGE_URL), self.edit_url)
+        self.assertNotContains(reader_client.get(HOMEPAGE_URL),
+                               self.edit_url)
+        self.assertNotContains(self.guest_client.get(HOMEPAGE_URL),
+                               self.edit_url)
+
+    def test_card_is_rerendered_after_changes(self):
+        """Tests that edits and renames refresh the card"""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = NEW_POST_TEXT
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = NEW_GROUP_TITLE
+        user = User.objects.get(pk=self.user.pk)
+        user.username = NEW_USERNAME
+        changes = {
+            NEW_POST_TEXT: post.save,
+            NEW_GROUP_TITLE: group.save,
+            NEW_USERNAME: user.save,
+        }
+        for expected, change in changes.items():
+            with self.subTest(expected=expected):
+                change()
+                self.assertContains(self.guest_client.get(HOMEPAGE_URL),
+                                    expected)
+
+    def test_comment_bumps_post_version(self):
+        """Tests that a new comment invalidates the post's card"""
+        key = POST_VERSION_KEY.format(pk=self.post.pk)
+        version = get_version(key)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text=TEST_POST_TEXT)
+        self.assertGreater(get_version(key), version)
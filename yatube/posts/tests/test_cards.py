@@ -0,0 +1,78 @@
+import pickle
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.cards import PostCard, PostCards
+from posts.models import Follow, Group, Post, User
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+GROUP_SLUG = "test_group"
+GROUP_TITLE = "Test group"
+POST_TEXT = "This is a test post"
+
+
+class PostCardTest(TestCase):
+    """Tests the read models the listing pages render"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a grouped and an ungrouped post of a followed
+        author"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.group = Group.objects.create(title=GROUP_TITLE, slug=GROUP_SLUG)
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.plain = Post.objects.create(text=POST_TEXT, author=cls.author)
+        cls.grouped = Post.objects.create(text=POST_TEXT, author=cls.author,
+                                          group=cls.group)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_listings_render_cards(self):
+        """Tests that every listing page is made of cards carrying the
+        rendered fields"""
+        urls = (
+            reverse("index"),
+            reverse("group_posts", args=[GROUP_SLUG]),
+            reverse("profile", args=[AUTHOR_USERNAME]),
+            reverse("follow_index"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                card = response.context["page"][0]
+                self.assertIsInstance(card, PostCard)
+                self.assertEqual(card, self.grouped)
+                self.assertEqual(str(card.author), AUTHOR_USERNAME)
+                self.assertEqual(card.group.slug, GROUP_SLUG)
+                self.assertContains(response, f"#{GROUP_TITLE}")
+                self.assertContains(response, f"@{AUTHOR_USERNAME}")
+
+    def test_cards_match_the_posts(self):
+        """Tests the fields, the missing group and pickling of cards"""
+        cards = PostCards(Post.objects.all())[:2]
+        self.assertEqual(cards, [self.grouped, self.plain])
+        card = cards[1]
+        self.assertIsNone(card.group)
+        self.assertIsNone(card.group_id)
+        self.assertEqual(card.author_id, self.author.pk)
+        self.assertEqual(card.pub_date, self.plain.pub_date)
+        self.assertEqual(card.image, "")
+        copy = pickle.loads(pickle.dumps(card))
+        self.assertEqual(copy, card)
+        self.assertEqual(copy.author.username, AUTHOR_USERNAME)
+
+    def test_benchmark_command(self):
+        """Tests that the benchmark reports both read paths"""
+        out = StringIO()
+        call_command("benchmark_cards", posts=5, repeat=2, stdout=out)
+        self.assertIn("models:", out.getvalue())
+        self.assertIn("cards:", out.getvalue())
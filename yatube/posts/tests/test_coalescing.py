@@ -0,0 +1,130 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import LOCK_KEY
+from core.metrics import get_store
+from posts.caching import get_version
+from posts.coalescing import FLIGHT_KEY, coalesce_renders
+from posts.models import Post, User
+from posts.pagecache import GENERATION_KEY, url_digest
+
+USERNAME = "test_user"
+POST_TEXT = "This is a test post"
+PAGE_URL = "/viral/"
+THREADS = 8
+COALESCING = {"ENABLED": True, "SHARED": False, "TIMEOUT": 5}
+METRIC = "yatube_coalesced_renders_total"
+
+
+@override_settings(COALESCING=COALESCING)
+class CoalescingTest(TestCase):
+    """Tests that identical concurrent guest requests share a render"""
+    def setUp(self):
+        """Points the metrics at a temporary file and wraps a view held
+        until released"""
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(METRICS={
+            **settings.METRICS, "ENABLED": True, "FLUSH_INTERVAL": 60,
+            "PATH": os.path.join(self.directory, "metrics.sqlite3")})
+        self.settings.enable()
+        self.release = threading.Event()
+        self.renders = []
+        self.view = coalesce_renders(self.render)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def render(self, request):
+        self.renders.append(1)
+        self.release.wait(5)
+        return HttpResponse(POST_TEXT)
+
+    def request(self):
+        request = RequestFactory().get(PAGE_URL)
+        request.user = AnonymousUser()
+        return request
+
+    def counts(self):
+        """Returns the metric values by result"""
+        return {labels.split('result="')[1].split('"')[0]: value
+                for name, labels, value in get_store().collect()
+                if name == METRIC}
+
+    def get_concurrently(self):
+        responses = []
+        threads = [threading.Thread(
+            target=lambda: responses.append(self.view(self.request())))
+            for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        # Let every request reach the render in flight.
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_requests_share_one_render(self):
+        """Tests one render for a burst of identical requests, each
+        answered with a response of its own"""
+        responses = self.get_concurrently()
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(len({id(response) for response in responses}),
+                         THREADS)
+        for response in responses:
+            self.assertEqual(response.content.decode(), POST_TEXT)
+        self.assertEqual(self.counts(),
+                         {"rendered": 1, "local": THREADS - 1})
+
+    def test_signed_in_requests_render_alone(self):
+        """Tests that signed-in requests never wait for a guest's
+        render"""
+        self.release.set()
+        request = self.request()
+        request.user = User(username=USERNAME)
+        self.view(request)
+        self.view(request)
+        self.assertEqual(len(self.renders), 2)
+        self.assertEqual(self.counts(), {})
+
+    @override_settings(COALESCING={**COALESCING, "SHARED": True})
+    def test_workers_share_a_render_through_the_cache(self):
+        """Tests that a request waits for the render another worker
+        holds the lock of"""
+        request = self.request()
+        key = FLIGHT_KEY.format(url=url_digest(request),
+                                generation=get_version(GENERATION_KEY))
+        cache.add(LOCK_KEY.format(key=key), 1)
+        responses = []
+        thread = threading.Thread(
+            target=lambda: responses.append(self.view(request)))
+        thread.start()
+        time.sleep(0.1)
+        cache.set(key, pickle.dumps(HttpResponse(POST_TEXT)))
+        cache.delete(LOCK_KEY.format(key=key))
+        thread.join()
+        self.assertEqual(responses[0].content.decode(), POST_TEXT)
+        self.assertEqual(self.renders, [])
+        self.assertEqual(self.counts(), {"shared": 1})
+
+    def test_views_count_their_renders(self):
+        """Tests the coalescing of a real page"""
+        user = User.objects.create_user(username=USERNAME)
+        post = Post.objects.create(text=POST_TEXT, author=user)
+        response = Client().get(reverse("post", args=[USERNAME, post.pk]))
+        self.assertContains(response, POST_TEXT)
+        self.assertIn(f'{METRIC}{{result="rendered",view="post"}} 1',
+                      get_store().render())
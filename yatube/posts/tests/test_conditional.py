@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+GROUP_SLUG = "test_group"
+POST_TEXT = "This is a test post"
+NEW_USERNAME = "renamed_user"
+
+
+class ConditionalGetTest(TestCase):
+    """Tests ETag revalidation of the post, profile and group pages"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a reader and an author with a grouped post"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        cls.post = Post.objects.create(text=POST_TEXT, author=cls.author,
+                                       group=cls.group)
+        cls.post_url = reverse("post", args=[AUTHOR_USERNAME, cls.post.pk])
+        cls.profile_url = reverse("profile", args=[AUTHOR_USERNAME])
+        cls.group_url = reverse("group_posts", args=[GROUP_SLUG])
+
+    def setUp(self):
+        """Creates a guest and an authorised client"""
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def revalidate(self, url, client=None):
+        client = client or self.guest_client
+        etag = client.get(url)["ETag"]
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        """Tests that a matching If-None-Match gets 304 without any
+        template rendering"""
+        for url in (self.post_url, self.profile_url, self.group_url):
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response.content, b"")
+
+    def test_shared_caches_may_keep_guest_pages(self):
+        """Tests Cache-Control and Vary of guest and signed-in pages"""
+        response = self.guest_client.get(self.post_url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+        response = self.authorized_client.get(self.post_url)
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_viewers_get_their_own_etags(self):
+        """Tests that a signed-in page does not validate a guest copy"""
+        etag = self.guest_client.get(self.profile_url)["ETag"]
+        response = self.authorized_client.get(self.profile_url,
+                                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate_etags(self):
+        """Tests that comments, renamed commenters, follows, new posts
+        and edits change the validators of the pages showing them"""
+        Comment.objects.create(post=self.post, author=self.user,
+                               text=POST_TEXT)
+        commenter = User.objects.get(pk=self.user.pk)
+        commenter.username = NEW_USERNAME
+        changes = (
+            (self.post_url, lambda: Comment.objects.create(
+                post=self.post, author=self.user, text=POST_TEXT)),
+            (self.post_url, commenter.save),
+            (self.profile_url, lambda: Follow.objects.create(
+                user=self.user, author=self.author)),
+            (self.group_url, lambda: Post.objects.create(
+                text=POST_TEXT, author=self.user, group=self.group)),
+            (self.group_url, lambda: Post.objects.filter(
+                pk=self.post.pk).first().save()),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)["ETag"]
+                change()
+                response = self.guest_client.get(url,
+                                                 HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_missing_pages_are_still_404(self):
+        """Tests that unknown objects skip revalidation"""
+        response = self.guest_client.get(
+            reverse("post", args=[USERNAME, self.post.pk]),
+            HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 404)
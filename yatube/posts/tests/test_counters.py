@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User, UserStats
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+TEST_POST_TEXT = "This is a test post"
+COMMENT_TEXT = "This is a test comment"
+
+
+class CountersTest(TestCase):
+    """Tests the denormalized post, comment and follow counters"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a reader, an author and a post"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.post = Post.objects.create(text=TEST_POST_TEXT,
+                                       author=cls.author)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_new_post_counts(self):
+        """Tests that publishing a post increments posts_count"""
+        self.authorized_client.post(reverse("new_post"),
+                                    {"text": TEST_POST_TEXT})
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        Post.objects.filter(author=self.user).delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_comments_are_counted(self):
+        """Tests that both comment views update comment_count"""
+        urls = (
+            reverse("add_comment", args=[AUTHOR_USERNAME, self.post.pk]),
+            reverse("post", args=[AUTHOR_USERNAME, self.post.pk]),
+        )
+        for url in urls:
+            self.authorized_client.post(url, {"text": COMMENT_TEXT})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        Comment.objects.filter(post=self.post).first().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_follow_and_unfollow_are_counted(self):
+        """Tests the followers and following counters"""
+        follow_url = reverse("profile_follow", args=[AUTHOR_USERNAME])
+        self.authorized_client.get(follow_url)
+        self.authorized_client.get(follow_url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        self.authorized_client.get(
+            reverse("profile_unfollow", args=[AUTHOR_USERNAME]))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_profile_shows_counters(self):
+        """Tests that the author card renders the stored counters"""
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(
+            reverse("profile", args=[AUTHOR_USERNAME]))
+        self.assertContains(response, "Followers: 1")
+        self.assertContains(response, "Posts: 1")
+
+    def test_repair_counters_fixes_drift(self):
+        """Tests that the management command recounts drifted rows"""
+        Comment.objects.create(post=self.post, author=self.user,
+                               text=COMMENT_TEXT)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        out = StringIO()
+        call_command("repair_counters", stdout=out)
+        self.assertIn("comment counts: 1", out.getvalue())
+        self.assertIn("stats: 2", out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_deleting_a_user_keeps_counters_consistent(self):
+        """Tests that deleting a user with posts, comments and follows
+        leaves no stats row behind and decrements the others"""
+        Post.objects.create(text=TEST_POST_TEXT, author=self.user)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text=COMMENT_TEXT)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.author, author=self.user)
+        User.objects.filter(pk=self.user.pk).delete()
+        self.assertFalse(UserStats.objects.filter(
+            user_id=self.user.pk).exists())
+        stats = self.stats(self.author)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(stats.following_count, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_drifted_counters_stop_at_zero(self):
+        """Tests that a decrement below zero is clamped"""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.filter(user=self.author).update(followers_count=0)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
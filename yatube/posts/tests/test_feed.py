@@ -0,0 +1,158 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.feed import get_feed, pulled_authors, push_authors
+from posts.models import Follow, Post, TimelineEntry, User
+
+FOLLOW_INDEX_URL = reverse("follow_index")
+USERNAME = "reader"
+AUTHOR_USERNAME = "author"
+OTHER_USERNAME = "other_author"
+POST_TEXT = "This is a timeline post"
+
+
+class TimelineTest(TestCase):
+    """Tests the materialized follow timeline"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a reader and two authors with posts"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.other = User.objects.create_user(username=OTHER_USERNAME)
+        cls.old_post = Post.objects.create(text=POST_TEXT,
+                                           author=cls.author)
+        Post.objects.create(text=POST_TEXT, author=cls.other)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_backfills_timeline(self):
+        """Tests that following copies the author's posts
+        into the reader's timeline"""
+        Follow.objects.create(user=self.user, author=self.author)
+        entries = TimelineEntry.objects.filter(user=self.user)
+        self.assertEqual(
+            list(entries.values_list("post_id", flat=True)),
+            [self.old_post.pk]
+        )
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Tests that a new post lands in the followers' timelines
+        only"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text=POST_TEXT, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.other, post=post).exists())
+
+    def test_unfollow_prunes_timeline(self):
+        """Tests that unfollowing removes the author's posts
+        from the reader's timeline"""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.other)
+        self.authorized_client.get(reverse("profile_unfollow",
+                                           args=[AUTHOR_USERNAME]))
+        authors = TimelineEntry.objects.filter(
+            user=self.user).values_list("author_id", flat=True)
+        self.assertEqual(list(authors), [self.other.pk])
+
+    def test_follow_index_reads_timeline(self):
+        """Tests that the follow feed is served from the timeline
+        newest first"""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text=POST_TEXT, author=self.author)
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page"]),
+                         [new_post, self.old_post])
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=1)
+class HybridFeedTest(TestCase):
+    """Tests read-time merging of posts by high-follower authors"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a popular author with two followers and a regular
+        author followed by the reader"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.fan = User.objects.create_user(username="fan")
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.other = User.objects.create_user(username=OTHER_USERNAME)
+        Follow.objects.create(user=cls.user, author=cls.other)
+
+    def setUp(self):
+        """Gives the popular author two followers"""
+        cache.clear()
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.fan, author=self.author)
+
+    def test_popular_author_posts_are_not_pushed(self):
+        """Tests that posts above the threshold skip the timelines"""
+        post = Post.objects.create(text=POST_TEXT, author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=post).exists())
+
+    def test_feed_merges_pulled_and_pushed_posts(self):
+        """Tests that the feed merges both kinds of posts newest first"""
+        posts = [
+            Post.objects.create(text=POST_TEXT, author=author)
+            for author in (self.other, self.author, self.other,
+                           self.author)
+        ]
+        posts.reverse()
+        feed = get_feed(self.user)
+        self.assertEqual(feed.count(), 4)
+        self.assertEqual(feed[0:4], posts)
+        self.assertEqual(feed[1:3], posts[1:3])
+
+    @mock.patch("posts.feed.KEY_BATCH_SIZE", 2)
+    def test_deep_slices_seek_past_the_merged_keys(self):
+        """Tests that slices away from the head match the merged feed
+        when the keys are read in several batches"""
+        posts = [
+            Post.objects.create(text=POST_TEXT, author=author)
+            for author in (self.other, self.author) * 4
+        ]
+        posts.reverse()
+        feed = get_feed(self.user)
+        for start in range(len(posts) + 1):
+            with self.subTest(start=start):
+                self.assertEqual(feed[start:start + 3],
+                                 posts[start:start + 3])
+
+    @override_settings(FEED_PUSH_THRESHOLD=1)
+    def test_unfollowed_authors_are_pushed_outside_requests(self):
+        """Tests that an author falling to the push threshold stays
+        pulled until the command copies their posts into the remaining
+        timelines"""
+        post = Post.objects.create(text=POST_TEXT, author=self.author)
+        Follow.objects.filter(user=self.fan, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(get_feed(self.user)[0:10], [post])
+        call_command("push_authors", stdout=StringIO())
+        self.assertNotIn(self.author.pk, pulled_authors())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertEqual(get_feed(self.user)[0:10], [post])
+
+    @override_settings(FEED_PUSH_THRESHOLD=0)
+    def test_authors_between_thresholds_keep_their_mode(self):
+        """Tests that an author hovering around the threshold is not
+        switched back and forth"""
+        follow = Follow.objects.get(user=self.fan, author=self.author)
+        for _ in range(2):
+            follow.delete()
+            self.assertEqual(push_authors(), 0)
+            follow = Follow.objects.create(user=self.fan, author=self.author)
+        self.assertIn(self.author.pk, pulled_authors())
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author).exists())
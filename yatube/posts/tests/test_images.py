@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.images import render_variants, variant_sizes
+from posts.models import ImageVariant, Post, User
+
+HOMEPAGE_URL = reverse("index")
+USERNAME = "test_user"
+POST_TEXT = "post with a photo"
+CARD = {"ratio": (960, 339), "widths": (480, 960, 1440), "sizes": "100vw"}
+GEOMETRIES = {"card": CARD}
+SOURCE_SIZE = (1000, 800)
+# EXIF orientation 6: the camera was rotated, show the image turned
+# 90 degrees clockwise.
+ORIENTATION_TAG = 0x0112
+CAMERA_TAG = 0x0110
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def photo(size=SOURCE_SIZE, orientation=None):
+    exif = Image.Exif()
+    exif[CAMERA_TAG] = "Test camera"
+    if orientation:
+        exif[ORIENTATION_TAG] = orientation
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(),
+                              content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_GEOMETRIES=GEOMETRIES)
+class ImageVariantTest(TestCase):
+    """Tests the WebP/JPEG image variant pipeline"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates the author"""
+        cls.user = User.objects.create_user(username=USERNAME)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, **kwargs):
+        return Post.objects.create(text=POST_TEXT, author=self.user,
+                                   image=photo(**kwargs))
+
+    def test_variant_sizes_do_not_upscale(self):
+        """Tests that only widths up to the source width are rendered"""
+        self.assertEqual(variant_sizes((1000, 800), CARD),
+                         [(480, 170), (960, 339)])
+        self.assertEqual(variant_sizes((100, 100), CARD), [(480, 170)])
+
+    def test_variants_are_recorded(self):
+        """Tests that every variant is stored with its real size"""
+        post = self.create_post()
+        render_variants(post)
+        variants = ImageVariant.objects.filter(post=post)
+        self.assertEqual(
+            sorted(variants.values_list("format", "width", "height")),
+            [(ImageVariant.JPEG, 480, 170), (ImageVariant.JPEG, 960, 339),
+             (ImageVariant.WEBP, 480, 170), (ImageVariant.WEBP, 960, 339)])
+        for variant in variants:
+            with self.subTest(variant=str(variant)):
+                self.assertEqual(variant.file.size, variant.size)
+                with Image.open(variant.file) as image:
+                    self.assertEqual(image.size,
+                                     (variant.width, variant.height))
+                    self.assertEqual(image.format.lower(),
+                                     variant.format)
+                    self.assertFalse(image.getexif())
+
+    def test_original_metadata_is_stripped(self):
+        """Tests that EXIF is removed from the upload and its orientation
+        applied to the pixels"""
+        post = self.create_post(orientation=6)
+        render_variants(post)
+        post.refresh_from_db()
+        with Image.open(post.image) as image:
+            self.assertFalse(image.getexif())
+            self.assertEqual(image.size, SOURCE_SIZE[::-1])
+
+    def test_rendering_again_replaces_variants(self):
+        """Tests that old variant rows and files are removed"""
+        post = self.create_post()
+        old = render_variants(post)
+        render_variants(post)
+        self.assertEqual(ImageVariant.objects.filter(post=post).count(),
+                         len(old))
+        for variant in old:
+            self.assertFalse(variant.file.storage.exists(variant.file.name))
+
+    def test_card_emits_srcset(self):
+        """Tests that the card shows a <picture> with sized srcsets"""
+        post = self.create_post()
+        render_variants(post)
+        content = Client().get(HOMEPAGE_URL).content.decode()
+        self.assertIn('<source type="image/webp"', content)
+        self.assertIn(" 960w", content)
+        self.assertIn('width="960" height="339"', content)
+        self.assertIn('sizes="100vw"', content)
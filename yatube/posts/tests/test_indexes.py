@@ -0,0 +1,75 @@
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+GROUP_SLUG = "test_group"
+TEST_POST_TEXT = "This is a test post"
+APP_TABLES = ("posts_post", "posts_comment", "posts_follow",
+              "posts_timelineentry")
+
+
+@unittest.skipUnless(connection.vendor == "sqlite",
+                     "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTest(TestCase):
+    """Tests that the views read posts, comments and follows through
+    indexes in index order"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a reader following an author with a grouped,
+        commented post"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(text=TEST_POST_TEXT,
+                                       author=cls.author,
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.user,
+                               text=TEST_POST_TEXT)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def query_plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or not any(
+                        table in sql for table in APP_TABLES):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def test_views_use_indexes_without_sorting(self):
+        """Tests the query plans of every post reading view"""
+        urls = (
+            reverse("index"),
+            reverse("group_posts", args=[GROUP_SLUG]),
+            reverse("profile", args=[AUTHOR_USERNAME]),
+            reverse("post", args=[AUTHOR_USERNAME, self.post.pk]),
+            reverse("post_comments", args=[AUTHOR_USERNAME, self.post.pk]),
+            reverse("follow_index"),
+            reverse("profile_follow", args=[AUTHOR_USERNAME]),
+        )
+        for url in urls:
+            for sql, plan in self.query_plans(url):
+                with self.subTest(url=url, sql=sql):
+                    self.assertFalse(
+                        [step for step in plan if "TEMP B-TREE" in step])
+                    for step in plan:
+                        if any(table in step for table in APP_TABLES):
+                            self.assertRegex(step, "INDEX|PRIMARY KEY")
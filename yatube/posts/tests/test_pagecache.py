@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+GROUP_SLUG = "test_group"
+OTHER_SLUG = "other_group"
+POST_TEXT = "This is a test post"
+PAGE_CACHE = {"ENABLED": True, "TIMEOUT": 60}
+
+
+@override_settings(PAGE_CACHE=PAGE_CACHE)
+class PageCacheTest(TestCase):
+    """Tests the full-page cache of signed-out visitors"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a reader, an author with a grouped post and a second
+        group"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        cls.other = Group.objects.create(title=OTHER_SLUG, slug=OTHER_SLUG)
+        cls.post = Post.objects.create(text=POST_TEXT, author=cls.author,
+                                       group=cls.group)
+        cls.index_url = reverse("index")
+        cls.post_url = reverse("post", args=[AUTHOR_USERNAME, cls.post.pk])
+        cls.profile_url = reverse("profile", args=[AUTHOR_USERNAME])
+        cls.group_url = reverse("group_posts", args=[GROUP_SLUG])
+        cls.other_url = reverse("group_posts", args=[OTHER_SLUG])
+        cls.urls = (cls.index_url, cls.post_url, cls.profile_url,
+                    cls.group_url, cls.other_url)
+
+    def setUp(self):
+        """Creates a guest client and warms the cache"""
+        cache.clear()
+        self.guest_client = Client()
+        for url in self.urls:
+            self.guest_client.get(url)
+
+    def queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        return len(context.captured_queries)
+
+    def cached(self):
+        """Returns the URLs answered without touching the database"""
+        return {url for url in self.urls
+                if not self.queries(self.guest_client, url)}
+
+    def assertPurged(self, purged):
+        self.assertEqual(self.cached(), set(self.urls) - set(purged))
+
+    def test_cached_pages_run_no_queries(self):
+        """Tests that cached pages are served whole, tagged for proxies"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("public", response["Cache-Control"])
+                self.assertIn("Cookie", response["Vary"])
+                self.assertEqual(response["Surrogate-Control"], "max-age=60")
+        response = self.guest_client.get(self.post_url)
+        self.assertEqual(
+            set(response["Surrogate-Key"].split()),
+            {f"post:{self.post.pk}", f"author:{self.author.pk}",
+             f"stats:{self.author.pk}", f"group:{self.group.pk}"})
+
+    def test_cached_pages_answer_conditional_requests(self):
+        """Tests that a cached page still answers If-None-Match"""
+        etag = self.guest_client.get(self.post_url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.post_url,
+                                             HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_purge_the_pages_showing_them(self):
+        """Tests that each write purges only the pages it changes"""
+        changes = (
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.user, text=POST_TEXT),
+             [self.index_url, self.post_url, self.profile_url,
+              self.group_url]),
+            (lambda: Follow.objects.create(user=self.user,
+                                           author=self.author),
+             [self.post_url, self.profile_url]),
+            (lambda: Post.objects.create(text=POST_TEXT, author=self.user,
+                                         group=self.other),
+             [self.index_url, self.other_url]),
+            # The index shows the new post with the group title.
+            (lambda: Group.objects.filter(pk=self.other.pk).first().save(),
+             [self.index_url, self.other_url]),
+            (lambda: User.objects.get(pk=self.author.pk).save(),
+             [self.index_url, self.post_url, self.profile_url,
+              self.group_url]),
+        )
+        for change, purged in changes:
+            with self.subTest(purged=purged):
+                self.cached()
+                change()
+                self.assertPurged(purged)
+
+    def test_signed_in_pages_are_not_cached(self):
+        """Tests that signed-in requests reach the view and do not fill
+        the cache for guests"""
+        cache.clear()
+        client = Client()
+        client.force_login(self.user)
+        client.get(self.profile_url)
+        self.assertTrue(self.queries(client, self.profile_url))
+        self.assertTrue(self.queries(self.guest_client, self.profile_url))
+        self.assertFalse(self.queries(self.guest_client, self.profile_url))
+
+    @override_settings(PAGE_CACHE={**PAGE_CACHE, "ENABLED": False})
+    def test_disabled_cache_renders_every_time(self):
+        """Tests the ENABLED switch"""
+        response = self.guest_client.get(self.index_url)
+        self.assertNotIn("Surrogate-Control", response)
@@ -0,0 +1,285 @@
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.pagination import CursorPaginator, encode_cursor, page_window
+
+HOMEPAGE_URL = reverse("index")
+FOLLOW_INDEX_URL = reverse("follow_index")
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+POSTS_COUNT = 13
+GROUP_SLUG = "test_group"
+GROUP_PAGES = 40
+COMMENTS_COUNT = 7
+COMMENTS_ON_PAGE = 3
+MALFORMED_CURSORS = ([], [1], ["x", 1], [None, None],
+                     ["2020-01-01T00:00:00", "abc"], [[1], {"a": 1}])
+
+
+class CursorPaginationTest(TestCase):
+    """Tests keyset pagination of the post listings"""
+    @classmethod
+    def setUpClass(cls):
+        """Creates 13 posts"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        for number in range(POSTS_COUNT):
+            Post.objects.create(text=f"This is a test_{number} post",
+                                author=cls.user)
+        cls.posts = list(Post.objects.order_by("-pub_date", "-id"))
+
+    def setUp(self):
+        """Client creation"""
+        cache.clear()
+        self.client = Client()
+
+    def test_after_and_before_walk_the_listing(self):
+        """Tests that next and previous cursors return adjacent pages"""
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        last = paginator.page(after=second.next_cursor)
+        self.assertEqual(list(first), self.posts[:5])
+        self.assertEqual(list(second), self.posts[5:10])
+        self.assertEqual(list(last), self.posts[10:])
+        self.assertFalse(last.has_next())
+        back = paginator.page(before=last.previous_cursor)
+        self.assertEqual(list(back), self.posts[5:10])
+        self.assertTrue(back.has_previous())
+
+    def test_equal_dates_are_ordered_by_id(self):
+        """Tests that posts sharing a pub_date are neither skipped
+        nor repeated"""
+        Post.objects.update(pub_date=self.posts[0].pub_date)
+        paginator = CursorPaginator(Post.objects.all(), 4)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            seen.extend(page)
+        ids = [post.pk for post in seen]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), POSTS_COUNT)
+
+    def test_index_accepts_cursor_tokens(self):
+        """Tests that the index view serves ?after= pages"""
+        token = encode_cursor([self.posts[9].pub_date, self.posts[9].pk])
+        response = self.client.get(HOMEPAGE_URL, {"after": token})
+        self.assertEqual(list(response.context["page"]), self.posts[10:])
+        self.assertContains(response, "?before=")
+
+    def test_malformed_token_returns_first_page(self):
+        """Tests that a broken token falls back to the first page"""
+        response = self.client.get(HOMEPAGE_URL, {"after": "%%%"})
+        self.assertEqual(list(response.context["page"]), self.posts[:10])
+
+    def test_crafted_tokens_return_first_page(self):
+        """Tests that tokens of the wrong length or with values of the
+        wrong types fall back to the first page"""
+        urls = (HOMEPAGE_URL, reverse("profile", args=[USERNAME]))
+        for url in urls:
+            for values in MALFORMED_CURSORS:
+                for direction in ("after", "before"):
+                    with self.subTest(url=url, values=values,
+                                      direction=direction):
+                        response = self.client.get(
+                            url, {direction: encode_cursor(values)})
+                        self.assertEqual(list(response.context["page"]),
+                                         self.posts[:10])
+
+    def test_naive_dates_in_tokens_are_accepted(self):
+        """Tests that a date without an offset is read as UTC"""
+        date = self.posts[9].pub_date.replace(tzinfo=None)
+        token = encode_cursor([date, self.posts[9].pk])
+        response = self.client.get(HOMEPAGE_URL, {"after": token})
+        self.assertEqual(list(response.context["page"]), self.posts[10:])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_page_links_keep_working_in_cursor_mode(self):
+        """Tests that ?page= links still use the numbered paginator"""
+        response = self.client.get(HOMEPAGE_URL)
+        self.assertContains(response, "?after=")
+        response = self.client.get(HOMEPAGE_URL, {"page": 2})
+        self.assertIsInstance(response.context["page"], Page)
+        self.assertEqual(len(response.context["page"]), 3)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=0, CURSOR_PAGINATION=True)
+class FeedCursorPaginationTest(TestCase):
+    """Tests keyset pagination of the merged follow feed"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a reader and an author pulled at read time"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=AUTHOR_USERNAME)
+
+    def setUp(self):
+        """Creates the follow and 13 posts by the author"""
+        cache.clear()
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(POSTS_COUNT):
+            Post.objects.create(text=f"This is a test_{number} post",
+                                author=self.author)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_follow_index_walks_merged_feed(self):
+        """Tests that cursor pages of the follow feed cover every post
+        once"""
+        response = self.client.get(FOLLOW_INDEX_URL)
+        page = response.context["page"]
+        seen = list(page)
+        cursor = page.next_cursor
+        response = self.client.get(FOLLOW_INDEX_URL, {"after": cursor})
+        seen.extend(response.context["page"])
+        self.assertEqual(
+            seen, list(Post.objects.order_by("-pub_date", "-id")))
+
+
+def counts(queries):
+    return [query for query in queries
+            if query["sql"].startswith("SELECT COUNT(*)")]
+
+
+@override_settings(POSTS_ON_PAGE=1, PAGINATOR_WINDOW=2)
+class WindowedPaginatorTest(TestCase):
+    """Tests the page window and the cached counts of numbered pages"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a group with 40 one-post pages"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title="Group", slug=GROUP_SLUG)
+        Post.objects.bulk_create(
+            Post(text=f"Post {number}", author=cls.user, group=cls.group)
+            for number in range(GROUP_PAGES))
+        cls.url = reverse("group_posts", args=[GROUP_SLUG])
+
+    def setUp(self):
+        """Client creation"""
+        cache.clear()
+        self.client = Client()
+
+    def test_page_window(self):
+        """Tests the links around the first, a middle and the last
+        page"""
+        self.assertEqual(page_window(1, 40, 2), [1, 2, 3, None, 40])
+        self.assertEqual(page_window(20, 40, 2),
+                         [1, None, 18, 19, 20, 21, 22, None, 40])
+        self.assertEqual(page_window(40, 40, 2), [1, None, 38, 39, 40])
+        self.assertEqual(page_window(4, 7, 2), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(page_window(1, 1, 2), [1])
+
+    def test_only_the_window_is_rendered(self):
+        """Tests that a middle page links a window, both ends and
+        ellipses only"""
+        response = self.client.get(self.url, {"page": 20})
+        content = response.content.decode()
+        links = [number for number in range(1, GROUP_PAGES + 1)
+                 if f'href="?page={number}"' in content]
+        self.assertEqual(links, [1, 18, 19, 21, 22, 40])
+        self.assertEqual(content.count("&hellip;"), 2)
+
+    def test_count_is_cached_until_the_listing_changes(self):
+        """Tests that COUNT(*) runs once per listing version"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"page": 2})
+        self.assertEqual(counts(queries), [])
+        self.assertEqual(response.context["page"].paginator.count,
+                         GROUP_PAGES)
+        Post.objects.create(text="New post", author=self.user,
+                            group=self.group)
+        response = self.client.get(self.url, {"page": 2})
+        self.assertEqual(response.context["page"].paginator.count,
+                         GROUP_PAGES + 1)
+
+    def test_feed_count_follows_the_follows(self):
+        """Tests that following another author refreshes the cached
+        feed count"""
+        reader = User.objects.create_user(username=AUTHOR_USERNAME)
+        self.client.force_login(reader)
+        response = self.client.get(FOLLOW_INDEX_URL, {"page": 1})
+        self.assertEqual(response.context["page"].paginator.count, 0)
+        Follow.objects.create(user=reader, author=self.user)
+        response = self.client.get(FOLLOW_INDEX_URL, {"page": 1})
+        self.assertEqual(response.context["page"].paginator.count,
+                         GROUP_PAGES)
+
+
+@override_settings(COMMENTS_ON_PAGE=COMMENTS_ON_PAGE)
+class CommentPaginationTest(TestCase):
+    """Tests the cursor pages of a post's comments"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a post with 7 comments, two of them written at the
+        same moment"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text="Post", author=cls.user)
+        for number in range(COMMENTS_COUNT):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f"Comment {number}")
+        first = Comment.objects.order_by("id").first()
+        Comment.objects.filter(text="Comment 1").update(
+            created=first.created)
+        cls.comments = list(cls.post.comments.order_by("-created", "-id"))
+        cls.post_url = reverse("post", args=[USERNAME, cls.post.pk])
+        cls.fragment_url = reverse("post_comments",
+                                   args=[USERNAME, cls.post.pk])
+
+    def setUp(self):
+        """Client creation"""
+        cache.clear()
+        self.client = Client()
+
+    def test_post_page_shows_the_newest_comments(self):
+        """Tests that the post page holds the first comment page and a
+        link to the next one"""
+        response = self.client.get(self.post_url)
+        page = response.context["comments"]
+        self.assertEqual(list(page), self.comments[:COMMENTS_ON_PAGE])
+        self.assertContains(response, self.fragment_url
+                            + f"?comments_after={page.next_cursor}")
+
+    def test_fragments_walk_every_comment(self):
+        """Tests that following the next cursors returns each comment
+        once, in order, in one query per batch"""
+        seen = []
+        response = self.client.get(self.post_url)
+        while True:
+            page = response.context["comments"]
+            seen += page
+            if not page.has_next():
+                break
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    self.fragment_url,
+                    {"comments_after": page.next_cursor})
+            self.assertEqual(len(queries), 2)
+            self.assertTemplateUsed(response,
+                                    "posts/includes/comment_list.html")
+            self.assertNotContains(response, "<form")
+        self.assertEqual(seen, self.comments)
+
+    def test_crafted_tokens_return_the_first_comments(self):
+        """Tests that malformed comment cursors on the post page and the
+        fragment fall back to the newest comments"""
+        for url in (self.post_url, self.fragment_url):
+            for values in MALFORMED_CURSORS:
+                with self.subTest(url=url, values=values):
+                    response = self.client.get(
+                        url, {"comments_after": encode_cursor(values)})
+                    self.assertEqual(list(response.context["comments"]),
+                                     self.comments[:COMMENTS_ON_PAGE])
+
+    def test_fragment_of_another_authors_post(self):
+        """Tests that the fragment checks the author of the post"""
+        other = User.objects.create_user(username=AUTHOR_USERNAME)
+        response = self.client.get(
+            reverse("post_comments", args=[other.username, self.post.pk]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+USERNAME = "test_user"
+AUTHOR_USERNAME = "test_author"
+GROUP_SLUG = "test_group"
+TEST_POST_TEXT = "This is a test post"
+PAGE_SIZES = (10, 100)
+
+
+@override_settings(QUERY_BUDGET={"ENABLED": True, "DEFAULT": 15,
+                                 "VIEWS": {}, "RAISE": True})
+class ListingQueriesTest(TestCase):
+    """Tests that listings run a constant number of queries"""
+    @classmethod
+    def setUpClass(cls):
+        """Creation of a reader following an author with 100 posts,
+        each in a group, and a post with 100 comments"""
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        cls.authors = [
+            User.objects.create_user(username=f"{AUTHOR_USERNAME}_{number}")
+            for number in range(max(PAGE_SIZES))
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+            cls.post = Post.objects.create(text=TEST_POST_TEXT,
+                                           author=author,
+                                           group=cls.group)
+        for author in cls.authors:
+            Comment.objects.create(post=cls.post, author=author,
+                                   text=TEST_POST_TEXT)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def count_queries(self, url, page_size):
+        cache.clear()
+        with override_settings(POSTS_ON_PAGE=page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_listing_query_counts_do_not_grow_with_page_size(self):
+        """Tests listings with 10 and 100 posts on a page"""
+        urls = (
+            reverse("index"),
+            reverse("group_posts", args=[GROUP_SLUG]),
+            reverse("profile", args=[self.post.author.username]),
+            reverse("follow_index"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                counts = [self.count_queries(url, size)
+                          for size in PAGE_SIZES]
+                self.assertEqual(counts[0], counts[1])
+
+    def test_post_comments_are_fetched_with_authors(self):
+        """Tests that the post page runs the same queries for any number
+        of comments"""
+        url = reverse("post", args=[self.post.author.username,
+                                    self.post.pk])
+        many = self.count_queries(url, 10)
+        Comment.objects.filter(post=self.post).exclude(
+            pk=Comment.objects.filter(post=self.post).first().pk
+        ).delete()
+        self.assertEqual(self.count_queries(url, 10), many)
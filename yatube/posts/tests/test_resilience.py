@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import get_store
+from posts import resilience
+from posts.caching import FEED_VERSION_KEY, bump_version
+from posts.pagecache import purge
+from posts.models import Group, Post, User
+
+USERNAME = "test_user"
+GROUP_SLUG = "test_group"
+POST_TEXT = "This is a test post"
+NEW_TEXT = "This is a newer post"
+STALE_PAGES = {"ENABLED": True, "LATENCY_BUDGET": 0.5, "COOLDOWN": 10,
+               "TIMEOUT": 60}
+
+
+def locked(execute, sql, params, many, context):
+    raise OperationalError("database is locked")
+
+
+def slow(execute, sql, params, many, context):
+    time.sleep(0.6)
+    return execute(sql, params, many, context)
+
+
+@override_settings(STALE_PAGES=STALE_PAGES)
+class StalePageTest(TestCase):
+    """Tests serving the last good rendering of listing pages while the
+    database is locked or slow"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates an author with a grouped post"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title=GROUP_SLUG, slug=GROUP_SLUG)
+        Post.objects.create(text=POST_TEXT, author=cls.user, group=cls.group)
+        cls.urls = (reverse("index"),
+                    reverse("group_posts", args=[GROUP_SLUG]),
+                    reverse("profile", args=[USERNAME]))
+
+    def setUp(self):
+        """Creates a guest client"""
+        cache.clear()
+        self.guest_client = Client()
+
+    def lock(self):
+        """Locks the database, once the pages it holds are out of the
+        listing and full-page caches"""
+        bump_version(FEED_VERSION_KEY)
+        purge("index", f"group-posts:{self.group.pk}",
+              f"author-posts:{self.user.pk}")
+        return connection.execute_wrapper(locked)
+
+    def assertStale(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Warning"], resilience.STALE_WARNING)
+        self.assertIn("Age", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_locked_database_serves_last_rendering(self):
+        """Tests that a locked database degrades every listing page to
+        its kept rendering instead of failing"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.guest_client.get(url)
+                with self.lock():
+                    response = self.guest_client.get(url)
+                self.assertStale(response)
+                self.assertContains(response, POST_TEXT)
+                self.assertTrue(resilience.is_degraded())
+                cache.delete(resilience.DEGRADED_KEY)
+
+    def test_pages_never_rendered_still_fail(self):
+        """Tests that there is nothing to serve for an unseen page"""
+        with self.lock():
+            with self.assertRaises(OperationalError):
+                self.guest_client.get(self.urls[0])
+
+    def test_slow_render_degrades_only_its_page(self):
+        """Tests that a render over the latency budget is still served
+        but makes the next requests of that page alone use the kept
+        rendering"""
+        url, other_url = self.urls[:2]
+        self.guest_client.get(other_url)
+        with connection.execute_wrapper(slow):
+            response = self.guest_client.get(url)
+        self.assertNotIn("Warning", response)
+        self.assertFalse(resilience.is_degraded())
+        with mock.patch("posts.resilience.threading.Thread"):
+            response = self.guest_client.get(url)
+            self.assertStale(response)
+            response = self.guest_client.get(other_url)
+        self.assertNotIn("Warning", response)
+
+    def test_background_refresh_recovers(self):
+        """Tests that degraded requests start one refresh, which keeps
+        the new rendering and ends the degraded state"""
+        url = self.urls[0]
+        self.guest_client.get(url)
+        Post.objects.create(text=NEW_TEXT, author=self.user)
+        resilience.degrade("test")
+        with mock.patch("posts.resilience.threading.Thread") as thread:
+            response = self.guest_client.get(url)
+            self.guest_client.get(url)
+        self.assertNotContains(response, NEW_TEXT)
+        thread.assert_called_once()
+        resilience.refresh(*thread.call_args[1]["args"])
+        self.assertFalse(resilience.is_degraded())
+        resilience.degrade("test")
+        with mock.patch("posts.resilience.threading.Thread"):
+            response = self.guest_client.get(url)
+        self.assertStale(response)
+        self.assertContains(response, NEW_TEXT)
+
+    def test_signed_in_requests_never_get_the_kept_copy(self):
+        """Tests that signed-in requests reach the view while the
+        database is degraded, and fail while it is locked"""
+        client = Client()
+        client.force_login(self.user)
+        self.guest_client.get(self.urls[1])
+        resilience.degrade("test")
+        response = client.get(self.urls[1])
+        self.assertNotIn("Warning", response)
+        self.assertContains(response, USERNAME)
+        cache.delete(resilience.DEGRADED_KEY)
+        with self.lock():
+            with self.assertRaises(OperationalError):
+                client.get(self.urls[1])
+
+    def test_signed_in_renderings_are_not_kept(self):
+        """Tests that pages of signed-in users are never served to
+        others"""
+        client = Client()
+        client.force_login(self.user)
+        client.get(self.urls[0])
+        with self.lock():
+            with self.assertRaises(OperationalError):
+                self.guest_client.get(self.urls[0])
+
+
+class ReadStackTest(TestCase):
+    """Tests the page cache, stale copies and coalescing of the listing
+    views together, as the site runs them"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates an author with a post"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        Post.objects.create(text=POST_TEXT, author=cls.user)
+
+    def setUp(self):
+        """Points the metrics at a temporary file"""
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(METRICS={
+            **settings.METRICS, "ENABLED": True, "FLUSH_INTERVAL": 60,
+            "PATH": os.path.join(self.directory, "metrics.sqlite3")})
+        self.settings.enable()
+        self.guest_client = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def renders(self):
+        return sum(value for name, labels, value in get_store().collect()
+                   if name == "yatube_coalesced_renders_total"
+                   and 'result="rendered"' in labels)
+
+    def test_stack_serves_caches_and_stale_copies(self):
+        """Tests a render, a page cache hit, a purge by a new post and
+        the stale copy served while the database is locked"""
+        url = reverse("index")
+        for setting in ("PAGE_CACHE", "STALE_PAGES", "COALESCING"):
+            self.assertTrue(getattr(settings, setting)["ENABLED"])
+        response = self.guest_client.get(url)
+        self.assertIn("Surrogate-Key", response)
+        self.assertEqual(self.renders(), 1)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertIn("Age", response)
+        self.assertNotIn("Warning", response)
+        Post.objects.create(text=NEW_TEXT, author=self.user)
+        response = self.guest_client.get(url)
+        self.assertContains(response, NEW_TEXT)
+        self.assertEqual(self.renders(), 2)
+        bump_version(FEED_VERSION_KEY)
+        purge("index")
+        with connection.execute_wrapper(locked):
+            with mock.patch("posts.resilience.threading.Thread"):
+                response = self.guest_client.get(url)
+                self.assertEqual(response["Warning"],
+                                 resilience.STALE_WARNING)
+                self.assertContains(response, NEW_TEXT)
+                self.assertNotIn("Surrogate-Key", response)
+                response = self.guest_client.get(url)
+        self.assertEqual(response["Warning"], resilience.STALE_WARNING)
+        self.assertEqual(self.renders(), 2)
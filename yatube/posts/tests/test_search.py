@@ -0,0 +1,170 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.search import SEARCH_TABLE, match_expression
+
+SEARCH_URL = reverse("search")
+USERNAME = "writer"
+OTHER_USERNAME = "reader"
+GROUP_SLUG = "gardening"
+GROUP_TITLE = "Gardening"
+PAGE_SIZE = 3
+
+
+def indexed(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT text, group_title, author FROM {SEARCH_TABLE} "
+            f"WHERE rowid = %s", [pk])
+        return cursor.fetchone()
+
+
+class SearchIndexTest(TestCase):
+    """Tests that the FTS5 index follows posts, groups and usernames"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates an author, a group and a post"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(title=GROUP_TITLE,
+                                         slug=GROUP_SLUG)
+        cls.post = Post.objects.create(text="Tomatoes in July",
+                                       author=cls.user, group=cls.group)
+
+    def test_insert_and_update(self):
+        """Tests that new and edited posts are indexed"""
+        self.assertEqual(indexed(self.post.pk),
+                         ("Tomatoes in July", GROUP_TITLE, USERNAME))
+        Post.objects.filter(pk=self.post.pk).update(text="Onions",
+                                                    group=None)
+        self.assertEqual(indexed(self.post.pk), ("Onions", "", USERNAME))
+
+    def test_group_and_username_changes(self):
+        """Tests that renaming a group or an author reindexes posts"""
+        self.group.title = "Allotment"
+        self.group.save()
+        self.user.username = "gardener"
+        self.user.save()
+        self.assertEqual(indexed(self.post.pk),
+                         ("Tomatoes in July", "Allotment", "gardener"))
+
+    def test_delete(self):
+        """Tests that deleted posts leave the index"""
+        pk = self.post.pk
+        Post.objects.filter(pk=pk).delete()
+        self.assertIsNone(indexed(pk))
+
+    def test_rebuild_command(self):
+        """Tests that the rebuild command refills the index"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 1 posts", out.getvalue())
+        self.assertEqual(indexed(self.post.pk),
+                         ("Tomatoes in July", GROUP_TITLE, USERNAME))
+
+    def test_match_expression_drops_operators(self):
+        """Tests that user input never reaches FTS5 as syntax"""
+        self.assertEqual(match_expression('tom" OR NEAR(x'),
+                         '"tom" "OR" "NEAR" "x"*')
+        self.assertEqual(match_expression('"*()'), "")
+
+
+@override_settings(POSTS_ON_PAGE=PAGE_SIZE)
+class SearchViewTest(TestCase):
+    """Tests the public /search/ page"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates posts matching in different columns"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.other = User.objects.create_user(username=OTHER_USERNAME)
+        cls.group = Group.objects.create(title=GROUP_TITLE,
+                                         slug=GROUP_SLUG)
+        cls.text_match = Post.objects.create(
+            text="Gardening tips: water <b>early</b>", author=cls.other)
+        cls.group_match = Post.objects.create(
+            text="Pruning roses", author=cls.other, group=cls.group)
+        cls.author_match = Post.objects.create(
+            text="Hello", author=cls.user)
+        for number in range(5):
+            Post.objects.create(text=f"compost heap {number}",
+                                author=cls.other)
+
+    def search(self, **params):
+        return Client().get(SEARCH_URL, params)
+
+    def test_empty_query(self):
+        """Tests that the page renders without a query"""
+        response = self.search()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["page"])
+
+    def test_ranking(self):
+        """Tests that text matches outrank group matches"""
+        page = self.search(q="gardening").context["page"]
+        self.assertEqual([post.pk for post in page],
+                         [self.text_match.pk, self.group_match.pk])
+
+    def test_author_and_prefix_match(self):
+        """Tests that usernames are searchable and the last word is a
+        prefix"""
+        page = self.search(q="writ").context["page"]
+        self.assertEqual([post.pk for post in page], [self.author_match.pk])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """Tests that matches are marked and post HTML is escaped"""
+        content = self.search(q="water").content.decode()
+        self.assertIn("<mark>water</mark>", content)
+        self.assertIn("&lt;b&gt;early&lt;/b&gt;", content)
+        self.assertNotIn("<b>early</b>", content)
+
+    def test_cursor_pagination(self):
+        """Tests that next and previous cursors walk all results"""
+        first = self.search(q="compost").context["page"]
+        self.assertTrue(first.has_next())
+        second = self.search(q="compost",
+                             after=first.next_cursor).context["page"]
+        seen = [post.pk for post in first] + [post.pk for post in second]
+        self.assertEqual(len(set(seen)), 5)
+        back = self.search(q="compost",
+                           before=second.previous_cursor).context["page"]
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in first])
+        content = self.search(q="compost").content.decode()
+        self.assertIn(f"?q=compost&amp;after={first.next_cursor}", content)
+
+    def test_bad_cursor(self):
+        """Tests that a tampered cursor falls back to the first page"""
+        response = self.search(q="compost", after="bad")
+        self.assertEqual(response.status_code, 200)
+
+
+class PostAdminSearchTest(TestCase):
+    """Tests that the admin changelist searches the FTS5 index"""
+    def test_admin_search(self):
+        """Tests that get_search_results uses the full text index"""
+        user = User.objects.create_user(username=USERNAME)
+        match = Post.objects.create(text="Cucumbers", author=user)
+        Post.objects.create(text="Carrots", author=user)
+        admin = site._registry[Post]
+        request = RequestFactory().get("/")
+        queryset, distinct = admin.get_search_results(
+            request, Post.objects.all(), "cucumber")
+        self.assertEqual(list(queryset), [match])
+        self.assertFalse(distinct)
+
+    def test_admin_search_without_words(self):
+        """Tests that a punctuation-only term matches nothing instead of
+        failing"""
+        admin = site._registry[Post]
+        request = RequestFactory().get("/")
+        queryset, distinct = admin.get_search_results(
+            request, Post.objects.all(), "?!*")
+        self.assertEqual(list(queryset), [])
+        self.assertFalse(distinct)
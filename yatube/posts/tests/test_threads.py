@@ -0,0 +1,114 @@
+import unittest
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import COMMENT_MAX_DEPTH, Comment, Post, User
+
+USERNAME = "test_user"
+TEST_POST_TEXT = "This is a test post"
+
+
+class ThreadedCommentsTest(TestCase):
+    """Tests comment replies stored as materialized paths"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates a post with two threads"""
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text=TEST_POST_TEXT, author=cls.user)
+        cls.first = cls.comment("first")
+        cls.second = cls.comment("second")
+        cls.reply = cls.comment("reply", cls.first)
+        cls.nested = cls.comment("nested", cls.reply)
+        cls.later = cls.comment("later", cls.first)
+        cls.add_url = reverse("add_comment", args=[USERNAME, cls.post.pk])
+        cls.comments_url = reverse("post_comments",
+                                   args=[USERNAME, cls.post.pk])
+
+    @classmethod
+    def comment(cls, text, parent=None, post=None):
+        return Comment.objects.create(post=post or cls.post, author=cls.user,
+                                      text=text, parent=parent)
+
+    def setUp(self):
+        """Creates an authorised client"""
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def texts(self, response):
+        return [comment.text for comment in response.context["comments"]]
+
+    def test_threads_are_listed_depth_first(self):
+        """Tests that the newest thread comes first and replies follow
+        the comment they answer, oldest first"""
+        response = self.client.get(self.comments_url)
+        self.assertEqual(self.texts(response),
+                         ["second", "first", "reply", "nested", "later"])
+        self.assertEqual(
+            [comment.depth for comment in response.context["comments"]],
+            [0, 0, 1, 2, 1])
+
+    @unittest.skipUnless(connection.vendor == "sqlite",
+                         "EXPLAIN QUERY PLAN output is SQLite specific")
+    def test_page_is_one_range_query(self):
+        """Tests that a page of nested threads is fetched with its
+        authors in a single query on the path index"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.comments_url)
+        comment_queries = [query["sql"] for query in queries
+                           if "posts_comment" in query["sql"]]
+        self.assertEqual(len(comment_queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {comment_queries[0]}")
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("comment_post_path_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_reply_counts_are_maintained(self):
+        """Tests that replying and deleting replies update the count of
+        the parent"""
+        self.client.post(self.add_url, {"text": "again",
+                                        "parent": self.first.pk})
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count, 3)
+        self.reply.delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count, 2)
+        self.assertFalse(Comment.objects.filter(pk=self.nested.pk).exists())
+
+    def test_reply_to_another_post_is_rejected(self):
+        """Tests that the parent must be a comment of the same post"""
+        other = Post.objects.create(text=TEST_POST_TEXT, author=self.user)
+        foreign = self.comment("foreign", post=other)
+        response = self.client.post(self.add_url, {"text": "misplaced",
+                                                   "parent": foreign.pk})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text="misplaced").exists())
+
+    def test_deepest_replies_join_the_parent_thread(self):
+        """Tests that replies below COMMENT_MAX_DEPTH answer the parent
+        of the deepest comment"""
+        parent = self.second
+        for level in range(1, COMMENT_MAX_DEPTH):
+            parent = self.comment(f"level {level}", parent)
+        self.assertEqual(parent.depth, COMMENT_MAX_DEPTH - 1)
+        self.client.post(self.add_url, {"text": "too deep",
+                                        "parent": parent.pk})
+        reply = Comment.objects.get(text="too deep")
+        self.assertEqual(reply.parent_id, parent.parent_id)
+        self.assertEqual(reply.depth, parent.depth)
+
+    def test_repair_counters_fixes_reply_counts(self):
+        """Tests that the management command recounts replies"""
+        Comment.objects.filter(pk=self.first.pk).update(reply_count=7)
+        out = StringIO()
+        call_command("repair_counters", stdout=out)
+        self.assertIn("reply counts: 1", out.getvalue())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count, 2)
@@ -0,0 +1,138 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, ThumbnailJob, User
+from posts.thumbnails import process_jobs
+
+HOMEPAGE_URL = reverse("index")
+NEW_POST_URL = reverse("new_post")
+USERNAME = "test_user"
+POST_TEXT = "post with image"
+EDITED_TEXT = "edited post"
+GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PLACEHOLDER = 'class="card-img bg-light"'
+THUMBNAIL = '<img class="card-img"'
+MISSING_IMAGE = "posts/missing.gif"
+ATTEMPTS = 2
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def gif():
+    return SimpleUploadedFile("image.gif", GIF, content_type="image/gif")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_JOB_ATTEMPTS=ATTEMPTS)
+class ThumbnailJobTest(TestCase):
+    """Tests that thumbnails are rendered by the worker, not by views"""
+    @classmethod
+    def setUpTestData(cls):
+        """Creates the author"""
+        cls.user = User.objects.create_user(username=USERNAME)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Creates an authorised client and empties the cache"""
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self):
+        self.client.post(NEW_POST_URL, {"text": POST_TEXT, "image": gif()})
+        return Post.objects.get(text=POST_TEXT)
+
+    def test_new_post_enqueues_thumbnails(self):
+        """Tests that an upload queues a job and shows a placeholder"""
+        post = self.upload()
+        self.assertTrue(post.image)
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.PENDING)
+        content = self.client.get(HOMEPAGE_URL).content.decode()
+        self.assertIn(PLACEHOLDER, content)
+        self.assertNotIn(THUMBNAIL, content)
+
+    def test_worker_renders_thumbnails(self):
+        """Tests that the worker renders the thumbnail and the card
+        switches from the placeholder to it"""
+        post = self.upload()
+        self.client.get(HOMEPAGE_URL)
+        self.assertEqual(process_jobs(), 1)
+        post.thumbnail_job.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.DONE)
+        self.assertTrue(post.image_variants.exists())
+        content = self.client.get(HOMEPAGE_URL).content.decode()
+        self.assertIn(THUMBNAIL, content)
+        self.assertNotIn(PLACEHOLDER, content)
+
+    @override_settings(PAGE_CACHE={"ENABLED": True, "TIMEOUT": 60})
+    def test_worker_purges_cached_pages(self):
+        """Tests that guests stop getting cached pages with the
+        placeholder once the thumbnail is rendered"""
+        post = self.upload()
+        guest = Client()
+        urls = (HOMEPAGE_URL, reverse("post", args=(USERNAME, post.pk)))
+        for url in urls:
+            self.assertIn(PLACEHOLDER, guest.get(url).content.decode())
+        process_jobs()
+        for url in urls:
+            with self.subTest(url=url):
+                content = guest.get(url).content.decode()
+                self.assertNotIn(PLACEHOLDER, content)
+                self.assertIn('<img class="card-img', content)
+
+    def test_edit_without_new_image_does_not_enqueue(self):
+        """Tests that editing only the text keeps the finished job"""
+        post = self.upload()
+        process_jobs()
+        self.client.post(
+            reverse("post_edit", args=(USERNAME, post.pk)),
+            {"text": EDITED_TEXT})
+        post.thumbnail_job.refresh_from_db()
+        self.assertEqual(post.thumbnail_job.status, ThumbnailJob.DONE)
+
+    def test_missing_source_fails_after_retries(self):
+        """Tests that a job whose image is gone is retried, then failed"""
+        post = Post.objects.create(text=POST_TEXT, author=self.user,
+                                   image=MISSING_IMAGE)
+        ThumbnailJob.objects.create(post=post)
+        for status in (ThumbnailJob.PENDING, ThumbnailJob.FAILED):
+            with self.assertLogs("posts.thumbnails", "ERROR"):
+                process_jobs()
+            job = ThumbnailJob.objects.get(post=post)
+            self.assertEqual(job.status, status)
+        self.assertEqual(job.attempts, ATTEMPTS)
+        self.assertEqual(process_jobs(), 0)
+
+    def test_running_job_is_not_claimed_twice(self):
+        """Tests that a job another worker is running is left alone"""
+        post = self.upload()
+        ThumbnailJob.objects.filter(post=post).update(
+            status=ThumbnailJob.RUNNING)
+        self.assertEqual(process_jobs(), 0)
+
+    def test_command_enqueues_missing_jobs(self):
+        """Tests that the worker command can queue and drain old posts"""
+        post = self.upload()
+        ThumbnailJob.objects.all().delete()
+        out = StringIO()
+        call_command("render_thumbnails", once=True, enqueue_missing=True,
+                     stdout=out)
+        self.assertIn("Processed 1", out.getvalue())
+        self.assertEqual(ThumbnailJob.objects.get(post=post).status,
+                         ThumbnailJob.DONE)
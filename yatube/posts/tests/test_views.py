@@ -245,7 +245,7 @@ class PostsPagesTests(TestCase):
             FOLLOW_INDEX
         )
         self.assertFalse(response_user3.context["page"])
-        self.assertEqual(new_post, user1_follow_page_post)
+        self.assertEqual(new_post.pk, user1_follow_page_post.pk)
 
     def test_only_authenticated_user_can_comment(self):
         """Tests that only authenticated users can leave comments
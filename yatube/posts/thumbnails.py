@@ -0,0 +1,93 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .caching import FEED_VERSION_KEY, POST_VERSION_KEY, bump_version
+from .images import render_variants
+from .models import ThumbnailJob
+from .pagecache import purge
+
+logger = logging.getLogger(__name__)
+
+# A running job whose worker has not finished it after this long is
+# handed to another worker.
+STALE_JOB_AGE = timedelta(minutes=10)
+
+
+def enqueue_thumbnails(post):
+    """Queue the image variants of the post for the worker."""
+    if not post.image:
+        return
+    ThumbnailJob.objects.update_or_create(
+        post=post,
+        defaults={"status": ThumbnailJob.PENDING, "attempts": 0,
+                  "error": ""},
+    )
+
+
+def render_thumbnails(post):
+    """Render the image variants of the post and refresh its card, the
+    cached index pages and the full pages showing it, which hold the
+    variants they were built with.
+    """
+    if not post.image:
+        return
+    render_variants(post)
+    bump_version(POST_VERSION_KEY.format(pk=post.pk))
+    bump_version(FEED_VERSION_KEY)
+    # Variants are bulk created, so no signal purges these pages.
+    purge(f"post:{post.pk}")
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` waiting jobs as running for this worker.
+
+    Returns (job, claimed_at) pairs. A job is claimed only if its row is
+    unchanged since it was read, so two workers never take the same job.
+    """
+    stale = timezone.now() - STALE_JOB_AGE
+    candidates = ThumbnailJob.objects.filter(
+        Q(status=ThumbnailJob.PENDING)
+        | Q(status=ThumbnailJob.RUNNING, updated__lt=stale)
+    ).order_by("updated").values_list("pk", "status", "updated")[:limit]
+    claimed = {}
+    for pk, status, updated in candidates:
+        now = timezone.now()
+        if ThumbnailJob.objects.filter(
+                pk=pk, status=status, updated=updated).update(
+                    status=ThumbnailJob.RUNNING, updated=now):
+            claimed[pk] = now
+    jobs = ThumbnailJob.objects.filter(pk__in=claimed).select_related("post")
+    return [(job, claimed[job.pk]) for job in jobs]
+
+
+def _finish(job, claimed_at, status, **fields):
+    # A post edited while its job ran was queued again; leave it pending.
+    ThumbnailJob.objects.filter(
+        pk=job.pk, status=ThumbnailJob.RUNNING, updated=claimed_at,
+    ).update(status=status, updated=timezone.now(), **fields)
+
+
+def process_jobs(limit=10):
+    """Render the thumbnails of up to ``limit`` queued posts.
+
+    Returns the number of jobs taken from the queue.
+    """
+    jobs = claim_jobs(limit)
+    for job, claimed_at in jobs:
+        try:
+            render_thumbnails(job.post)
+        except Exception as error:
+            logger.exception("Thumbnails of post %s failed", job.post_id)
+            attempts = job.attempts + 1
+            status = (ThumbnailJob.FAILED
+                      if attempts >= settings.THUMBNAIL_JOB_ATTEMPTS
+                      else ThumbnailJob.PENDING)
+            _finish(job, claimed_at, status,
+                    attempts=F("attempts") + 1, error=str(error))
+        else:
+            _finish(job, claimed_at, ThumbnailJob.DONE, error="")
+    return len(jobs)
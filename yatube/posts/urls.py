@@ -11,6 +11,8 @@ urlpatterns = [
          name="new_post"),
     path("follow/", views.follow_index,
          name="follow_index"),
+    path("search/", views.search,
+         name="search"),
     path("<str:username>/<int:post_id>/", views.post_view,
          name="post"),
     path("<str:username>/<int:post_id>/edit/", views.post_edit,
@@ -21,6 +23,8 @@ urlpatterns = [
          name="profile_unfollow"),
     path("<str:username>/<int:post_id>/comment/", views.add_comment,
          name="add_comment"),
+    path("<str:username>/<int:post_id>/comments/", views.post_comments,
+         name="post_comments"),
     path("<str:username>/", views.profile,
          name="profile"),
 
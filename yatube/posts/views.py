@@ -1,57 +1,98 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_GET
-from yatube.settings import POSTS_ON_PAGE
 
+from .caching import (FEED_VERSION_KEY, TIMELINE_VERSION_KEY, count_key,
+                      get_cached_page)
+from .cards import PostCards
+from .coalescing import coalesce_renders
+from .conditional import (conditional_page, group_etag, post_etag,
+                          profile_etag)
+from .feed import get_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import COMMENT_MAX_DEPTH, Comment, Follow, Group, Post, User
+from .pagecache import add_surrogate_keys, cache_anonymous_page, listing_keys
+from .pagination import COMMENT_ORDERING, CursorPaginator, get_page
+from .resilience import serve_stale
+from .search import SEARCH_ORDERING, PostSearch
+from .thumbnails import enqueue_thumbnails
 
 
 @require_GET
+@serve_stale
+@cache_anonymous_page
+@coalesce_renders
 def index(request):
-    post_list = cache.get("index_page")
-    if post_list is None:
-        post_list = Post.objects.all()
-        cache.set("index_page", post_list, timeout=20)
-    paginator = Paginator(post_list, POSTS_ON_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    page = get_cached_page(request, PostCards(Post.objects.all()), "index",
+                           FEED_VERSION_KEY)
     context = {
         "page": page,
     }
-    return render(
+    response = render(
         request, "posts/index.html", context
     )
+    add_surrogate_keys(response, ["index", *listing_keys(page)])
+    return response
+
 
+@require_GET
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = None
+    if query:
+        paginator = CursorPaginator(PostSearch(query),
+                                    settings.POSTS_ON_PAGE, SEARCH_ORDERING)
+        page = paginator.page(after=request.GET.get("after"),
+                              before=request.GET.get("before"))
+    context = {
+        "query": query,
+        "page": page,
+        "page_query": urlencode({"q": query}) + "&",
+    }
+    return render(
+        request, "posts/search.html", context
+    )
 
+
+@serve_stale
+@cache_anonymous_page
+@coalesce_renders
+@conditional_page(group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, POSTS_ON_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    posts = PostCards(Post.objects.filter(group=group))
+    page = get_page(request, posts, count_key=count_key(
+        f"group:{group.pk}", FEED_VERSION_KEY))
     context = {
         "group": group,
         "page": page,
     }
-    return render(
+    response = render(
         request, "posts/group.html", context
     )
+    add_surrogate_keys(response, [f"group-posts:{group.pk}",
+                                  f"group:{group.pk}", *listing_keys(page)])
+    return response
 
 
+@serve_stale
+@cache_anonymous_page
+@coalesce_renders
+@conditional_page(profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
-    paginator = Paginator(posts, POSTS_ON_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related("stats"),
+                               username=username)
+    posts = PostCards(Post.objects.filter(author=author))
+    page = get_page(request, posts, count_key=count_key(
+        f"author:{author.pk}", FEED_VERSION_KEY))
     following = False
     if request.user.is_authenticated:
         if Follow.objects.filter(
                 user=request.user,
-                author=author):
+                author=author).exists():
             following = True
         else:
             following = False
@@ -61,23 +102,30 @@ def profile(request, username):
         "author": author,
         "page": page,
     }
-    return render(
+    response = render(
         request, "posts/profile.html", context
     )
+    add_surrogate_keys(response, [
+        f"author-posts:{author.pk}", f"author:{author.pk}",
+        f"stats:{author.pk}", *listing_keys(page)])
+    return response
 
 
+@cache_anonymous_page
+@coalesce_renders
+@conditional_page(post_etag)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post,
-                             author=author,
-                             pk=post_id)
-    posts_count = author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"),
+        author__username=username,
+        pk=post_id
+    )
+    author = post.author
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(request, post)
     context = {
         "author": author,
         "post": post,
-        "posts_count": posts_count,
         "form": form,
         "comments": comments
     }
@@ -87,20 +135,65 @@ def post_view(request, username, post_id):
             comment = comment_form.save(commit=False)
             comment.author = request.user
             comment.post = post
+            comment.parent = get_reply_parent(request, post)
             comment.save()
             return redirect("post", username, post_id)
-    return render(
+    response = render(
         request, "posts/post.html", context
     )
+    keys = [f"post:{post.pk}", f"author:{author.pk}", f"stats:{author.pk}"]
+    if post.group_id:
+        keys.append(f"group:{post.group_id}")
+    keys.extend(f"author:{comment.author_id}" for comment in comments)
+    add_surrogate_keys(response, keys)
+    return response
+
+
+def get_comments_page(request, post):
+    """Return the comments of ``post`` that follow the
+    ``?comments_after=`` cursor: whole threads, newest first, each
+    followed by its replies."""
+    paginator = CursorPaginator(post.comments.select_related("author"),
+                                settings.COMMENTS_ON_PAGE, COMMENT_ORDERING)
+    return paginator.page(after=request.GET.get("comments_after"))
+
+
+def get_reply_parent(request, post):
+    """Return the comment of ``post`` named by the ``parent`` field of
+    the form, if any."""
+    parent_id = request.POST.get("parent", "")
+    if not parent_id.isdigit():
+        return None
+    parent = get_object_or_404(Comment, post=post, pk=parent_id)
+    if parent.depth >= COMMENT_MAX_DEPTH - 1:
+        # Paths have room for COMMENT_MAX_DEPTH levels; deeper replies
+        # join the replies to the deepest comment's parent.
+        return parent.parent
+    return parent
+
+
+@require_GET
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             author__username=username,
+                             pk=post_id)
+    context = {
+        "post": post,
+        "comments": get_comments_page(request, post),
+    }
+    return render(
+        request, "posts/includes/comment_list.html", context
+    )
 
 
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        enqueue_thumbnails(post)
         return redirect("index")
     form = PostForm()
     return render(
@@ -120,7 +213,9 @@ def post_edit(request, username, post_id):
 
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            post = form.save()
+            if "image" in form.changed_data:
+                enqueue_thumbnails(post)
             return redirect("post", username=request.user.username,
                             post_id=post_id)
 
@@ -151,6 +246,7 @@ def add_comment(request, username, post_id):
         comment = comment_form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = get_reply_parent(request, post)
         comment.save()
     return redirect("post", username, post_id)
 
@@ -176,17 +272,10 @@ def profile_unfollow(request, username):
 
 @login_required
 def follow_index(request):
-    follows = Follow.objects.filter(
-        user=request.user
-    )
-    authors = [follow.author
-               for follow in follows]
-    posts = Post.objects.filter(
-        author__in=authors
-    )
-    paginator = Paginator(posts, POSTS_ON_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    posts = get_feed(request.user)
+    page = get_page(request, posts, count_key=count_key(
+        f"feed:{request.user.pk}", FEED_VERSION_KEY,
+        TIMELINE_VERSION_KEY.format(pk=request.user.pk)))
     template = "posts/follow.html"
     return render(
         request,
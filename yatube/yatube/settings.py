@@ -18,15 +18,19 @@ INSTALLED_APPS = [
     'posts',
     'about',
     'users',
-    'sorl.thumbnail',
+    'core',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +94,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Every image geometry the templates show, by name. The
+# render_thumbnails worker crops each uploaded image to the aspect
+# ratio at every width that does not upscale it, in WebP and JPEG;
+# templates emit 'sizes' with the resulting srcset.
+IMAGE_GEOMETRIES = {
+    'card': {
+        'ratio': (960, 339),
+        'widths': (480, 960, 1440),
+        'sizes': '(min-width: 992px) 960px, 100vw',
+    },
+}
+
+# Encoder quality of the WebP and JPEG image variants.
+IMAGE_VARIANT_QUALITY = 80
+
+# How many times the worker retries a thumbnail job before giving up.
+THUMBNAIL_JOB_ATTEMPTS = 3
+
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
@@ -99,6 +121,116 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 POSTS_ON_PAGE = 10
 
+# Comments shown under a post and fetched by each "Load more" request.
+COMMENTS_ON_PAGE = 20
+
+# Numbered paginators link this many pages on each side of the current
+# one, besides the first and the last page.
+PAGINATOR_WINDOW = 2
+
+# Serve listings with ?after=/?before= keyset pagination by default;
+# ?page= links keep using the numbered paginator either way.
+CURSOR_PAGINATION = False
+
+# Maximum number of SQL queries per request, by URL name. Listing views
+# must stay within the default however many posts a page holds.
+QUERY_BUDGET = {
+    'ENABLED': True,
+    'DEFAULT': 15,
+    'VIEWS': {},
+    'RAISE': DEBUG,
+}
+
+# Per-request SQL, template and cache timings in a Server-Timing
+# header, and cProfile dumps of requests that send HEADER or
+# QUERY_PARAM with a `manage.py profile_token` token (anything will do
+# for staff), plus a SAMPLE_RATE share of all requests.
+PROFILING = {
+    'ENABLED': True,
+    'HEADER': 'HTTP_X_PROFILE',
+    'QUERY_PARAM': '_profile',
+    'TOKEN_MAX_AGE': 60 * 60,
+    'SAMPLE_RATE': 0,
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+}
+
+# Per-view request, latency, query, cache and upload metrics, summed
+# over all workers in one SQLite file and served to staff at /metrics/
+# in the Prometheus text format.
+METRICS = {
+    'ENABLED': True,
+    'PATH': os.path.join(BASE_DIR, 'metrics.sqlite3'),
+    'FLUSH_INTERVAL': 1,
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+                        2.5, 5, 10),
+    'QUERY_BUCKETS': (1, 2, 5, 10, 15, 20, 50, 100),
+    'UPLOAD_BUCKETS': (10 ** 4, 10 ** 5, 10 ** 6, 5 * 10 ** 6, 10 ** 7),
+}
+
+# Write throttling by URL name: RATE requests per second, minute, hour
+# or day for each signed-in user and each client address. MODE 'bucket'
+# refills a token bucket holding BURST requests (RATE by default),
+# 'window' counts requests over a sliding period. Requests over the
+# limit get 429 with Retry-After.
+RATELIMIT = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'MODE': 'bucket',
+    'KEYS': ('user', 'ip'),
+    'IP_HEADER': 'REMOTE_ADDR',
+    'VIEWS': {
+        'new_post': {'RATE': '10/m', 'BURST': 5},
+        'post': {'RATE': '20/m', 'BURST': 10},
+        'add_comment': {'RATE': '20/m', 'BURST': 10},
+        'profile_follow': {'RATE': '30/m', 'METHODS': ('GET', 'POST')},
+        'profile_unfollow': {'RATE': '30/m', 'METHODS': ('GET', 'POST')},
+    },
+}
+
+# Full-page cache of signed-out GET requests to the index, group,
+# profile and post pages. Pages are tagged with surrogate keys and
+# purged by model signals; TIMEOUT is also sent as Surrogate-Control.
+PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 60 * 10,
+}
+
+# Listing pages keep their last good signed-out rendering for TIMEOUT
+# seconds. A render that fails with a database error marks the database
+# as degraded for COOLDOWN seconds, and one that takes longer than
+# LATENCY_BUDGET seconds marks its own page. Meanwhile signed-out
+# visitors get the kept renderings with Age and Warning headers, and
+# they are refreshed in the background.
+STALE_PAGES = {
+    'ENABLED': True,
+    'LATENCY_BUDGET': 2,
+    'COOLDOWN': 10,
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Concurrent identical GET requests of signed-out visitors wait for one
+# render of the page and share it. SHARED coalesces the requests of all
+# workers through the default cache. Waiters render the page themselves
+# after TIMEOUT seconds.
+COALESCING = {
+    'ENABLED': True,
+    'SHARED': False,
+    'TIMEOUT': 5,
+}
+
+# How long a rendered post card stays in the fragment cache.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Authors with more followers than this are not fanned out on write;
+# their posts are merged into follower feeds at read time instead.
+FEED_FANOUT_THRESHOLD = 10000
+
+# Pulled authors go back to fan-out on write once they have no more
+# followers than this. The gap keeps an author near the threshold from
+# switching on every follow; the switch and the timeline backfill it
+# needs are made by the push_authors command.
+FEED_PUSH_THRESHOLD = 8000
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -106,8 +238,16 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+# One cache file shared by every worker process on the host. It holds
+# a version key per post, author, group and surrogate tag shown besides
+# the pages, counts and cards they guard, so MAX_ENTRIES is far above
+# Django's default of 300.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
     }
 }
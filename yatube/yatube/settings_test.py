@@ -0,0 +1,24 @@
+"""Settings of the test suites, used by ``manage.py test`` and pytest.
+
+Everything the site runs with in production stays on, page caches
+included, except what would leak state out of the test process or
+throttle fixtures; the tests of those features turn them on.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import METRICS, RATELIMIT, STALE_PAGES
+
+# A per-process cache, so cache.clear() never touches the shared file.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Tests enable metrics with a file of their own.
+METRICS = {**METRICS, 'ENABLED': False}
+
+# Tests that post in loops must not be throttled.
+RATELIMIT = {**RATELIMIT, 'ENABLED': False}
+
+# A slow test machine must not trip the latency budget.
+STALE_PAGES = {**STALE_PAGES, 'LATENCY_BUDGET': 60}